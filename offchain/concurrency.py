@@ -1,11 +1,32 @@
+import asyncio
 import multiprocessing
-from concurrent.futures import ThreadPoolExecutor
-from typing import Any, Callable, Sequence
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import copy_context
+from functools import partial
+from typing import Any, Callable, Iterator, Optional, Sequence
 
 from offchain.logger.logging import logger
 
 MAX_PROCS = (multiprocessing.cpu_count() * 2) + 1
 
+# Payloads at least this large are decoded off the event loop
+CPU_OFFLOAD_THRESHOLD_BYTES = 64 * 1024
+
+# Threads fanning out RPC requests, and max number of RPC requests in flight at once
+RPC_MAX_WORKERS = 16
+RPC_MAX_IN_FLIGHT = 32
+
+_cpu_executor: Optional[Executor] = None
+_cpu_executor_lock = threading.Lock()
+
+_rpc_executor: Optional[Executor] = None
+_rpc_executor_lock = threading.Lock()
+_rpc_in_flight = threading.BoundedSemaphore(RPC_MAX_IN_FLIGHT)
+_rpc_worker = threading.local()
+
 
 def parallelize_with_threads(*args: Sequence[Callable]) -> Sequence[Any]:  # type: ignore[type-arg]  # noqa: E501
     """Parallelize a set of functions with a threadpool.
@@ -17,7 +38,8 @@ def parallelize_with_threads(*args: Sequence[Callable]) -> Sequence[Any]:  # typ
     n_tasks = len(args)
     logger.debug("Starting tasks", extra={"num_tasks": n_tasks})
     with ThreadPoolExecutor(max_workers=min(n_tasks, MAX_PROCS)) as pool:
-        futures = [pool.submit(fn) for fn in args]  # type: ignore[arg-type, var-annotated]  # noqa: E501
+        # Run each task in a copy of the caller's context, e.g. to keep the run's pinned blocks
+        futures = [pool.submit(copy_context().run, fn) for fn in args]  # type: ignore[arg-type, var-annotated]  # noqa: E501
         res = [f.result() for f in futures]
     return res
 
@@ -51,3 +73,221 @@ def batched_parmap(fn: Callable, args: list, batch_size: int = 10) -> list:  # t
         res = parmap(fn, batch)
         results += res
     return results
+
+
+def get_cpu_executor() -> Executor:
+    """Shared executor used to run CPU-bound work off the event loop.
+
+    Returns:
+        Executor: the executor set with `set_cpu_executor`, or a lazily created thread pool.
+    """  # noqa: E501
+    global _cpu_executor
+    with _cpu_executor_lock:
+        if _cpu_executor is None:
+            _cpu_executor = ThreadPoolExecutor(
+                max_workers=multiprocessing.cpu_count(),
+                thread_name_prefix="offchain-cpu",
+            )
+        return _cpu_executor
+
+
+def set_cpu_executor(executor: Optional[Executor]) -> None:
+    """Replace the shared executor used by `run_cpu_bound`, e.g. with a ProcessPoolExecutor.
+
+    Work sent to a process pool has to be picklable, which all the decode steps in this
+    package are.
+
+    Args:
+        executor (Optional[Executor]): executor to use, None to go back to the default thread pool.
+    """  # noqa: E501
+    global _cpu_executor
+    with _cpu_executor_lock:
+        _cpu_executor = executor
+
+
+async def run_cpu_bound(
+    fn: Callable,  # type: ignore[type-arg]
+    *args: Any,
+    size: int = 0,
+    threshold: Optional[int] = None,
+) -> Any:
+    """Run a CPU-bound function, off the event loop if its input is large.
+
+    Small inputs are handled inline, since handing them to an executor costs more than
+    the work itself. Inputs of at least `threshold` bytes run on the shared executor so
+    a few large payloads can't stall every other request in flight.
+
+    Args:
+        fn (Callable): function to run.
+        size (int, optional): size in bytes (or characters) of the input. Defaults to 0.
+        threshold (Optional[int], optional): offload threshold. Defaults to CPU_OFFLOAD_THRESHOLD_BYTES.
+
+    Returns:
+        Any: result of fn(*args)
+    """  # noqa: E501
+    if threshold is None:
+        threshold = CPU_OFFLOAD_THRESHOLD_BYTES
+    if size < threshold:
+        return fn(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_executor(), partial(fn, *args))
+
+
+def get_rpc_executor() -> Executor:
+    """Shared executor RPC requests are fanned out on, bounding the threads making RPC requests.
+
+    Returns:
+        Executor: the executor set with `set_rpc_executor`, or a lazily created thread pool.
+    """  # noqa: E501
+    global _rpc_executor
+    with _rpc_executor_lock:
+        if _rpc_executor is None:
+            _rpc_executor = ThreadPoolExecutor(
+                max_workers=RPC_MAX_WORKERS, thread_name_prefix="offchain-rpc-fanout"
+            )
+        return _rpc_executor
+
+
+def set_rpc_executor(
+    executor: Optional[Executor], max_in_flight: Optional[int] = None
+) -> None:
+    """Replace the shared executor used by `rpc_parmap`, and optionally the in-flight cap.
+
+    Args:
+        executor (Optional[Executor]): executor to use, None to go back to the default thread pool.
+        max_in_flight (Optional[int], optional): max number of RPC requests in flight at once.
+    """  # noqa: E501
+    global _rpc_executor, _rpc_in_flight
+    with _rpc_executor_lock:
+        _rpc_executor = executor
+        if max_in_flight is not None:
+            _rpc_in_flight = threading.BoundedSemaphore(max_in_flight)
+
+
+def _run_as_rpc_worker(fn: Callable, arg: Any) -> Any:  # type: ignore[type-arg]
+    _rpc_worker.active = True
+    try:
+        return fn(arg)
+    finally:
+        _rpc_worker.active = False
+
+
+def rpc_parmap(fn: Callable, args: list) -> list:  # type: ignore[type-arg]
+    """Run a map of RPC requests in parallel on the shared RPC executor.
+
+    Maps started from a task already running on the executor (nested fan-out, e.g. a
+    chunk of calls split in batches) run inline on that worker, so the number of threads
+    stays bounded and tasks never wait on tasks queued behind them.
+
+    Args:
+        fn (Callable): function to be run in parallel
+        args (list): arg space to map over
+
+    Returns:
+        list: results from map calls
+    """
+    if len(args) <= 1 or in_rpc_worker():
+        return [fn(arg) for arg in args]
+    futures = [submit_rpc(fn, arg) for arg in args]
+    # Like parmap, only return (or raise) once every call is done
+    wait(futures)
+    return [future.result() for future in futures]
+
+
+def in_rpc_worker() -> bool:
+    """Whether the current thread is running a task of the shared RPC executor."""
+    return getattr(_rpc_worker, "active", False)  # type: ignore[no-any-return]
+
+
+def submit_rpc(fn: Callable, arg: Any) -> Future:  # type: ignore[type-arg]
+    """Run an RPC request on the shared RPC executor, in a copy of the caller's context.
+
+    Tasks must not wait on other tasks of the executor, check `in_rpc_worker` first.
+
+    Args:
+        fn (Callable): function making the request.
+        arg (Any): argument passed to fn.
+
+    Returns:
+        Future: future of fn(arg).
+    """
+    return get_rpc_executor().submit(copy_context().run, _run_as_rpc_worker, fn, arg)
+
+
+@contextmanager
+def rpc_in_flight_slot() -> Iterator[None]:
+    """Wait for one of the `RPC_MAX_IN_FLIGHT` slots shared by all RPC requests of the process."""  # noqa: E501
+    semaphore = _rpc_in_flight
+    with semaphore:
+        yield
+
+
+class EventLoopLagMonitor:
+    """Measures how late the event loop wakes up from a periodic sleep.
+
+    A responsive loop wakes up right on time, anything blocking it (e.g. decoding a
+    large payload inline) shows up as lag.
+
+    Usage:
+        >>> monitor = EventLoopLagMonitor()
+        >>> monitor.start()
+        >>> ...
+        >>> monitor.get_metrics()
+        {"last_lag": 0.0004, "max_lag": 0.012, "avg_lag": 0.0011, "samples": 42}
+
+    Attributes:
+        interval (float): seconds between two samples.
+        warn_threshold (Optional[float]): lag in seconds above which a warning is logged.
+    """
+
+    def __init__(
+        self, interval: float = 0.1, warn_threshold: Optional[float] = 0.5
+    ) -> None:
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.avg_lag = 0.0
+        self.samples = 0
+        self._task: Optional[asyncio.Task] = None  # type: ignore[type-arg]
+
+    def start(self) -> None:
+        """Start sampling on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def record(self, lag: float) -> None:
+        lag = max(0.0, lag)
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.samples += 1
+        self.avg_lag += (lag - self.avg_lag) / min(self.samples, 100)
+        if self.warn_threshold is not None and lag > self.warn_threshold:
+            logger.warning(
+                f"Event loop was blocked for {lag:.3f}s", extra={"lag": lag}
+            )
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(time.monotonic() - expected)
+
+    def get_metrics(self) -> dict[str, Any]:
+        """Lag of the last sample, worst lag and moving average lag, in seconds.
+
+        Returns:
+            dict[str, Any]: lag metrics.
+        """
+        return {
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+            "avg_lag": self.avg_lag,
+            "samples": self.samples,
+        }
@@ -1,29 +1,106 @@
 import base64
-from email.message import Message
+from typing import Union
+from urllib.parse import unquote_to_bytes
 from urllib.request import urlopen
 
 import httpx
 import json
 from requests import PreparedRequest, Response
 
+from offchain.concurrency import run_cpu_bound
 from offchain.metadata.adapters.base_adapter import BaseAdapter
 from offchain.metadata.registries.adapter_registry import AdapterRegistry
 
+DEFAULT_DATA_URI_MEDIATYPE = "text/plain;charset=US-ASCII"
 
-def decode_data_url(data_url):  # type: ignore[no-untyped-def]
-    data_parts = data_url.split(",")
-    data = data_parts[1]
 
-    if ";base64" in data_parts[0]:
-        decoded_data = base64.b64decode(data)
-        decoded_text = decoded_data.decode("utf-8")
-        return decoded_text
-    elif "json" in data_parts[0]:
-        decoded_data = urlopen(data_url).read()
-        decoded_text = json.dumps(json.loads(decoded_data))
-        return decoded_text
+def split_data_uri(data_uri: str) -> tuple[str, bool, str]:
+    """Split a data uri into its mediatype, encoding and payload without decoding it.
+
+    Args:
+        data_uri (str): data uri, e.g. "data:application/json;base64,eyJ9"
+
+    Returns:
+        tuple[str, bool, str]: mediatype (with parameters, e.g. "application/json;utf8"),
+            whether the payload is base64 encoded, and the raw payload.
+    """  # noqa: E501
+    header, payload = data_uri.split(",", 1)
+    mediatype = header[len("data:") :]
+    is_base64 = mediatype.lower().endswith(";base64")
+    if is_base64:
+        mediatype = mediatype[: -len(";base64")]
+    return mediatype or DEFAULT_DATA_URI_MEDIATYPE, is_base64, payload
+
+
+def _decode_payload(is_base64: bool, payload: str) -> bytes:
+    if is_base64:
+        if "%" in payload:
+            payload = unquote_to_bytes(payload).decode("ascii")
+        return base64.b64decode(payload)
+    return unquote_to_bytes(payload)
+
+
+def get_data_uri_mime_type_and_size(data_uri: str) -> tuple[str, int]:
+    """Get the mediatype and decoded size of a data uri without decoding its payload.
+
+    The size of a base64 payload is computed from its length and padding. Only payloads
+    that aren't a multiple of 4 characters long (e.g. containing whitespace) or that are
+    percent-encoded need to be decoded to be measured.
+
+    Args:
+        data_uri (str): data uri
+
+    Returns:
+        tuple[str, int]: mediatype (with parameters) and size of the decoded payload.
+    """  # noqa: E501
+    mediatype, is_base64, payload = split_data_uri(data_uri)
+    if not is_base64:
+        if "%" not in payload and payload.isascii():
+            return mediatype, len(payload)
+        return mediatype, len(unquote_to_bytes(payload))
+
+    n = len(payload)
+    if n % 4 == 0 and "%" not in payload:
+        padding = 2 if payload.endswith("==") else 1 if payload.endswith("=") else 0
+        return mediatype, n // 4 * 3 - padding
+    return mediatype, len(_decode_payload(is_base64, payload))
 
-    return None
+
+def _is_json_mediatype(mediatype: str) -> bool:
+    mimetype = mediatype.split(";", 1)[0].strip().lower()
+    return mimetype == "application/json" or mimetype.endswith("+json")
+
+
+def decode_data_uri(data_uri: str) -> Union[dict, str]:  # type: ignore[type-arg]
+    """Decode the content of a data uri, the same way fetched content is returned.
+
+    The payload is decoded exactly once. JSON objects (either with a JSON mediatype or a
+    payload starting with "{") are parsed straight from the decoded bytes, anything else
+    is returned as text.
+
+    Args:
+        data_uri (str): data uri
+
+    Returns:
+        Union[dict, str]: parsed JSON object or decoded text.
+    """  # noqa: E501
+    mediatype, is_base64, payload = split_data_uri(data_uri)
+    data = _decode_payload(is_base64, payload)
+    starts_with_brace = data[:1] == b"{"
+    if starts_with_brace or _is_json_mediatype(mediatype):
+        try:
+            content = json.loads(data)
+            if isinstance(content, dict):
+                return content
+        except ValueError:
+            if starts_with_brace:
+                raise
+    return data.decode("utf-8")
+
+
+def decode_data_url(data_url):  # type: ignore[no-untyped-def]
+    _, is_base64, payload = split_data_uri(data_url)
+    return _decode_payload(is_base64, payload).decode("utf-8")
 
 
 @AdapterRegistry.register
@@ -42,9 +119,10 @@ class DataURIAdapter(BaseAdapter):
         Returns:
             httpx.Response: encoded data uri response.
         """
+        text = await run_cpu_bound(decode_data_url, url, size=len(url))
         response = httpx.Response(
             status_code=200,
-            text=decode_data_url(url),  # type: ignore[no-untyped-call]
+            text=text,
             request=httpx.Request(method="GET", url=url),
         )
         return response
@@ -82,13 +160,10 @@ class DataURIAdapter(BaseAdapter):
         Returns:
             httpx.Response: encoded data uri response.
         """
-        response_headers = {}
-        with urlopen(url) as r:
-            message: Message = r.info()
-            response_headers = dict(message._headers)  # type: ignore[attr-defined]
+        mime_type, size = get_data_uri_mime_type_and_size(url)
         response = httpx.Response(
             status_code=200,
-            headers=response_headers,
+            headers={"content-type": mime_type, "content-length": str(size)},
             request=httpx.Request(method="HEAD", url=url),
         )
         return response
@@ -1,2 +1,11 @@
 from .base_fetcher import BaseFetcher
+from .circuit_breaker import (
+    FetchSkippedError,
+    HostCircuitBreaker,
+    HostCircuitOpenError,
+    NegativeURICache,
+    RecentlyFailedURIError,
+)
 from .metadata_fetcher import MetadataFetcher
+from .rate_limiter import AdaptiveHostLimiter
+from .scheduler import FairHostScheduler
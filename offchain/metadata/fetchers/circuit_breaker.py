@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from urllib3.util import parse_url
+
+from offchain.base.types import StringEnum
+from offchain.logger.logging import logger
+
+# Schemes that are served through a pool of gateways by an adapter rather than
+# by the host in the uri, e.g. "ipfs://<cid>" is fetched from an IPFS gateway.
+GATEWAY_SCHEMES = ("ipfs", "ar")
+
+
+class FetchSkippedError(Exception):
+    """Base class for errors raised when a request is skipped without touching the network."""  # noqa: E501
+
+
+class HostCircuitOpenError(FetchSkippedError):
+    """Raised when a host has failed too many times in a row and is temporarily skipped."""  # noqa: E501
+
+
+class RecentlyFailedURIError(FetchSkippedError):
+    """Raised when a uri has recently failed and is not yet due for a re-check."""
+
+
+def get_host_key(uri: str) -> Optional[str]:
+    """Get the key used to track the health of the host serving a uri.
+
+    Gateway-backed schemes (ipfs://, ar://) share a single key per scheme since every
+    request for them goes through the same gateway pool. Data uris are never tracked.
+
+    Args:
+        uri (str): uri to get the host key for.
+
+    Returns:
+        Optional[str]: host key, or None if the uri should not be tracked.
+    """
+    if uri.startswith("data:"):
+        return None
+    try:
+        parsed = parse_url(uri)
+    except Exception:
+        return None
+    if parsed.scheme in GATEWAY_SCHEMES:
+        return f"{parsed.scheme}://"
+    return parsed.host
+
+
+@dataclass
+class _URIFailure:
+    failures: int
+    retry_at: float
+
+
+class NegativeURICache:
+    """Remembers recently failed uris so they are not re-fetched on every attempt.
+
+    Each consecutive failure doubles the time before the uri is tried again, starting at
+    `base_ttl` seconds and capped at `max_ttl` seconds. A successful fetch clears the entry.
+
+    Attributes:
+        base_ttl (float): seconds to wait before re-checking a uri after its first failure.
+        max_ttl (float): maximum seconds to wait before re-checking a uri.
+        max_size (int): maximum number of uris to remember, oldest entries are evicted first.
+    """  # noqa: E501
+
+    def __init__(
+        self,
+        base_ttl: float = 60,
+        max_ttl: float = 60 * 60,
+        max_size: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.base_ttl = base_ttl
+        self.max_ttl = max_ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._entries: OrderedDict[str, _URIFailure] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, uri: str) -> None:
+        """Raise if the uri has recently failed and is not yet due for a re-check.
+
+        Args:
+            uri (str): uri about to be fetched.
+
+        Raises:
+            RecentlyFailedURIError: if the uri should be skipped.
+        """
+        with self._lock:
+            entry = self._entries.get(uri)
+            if entry is None:
+                return
+            remaining = entry.retry_at - self._clock()
+        if remaining > 0:
+            raise RecentlyFailedURIError(
+                f"uri failed {entry.failures} time(s) in a row, next re-check in {remaining:.0f}s"  # noqa: E501
+            )
+
+    def record_failure(self, uri: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(uri, None)
+            failures = entry.failures + 1 if entry else 1
+            ttl = min(self.base_ttl * 2 ** (failures - 1), self.max_ttl)
+            self._entries[uri] = _URIFailure(
+                failures=failures, retry_at=self._clock() + ttl
+            )
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def record_success(self, uri: str) -> None:
+        with self._lock:
+            self._entries.pop(uri, None)
+
+
+class CircuitState(StringEnum):
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+
+@dataclass
+class _HostCircuit:
+    state: CircuitState = CircuitState.CLOSED
+    consecutive_failures: int = 0
+    opened_at: float = 0
+    probe_in_flight: bool = False
+
+
+class HostCircuitBreaker:
+    """Per-host circuit breaker that fails fast for hosts that keep failing.
+
+    After `failure_threshold` consecutive failures the circuit for a host opens and every
+    request to it is rejected without hitting the network. Once `reset_timeout` seconds
+    have passed a single probe request is let through (half-open): if it succeeds the
+    circuit closes again, otherwise it re-opens for another `reset_timeout`.
+
+    Attributes:
+        failure_threshold (int): consecutive failures before the circuit opens.
+        reset_timeout (float): seconds to wait before letting a probe request through.
+    """  # noqa: E501
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._circuits: dict[str, _HostCircuit] = {}
+        self._lock = threading.Lock()
+
+    def get_state(self, host: str) -> CircuitState:
+        with self._lock:
+            circuit = self._circuits.get(host)
+            return circuit.state if circuit else CircuitState.CLOSED
+
+    def before_request(self, host: str) -> None:
+        """Raise if requests to the host should currently be rejected.
+
+        Args:
+            host (str): host key of the request about to be made.
+
+        Raises:
+            HostCircuitOpenError: if the circuit for the host is open.
+        """
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.state == CircuitState.CLOSED:
+                return
+            elapsed = self._clock() - circuit.opened_at
+            if circuit.state == CircuitState.OPEN and elapsed >= self.reset_timeout:
+                circuit.state = CircuitState.HALF_OPEN
+            if circuit.state == CircuitState.HALF_OPEN and not circuit.probe_in_flight:
+                circuit.probe_in_flight = True
+                return
+            failures = circuit.consecutive_failures
+        raise HostCircuitOpenError(
+            f"Circuit for host {host} is open after {failures} consecutive failures"
+        )
+
+    def release_probe(self, host: str) -> None:
+        """Let another probe through after a request that ended with neither a success nor a failure.
+
+        Args:
+            host (str): host key of the request, ex: one that was cancelled.
+        """  # noqa: E501
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is not None and circuit.state == CircuitState.HALF_OPEN:
+                circuit.probe_in_flight = False
+
+    def record_success(self, host: str) -> None:
+        with self._lock:
+            circuit = self._circuits.pop(host, None)
+        if circuit is not None and circuit.state != CircuitState.CLOSED:
+            logger.info(f"Circuit for host {host} closed")
+
+    def record_failure(self, host: str) -> None:
+        with self._lock:
+            circuit = self._circuits.setdefault(host, _HostCircuit())
+            circuit.consecutive_failures += 1
+            circuit.probe_in_flight = False
+            should_open = (
+                circuit.state == CircuitState.HALF_OPEN
+                or circuit.consecutive_failures >= self.failure_threshold
+            )
+            if not should_open:
+                return
+            was_open = circuit.state != CircuitState.CLOSED
+            circuit.state = CircuitState.OPEN
+            circuit.opened_at = self._clock()
+        if not was_open:
+            logger.warning(
+                f"Circuit for host {host} opened after {circuit.consecutive_failures} consecutive failures"  # noqa: E501
+            )
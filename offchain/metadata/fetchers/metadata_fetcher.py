@@ -1,12 +1,30 @@
+import asyncio
 import cgi
-from typing import Optional, Tuple, Union
+import json
+from typing import Any, Callable, Optional, Tuple, Union
 
 import httpx
 import requests
 
+from offchain.concurrency import run_cpu_bound
 from offchain.logger.logging import logger
 from offchain.metadata.adapters import Adapter, AdapterConfig, DEFAULT_ADAPTER_CONFIGS
+from offchain.metadata.adapters.data_uri import (
+    decode_data_uri,
+    get_data_uri_mime_type_and_size,
+)
 from offchain.metadata.fetchers.base_fetcher import BaseFetcher
+from offchain.metadata.fetchers.circuit_breaker import (
+    FetchSkippedError,
+    get_host_key,
+    HostCircuitBreaker,
+    NegativeURICache,
+)
+from offchain.metadata.fetchers.rate_limiter import (
+    AdaptiveHostLimiter,
+    parse_retry_after,
+)
+from offchain.metadata.fetchers.scheduler import FairHostScheduler
 from offchain.metadata.registries.fetcher_registry import FetcherRegistry
 
 
@@ -18,6 +36,14 @@ class MetadataFetcher(BaseFetcher):
         timeout (int): request timeout in seconds.
         max_retries (int): maximum number of request retries.
         sess (requests.Session): a requests Session object.
+        negative_cache (NegativeURICache): cache of recently failed uris that are skipped
+            until they are due for a re-check.
+        circuit_breaker (HostCircuitBreaker): per-host circuit breaker that fails fast
+            for hosts that keep failing.
+        rate_limiter (AdaptiveHostLimiter): per-host adaptive concurrency limiter for
+            async requests.
+        scheduler (FairHostScheduler): shares async request slots fairly between hosts,
+            using `rate_limiter` as the per-host cap.
     """
 
     def __init__(
@@ -25,12 +51,22 @@ class MetadataFetcher(BaseFetcher):
         timeout: int = 30,
         max_retries: int = 0,
         async_adapter_configs: Optional[list[AdapterConfig]] = DEFAULT_ADAPTER_CONFIGS,
+        negative_cache: Optional[NegativeURICache] = None,
+        circuit_breaker: Optional[HostCircuitBreaker] = None,
+        rate_limiter: Optional[AdaptiveHostLimiter] = None,
+        scheduler: Optional[FairHostScheduler] = None,
     ) -> None:
         self.timeout = timeout
         self.max_retries = max_retries
         self.sess = requests.Session()
         self.async_sess = httpx.AsyncClient()
         self.async_adapter_configs = async_adapter_configs
+        self.negative_cache = negative_cache or NegativeURICache()
+        self.circuit_breaker = circuit_breaker or HostCircuitBreaker()
+        self.scheduler = scheduler or FairHostScheduler(
+            limiter=rate_limiter or AdaptiveHostLimiter()
+        )
+        self.rate_limiter = self.scheduler.limiter
 
     def register_adapter(self, adapter: Adapter, url_prefix: str):  # type: ignore[no-untyped-def]  # noqa: E501
         """Register an adapter to a url prefix. Note this only affects synchronous http
@@ -79,13 +115,87 @@ class MetadataFetcher(BaseFetcher):
         )
         return None
 
+    def _check_uri(self, uri: str) -> Optional[str]:
+        """Fail fast if the uri or its host recently failed. Returns the uri's host key."""  # noqa: E501
+        host = get_host_key(uri)
+        if host is not None:
+            self.negative_cache.check(uri)
+            self.circuit_breaker.before_request(host)
+        return host
+
+    def _release_uri_check(self, host: Optional[str]) -> None:
+        # The request ended without a result for the host (ex: it was cancelled), so a
+        # half-open probe it may have held goes back to the circuit breaker
+        if host is not None:
+            self.circuit_breaker.release_probe(host)
+
+    def _record_uri_result(self, uri: str, host: Optional[str], ok: bool) -> None:
+        if host is None:
+            return
+        if ok:
+            self.negative_cache.record_success(uri)
+        else:
+            self.negative_cache.record_failure(uri)
+
+    def _record_host_result(self, host: Optional[str], status_code: Optional[int]) -> None:  # noqa: E501
+        # Connection errors, timeouts and 5xx responses count against the host,
+        # anything else (including 4xx) means the host itself is up.
+        if host is None:
+            return
+        if status_code is None or status_code >= 500:
+            self.circuit_breaker.record_failure(host)
+        else:
+            self.circuit_breaker.record_success(host)
+
+    def _send(self, uri: str, send_fn: Callable[[], Any]) -> Any:
+        host = get_host_key(uri)
+        try:
+            res = send_fn()
+        except Exception:
+            self._record_host_result(host, None)
+            raise
+        self._record_host_result(host, res.status_code)
+        return res
+
     def _head(self, uri: str):  # type: ignore[no-untyped-def]
-        return self.sess.head(uri, timeout=self.timeout, allow_redirects=True)
+        return self._send(
+            uri,
+            lambda: self.sess.head(uri, timeout=self.timeout, allow_redirects=True),
+        )
 
     def _get(self, uri: str):  # type: ignore[no-untyped-def]
-        return self.sess.get(uri, timeout=self.timeout, allow_redirects=True)
+        return self._send(
+            uri,
+            lambda: self.sess.get(uri, timeout=self.timeout, allow_redirects=True),
+        )
 
     async def _gen(self, uri: str, method: Optional[str] = "GET") -> httpx.Response:
+        host = get_host_key(uri)
+        if host is None:
+            return await self._gen_send(uri, method)
+
+        started_at = await self.scheduler.acquire(host)
+        try:
+            res = await self._gen_send(uri, method)
+        except asyncio.CancelledError:
+            # The caller gave up on the request, which says nothing about the host
+            self.scheduler.abort(host)
+            self._release_uri_check(host)
+            raise
+        except BaseException:
+            self.scheduler.release(host, started_at, None)
+            self._record_host_result(host, None)
+            raise
+        self.scheduler.release(
+            host,
+            started_at,
+            res.status_code,
+            retry_after=parse_retry_after(res.headers.get("retry-after")),
+        )
+        self._record_host_result(host, res.status_code)
+        return res
+
+    async def _gen_send(self, uri: str, method: Optional[str] = "GET") -> httpx.Response:  # noqa: E501
         async_adapter = self._get_async_adapter_for_uri(uri)
         if async_adapter is not None:
             if method == "HEAD":
@@ -100,6 +210,26 @@ class MetadataFetcher(BaseFetcher):
             uri, timeout=self.timeout, follow_redirects=True
         )
 
+    def get_host_metrics(self) -> dict[str, dict[str, Any]]:
+        """Current concurrency limit, in-flight requests and queue depth per host.
+
+        Returns:
+            dict[str, dict[str, Any]]: metrics keyed by host.
+        """
+        return self.scheduler.get_metrics()
+
+    def _data_uri_mime_type_and_size(self, uri: str) -> Tuple[str, str]:
+        # data uris carry their own content, there is nothing to request
+        mediatype, size = get_data_uri_mime_type_and_size(uri)
+        content_type, _ = cgi.parse_header(mediatype)
+        return content_type, str(size)
+
+    def _data_uri_content(self, uri: str) -> Union[dict, str]:  # type: ignore[type-arg]
+        try:
+            return decode_data_uri(uri)
+        except Exception as e:
+            raise Exception(f"Don't know how to fetch metadata for {uri=}. {str(e)}")
+
     async def _gen_head(self, uri: str) -> httpx.Response:
         return await self._gen(uri=uri, method="HEAD")
 
@@ -112,12 +242,16 @@ class MetadataFetcher(BaseFetcher):
         Returns:
             tuple[str, int]: mime type and size
         """
+        if uri.startswith("data:"):
+            return self._data_uri_mime_type_and_size(uri)  # type: ignore[return-value]
+        host = self._check_uri(uri)
         try:
             res = self._head(uri)
             # For any error status, try a get
             if 300 <= res.status_code < 600:
                 res = self._get(uri)
             res.raise_for_status()
+            self._record_uri_result(uri, host, ok=True)
             headers = res.headers
             size = headers.get("content-length", 0)
             content_type = headers.get("content-type") or headers.get("Content-Type")
@@ -126,10 +260,15 @@ class MetadataFetcher(BaseFetcher):
 
             return content_type, size
         except Exception as e:
+            if not isinstance(e, FetchSkippedError):
+                self._record_uri_result(uri, host, ok=False)
             logger.error(
                 f"Failed to fetch content-type and size from uri {uri}. Error: {e}"
             )
             raise
+        except BaseException:
+            self._release_uri_check(host)
+            raise
 
     async def gen_fetch_mime_type_and_size(self, uri: str) -> Tuple[str, int]:
         """Fetch the mime type and size of the content at a given uri.
@@ -140,12 +279,16 @@ class MetadataFetcher(BaseFetcher):
         Returns:
             tuple[str, int]: mime type and size
         """
+        if uri.startswith("data:"):
+            return self._data_uri_mime_type_and_size(uri)  # type: ignore[return-value]
+        host = self._check_uri(uri)
         try:
             res = await self._gen_head(uri)
             # For any error status, try a get
             if 300 <= res.status_code < 600:
                 res = await self._gen(uri)
             res.raise_for_status()
+            self._record_uri_result(uri, host, ok=True)
             headers = res.headers
             size = headers.get("content-length", 0)
             content_type = headers.get("content-type") or headers.get("Content-Type")
@@ -154,10 +297,15 @@ class MetadataFetcher(BaseFetcher):
 
             return content_type, size
         except Exception as e:
+            if not isinstance(e, FetchSkippedError):
+                self._record_uri_result(uri, host, ok=False)
             logger.error(
                 f"Failed to fetch content-type and size from uri {uri}. Error: {e}"
             )
             raise
+        except BaseException:
+            self._release_uri_check(host)
+            raise
 
     def fetch_content(self, uri: str) -> Union[dict, str]:  # type: ignore[type-arg]
         """Fetch the content at a given uri
@@ -168,16 +316,26 @@ class MetadataFetcher(BaseFetcher):
         Returns:
             Union[dict, str]: content fetched from uri
         """
+        if uri.startswith("data:"):
+            return self._data_uri_content(uri)
+        host = self._check_uri(uri)
         try:
             res = self._get(uri)
             res.raise_for_status()
+            self._record_uri_result(uri, host, ok=True)
             if res.text.startswith("{"):
                 return res.json()  # type: ignore[no-any-return]
             else:
                 return res.text  # type: ignore[no-any-return]
 
+        except FetchSkippedError:
+            raise
         except Exception as e:
+            self._record_uri_result(uri, host, ok=False)
             raise Exception(f"Don't know how to fetch metadata for {uri=}. {str(e)}")
+        except BaseException:
+            self._release_uri_check(host)
+            raise
 
     async def gen_fetch_content(self, uri: str) -> Union[dict, str]:  # type: ignore[type-arg]  # noqa: E501
         """Async fetch the content at a given uri
@@ -188,13 +346,30 @@ class MetadataFetcher(BaseFetcher):
         Returns:
             Union[dict, str]: content fetched from uri
         """
+        if uri.startswith("data:"):
+            try:
+                return await run_cpu_bound(decode_data_uri, uri, size=len(uri))  # type: ignore[no-any-return]  # noqa: E501
+            except Exception as e:
+                raise Exception(
+                    f"Don't know how to fetch metadata for {uri=}. {str(e)}"
+                )
+        host = self._check_uri(uri)
         try:
             res = await self._gen(uri)
             res.raise_for_status()
-            if res.text.startswith("{"):
-                return res.json()  # type: ignore[no-any-return]
+            self._record_uri_result(uri, host, ok=True)
+            text = res.text
+            if text.startswith("{"):
+                # Large bodies are parsed off the event loop
+                return await run_cpu_bound(json.loads, text, size=len(text))  # type: ignore[no-any-return]  # noqa: E501
             else:
-                return res.text
+                return text
 
+        except FetchSkippedError:
+            raise
         except Exception as e:
+            self._record_uri_result(uri, host, ok=False)
             raise Exception(f"Don't know how to fetch metadata for {uri=}. {str(e)}")
+        except BaseException:
+            self._release_uri_check(host)
+            raise
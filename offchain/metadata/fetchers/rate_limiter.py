@@ -0,0 +1,209 @@
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+from offchain.logger.logging import logger
+
+# Status codes that signal the host wants us to slow down
+THROTTLE_STATUS_CODES = {429, 503}
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:  # noqa: E501
+    """Parse a Retry-After header into a number of seconds to wait.
+
+    Args:
+        value (Optional[str]): header value, either delay-seconds or an http date.
+        now (Optional[float], optional): current unix time. Defaults to time.time().
+
+    Returns:
+        Optional[float]: seconds to wait, if the header could be parsed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except Exception:
+        return None
+    return max(0.0, retry_at - (now if now is not None else time.time()))
+
+
+@dataclass
+class _HostLimit:
+    limit: float
+    in_flight: int = 0
+    blocked_until: float = 0
+    last_decrease_at: float = 0
+    latency_ewma: Optional[float] = None
+    min_latency: Optional[float] = None
+
+    @property
+    def capacity(self) -> int:
+        return max(1, int(self.limit))
+
+
+class AdaptiveHostLimiter:
+    """Per-host concurrency limiter using additive increase / multiplicative decrease.
+
+    Every host starts at `initial_limit` concurrent requests. Each successful response
+    grows the limit by roughly `increase` per window of in-flight requests, while a
+    throttling response (429, 503), a failed request or a latency spike well above the
+    usual latency of the host multiplies the limit by `decrease_factor`.
+    Retry-After headers pause the host entirely until the requested time. The usual
+    latency is the lowest latency EWMA seen, drifting up by `baseline_decay` of the gap
+    on every response so a host that got slower for good isn't seen as congested forever.
+
+    The limiter only keeps track of the limits, `FairHostScheduler` queues the requests
+    above them.
+
+    Attributes:
+        initial_limit (int): starting concurrency limit per host.
+        min_limit (int): lowest concurrency limit a host can be throttled down to.
+        max_limit (int): highest concurrency limit a host can grow to.
+        increase (float): additive increase per window of successful requests.
+        decrease_factor (float): multiplier applied to the limit on a throttling signal.
+        latency_tolerance (float): a latency EWMA above this multiple of the lowest
+            latency EWMA seen for the host counts as a throttling signal.
+        min_latency_signal (float): latencies below this many seconds never count as
+            a throttling signal, no matter how fast the host usually is.
+        max_retry_after (float): upper bound in seconds on how long a Retry-After header
+            can pause a host.
+        baseline_decay (float): share of the gap between the latency EWMA and the lowest
+            latency the baseline moves up by on every response.
+    """  # noqa: E501
+
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 100,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 3.0,
+        min_latency_signal: float = 1.0,
+        max_retry_after: float = 60,
+        baseline_decay: float = 0.01,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.min_latency_signal = min_latency_signal
+        self.max_retry_after = max_retry_after
+        self.baseline_decay = baseline_decay
+        self._clock = clock
+        self._hosts: dict[str, _HostLimit] = {}
+
+    def _get_host(self, host: str) -> _HostLimit:
+        if host not in self._hosts:
+            self._hosts[host] = _HostLimit(limit=float(self.initial_limit))
+        return self._hosts[host]
+
+    def has_capacity(self, host: str) -> bool:
+        """Whether a new request to the host can be started right now."""
+        state = self._get_host(host)
+        return (
+            state.in_flight < state.capacity and state.blocked_until <= self._clock()
+        )
+
+    def blocked_for(self, host: str) -> float:
+        """Seconds left until the host's Retry-After pause ends."""
+        return max(0.0, self._get_host(host).blocked_until - self._clock())
+
+    def start_request(self, host: str) -> float:
+        """Mark a request to the host as started. Returns the start timestamp."""
+        self._get_host(host).in_flight += 1
+        return self._clock()
+
+    def abort_request(self, host: str) -> None:
+        """Give back a slot that was granted but never used, without adjusting the limit."""  # noqa: E501
+        state = self._get_host(host)
+        state.in_flight = max(0, state.in_flight - 1)
+
+    def release(
+        self,
+        host: str,
+        started_at: float,
+        status_code: Optional[int],
+        retry_after: Optional[float] = None,
+    ) -> None:
+        """Mark a request to the host as finished and adjust the host's limit.
+
+        Args:
+            host (str): host key of the request.
+            started_at (float): start timestamp returned by `acquire`.
+            status_code (Optional[int]): response status code, None if the request failed.
+            retry_after (Optional[float], optional): seconds to pause the host for.
+        """  # noqa: E501
+        state = self._get_host(host)
+        now = self._clock()
+        state.in_flight = max(0, state.in_flight - 1)
+
+        latency = now - started_at
+        if status_code is not None:
+            state.latency_ewma = (
+                latency
+                if state.latency_ewma is None
+                else 0.8 * state.latency_ewma + 0.2 * latency
+            )
+            if state.min_latency is None or state.latency_ewma < state.min_latency:
+                state.min_latency = state.latency_ewma
+            else:
+                state.min_latency += self.baseline_decay * (
+                    state.latency_ewma - state.min_latency
+                )
+
+        if retry_after is not None and retry_after > 0:
+            state.blocked_until = max(
+                state.blocked_until, now + min(retry_after, self.max_retry_after)
+            )
+
+        throttled = status_code is None or status_code in THROTTLE_STATUS_CODES
+        too_slow = (
+            state.min_latency is not None
+            and state.latency_ewma is not None
+            and state.latency_ewma
+            > max(self.min_latency_signal, state.min_latency * self.latency_tolerance)
+        )
+        if throttled or too_slow:
+            # Only back off once per window: requests that were already in flight
+            # when we last decreased reflect the old limit.
+            if started_at >= state.last_decrease_at:
+                self._set_limit(host, state, state.limit * self.decrease_factor)
+                state.last_decrease_at = now
+                if too_slow:
+                    # Re-learn the latency baseline at the new concurrency
+                    state.latency_ewma = None
+        elif status_code < 400:  # type: ignore[operator]
+            self._set_limit(host, state, state.limit + self.increase / state.limit)
+
+    def _set_limit(self, host: str, state: _HostLimit, limit: float) -> None:
+        limit = min(float(self.max_limit), max(float(self.min_limit), limit))
+        if int(limit) != int(state.limit):
+            logger.debug(
+                f"Concurrency limit for host {host} changed to {int(limit)}",
+                extra={"host": host, "limit": int(limit)},
+            )
+        state.limit = limit
+
+    def get_metrics(self) -> dict[str, dict[str, Any]]:
+        """Current limit, in-flight count and latency for every host seen so far.
+
+        Returns:
+            dict[str, dict[str, Any]]: metrics keyed by host.
+        """
+        return {
+            host: {
+                "limit": state.capacity,
+                "in_flight": state.in_flight,
+                "latency_ewma": state.latency_ewma,
+                "blocked_for": self.blocked_for(host),
+            }
+            for host, state in self._hosts.items()
+        }
@@ -0,0 +1,178 @@
+import asyncio
+from collections import deque
+from typing import Any, Optional
+
+from offchain.metadata.fetchers.rate_limiter import AdaptiveHostLimiter
+
+
+class FairHostScheduler:
+    """Shares a global pool of in-flight request slots fairly between hosts.
+
+    Requests wait in a queue per host and free slots are handed out with deficit round
+    robin: every round each host with waiting requests earns its weight in credit and
+    may start one request per whole credit, as long as its own concurrency limit (from
+    the `AdaptiveHostLimiter`) allows it. A slow host therefore only ever holds its own
+    share of the slots, and the rest keep flowing to faster hosts.
+
+    Attributes:
+        limiter (AdaptiveHostLimiter): per-host concurrency limiter used as the per-host cap.
+        max_concurrency (int): maximum number of in-flight requests across all hosts.
+        host_weights (dict[str, float]): optional positive per-host weights, hosts not
+            listed use `default_weight`.
+        default_weight (float): weight of hosts not listed in `host_weights`.
+    """  # noqa: E501
+
+    def __init__(
+        self,
+        limiter: Optional[AdaptiveHostLimiter] = None,
+        max_concurrency: int = 100,
+        host_weights: Optional[dict[str, float]] = None,
+        default_weight: float = 1.0,
+    ) -> None:
+        # Hosts earn their weight in credit each round, a host without any would stall
+        invalid = {
+            host: weight for host, weight in (host_weights or {}).items() if weight <= 0
+        }
+        if default_weight <= 0:
+            invalid["default_weight"] = default_weight
+        if invalid:
+            raise ValueError(f"Host weights must be positive, got {invalid}")
+        self.limiter = limiter or AdaptiveHostLimiter()
+        self.max_concurrency = max_concurrency
+        self.host_weights = host_weights or {}
+        self.default_weight = default_weight
+        self._in_flight = 0
+        self._queues: dict[str, deque] = {}  # type: ignore[type-arg]
+        self._active_hosts: deque[str] = deque()
+        self._deficits: dict[str, float] = {}
+        self._wakeup_handle: Optional[asyncio.TimerHandle] = None
+
+    def _has_capacity(self, host: str) -> bool:
+        return self._in_flight < self.max_concurrency and self.limiter.has_capacity(
+            host
+        )
+
+    def _start(self, host: str) -> float:
+        self._in_flight += 1
+        return self.limiter.start_request(host)
+
+    async def acquire(self, host: str) -> float:
+        """Wait for this host's turn to start a request.
+
+        Args:
+            host (str): host key of the request.
+
+        Returns:
+            float: start timestamp to pass back to `release`.
+        """
+        if not self._queues.get(host) and self._has_capacity(host):
+            return self._start(host)
+
+        waiter = asyncio.get_running_loop().create_future()
+        if host not in self._queues:
+            self._queues[host] = deque()
+        if not self._queues[host]:
+            self._active_hosts.append(host)
+            self._deficits[host] = 0.0
+        self._queues[host].append(waiter)
+        self._dispatch()
+        try:
+            return await waiter  # type: ignore[no-any-return]
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted right as we got cancelled, hand it back
+                self.abort(host)
+            raise
+
+    def abort(self, host: str) -> None:
+        """Hand back the slot of a request that was cancelled, without counting it as a failure of the host.
+
+        Args:
+            host (str): host key of the request.
+        """  # noqa: E501
+        self._in_flight = max(0, self._in_flight - 1)
+        self.limiter.abort_request(host)
+        self._dispatch()
+
+    def release(
+        self,
+        host: str,
+        started_at: float,
+        status_code: Optional[int],
+        retry_after: Optional[float] = None,
+    ) -> None:
+        """Mark a request as finished and hand its slot to the next host in line.
+
+        Args:
+            host (str): host key of the request.
+            started_at (float): start timestamp returned by `acquire`.
+            status_code (Optional[int]): response status code, None if the request failed.
+            retry_after (Optional[float], optional): seconds to pause the host for.
+        """  # noqa: E501
+        self._in_flight = max(0, self._in_flight - 1)
+        self.limiter.release(host, started_at, status_code, retry_after=retry_after)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        progressed = True
+        while progressed and self._active_hosts:
+            progressed = False
+            for _ in range(len(self._active_hosts)):
+                if self._in_flight >= self.max_concurrency:
+                    return
+                host = self._active_hosts[0]
+                queue = self._queues[host]
+                while queue and queue[0].done():
+                    queue.popleft()
+                if not queue:
+                    self._active_hosts.popleft()
+                    self._deficits.pop(host, None)
+                    continue
+                if self._has_capacity(host):
+                    weight = self.host_weights.get(host, self.default_weight)
+                    self._deficits[host] += weight
+                    progressed = True
+                    while self._deficits[host] >= 1 and queue and self._has_capacity(host):  # noqa: E501
+                        waiter = queue.popleft()
+                        if waiter.done():
+                            continue
+                        waiter.set_result(self._start(host))
+                        self._deficits[host] -= 1
+                    if not queue:
+                        self._active_hosts.popleft()
+                        self._deficits.pop(host, None)
+                        continue
+                    # Don't let a host bank credit while it is held back by its limit
+                    self._deficits[host] = min(self._deficits[host], weight)
+                self._active_hosts.rotate(-1)
+        self._schedule_wakeup()
+
+    def _schedule_wakeup(self) -> None:
+        # Hosts paused by a Retry-After header need a timer to resume, since no
+        # release will come in to trigger the next dispatch for them.
+        delays = [
+            self.limiter.blocked_for(host)
+            for host in self._active_hosts
+            if self._queues[host]
+        ]
+        delays = [delay for delay in delays if delay > 0]
+        if not delays or self._wakeup_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._wakeup_handle = loop.call_later(min(delays), self._wakeup)
+
+    def _wakeup(self) -> None:
+        self._wakeup_handle = None
+        self._dispatch()
+
+    def get_metrics(self) -> dict[str, dict[str, Any]]:
+        """Per-host limit, in-flight count and queue depth.
+
+        Returns:
+            dict[str, dict[str, Any]]: metrics keyed by host.
+        """
+        metrics = self.limiter.get_metrics()
+        for host, host_metrics in metrics.items():
+            queue = self._queues.get(host, ())
+            host_metrics["queue_depth"] = sum(1 for w in queue if not w.done())
+        return metrics
@@ -93,6 +93,7 @@ class Metadata(BaseModel):
 
         additional_fields (list[MetadataField], optional): any additional metadata fields
             that don't fit in the defined schema.
+        block_number (int, optional): block the contract calls of the run were pinned to, if any.
 
     """  # noqa: E501
 
@@ -109,3 +110,5 @@ class Metadata(BaseModel):
     content: Optional[MediaDetails] = None
 
     additional_fields: Optional[list[MetadataField]] = None
+
+    block_number: Optional[int] = None
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from offchain.base.base_model import BaseModel  # type: ignore[attr-defined]
 from offchain.metadata.models.token import Token
 
@@ -9,12 +11,14 @@ class MetadataProcessingError(BaseModel):
         token (Token): a Token interface with all information required to uniquely identify an NFT
         error_type (str): the class of caught exception.
         error_message (str): the error message of the caught exception.
+        block_number (int, optional): block the contract calls of the run were pinned to, if any.
     """  # noqa: E501
 
     token: Token
 
     error_type: str
     error_message: str
+    block_number: Optional[int] = None
 
     @staticmethod
     def from_token_and_error(token: Token, e: Exception) -> "MetadataProcessingError":
@@ -2,6 +2,7 @@ import asyncio
 from typing import Optional
 from urllib.parse import quote
 
+from offchain.concurrency import run_cpu_bound
 from offchain.constants.addresses import CollectionAddress
 from offchain.metadata.models.metadata import Attribute, MediaDetails, Metadata
 from offchain.metadata.models.token import Token
@@ -53,18 +54,13 @@ class LootParser(CollectionParser):
             "getWeapon(uint256)",
         ]
 
-        results = await asyncio.gather(
-            *(
-                self.contract_caller.rpc.async_reader.gen_call_single_function_single_address_many_args(
-                    address=ADDRESS,
-                    function_sig=sig,
-                    return_type=["string"],
-                    args=[[token_id]],
-                )
-                for sig in sigs
-            )
+        results = await self.contract_caller.rpc.async_reader.gen_call_single_address_many_fns_many_args(
+            address=ADDRESS,
+            function_sigs=sigs,
+            return_types=[["string"] for _ in sigs],
+            args=[[token_id] for _ in sigs],
         )
-        return results  # type: ignore[return-value]
+        return [[results[sig]] for sig in sigs]  # type: ignore[return-value]
 
     def parse_attributes(self, attributes: dict) -> Optional[list[Attribute]]:  # type: ignore[type-arg]  # noqa: E501
         return [
@@ -122,7 +118,8 @@ class LootParser(CollectionParser):
 
     async def gen_image(self, raw_data: dict) -> Optional[MediaDetails]:  # type: ignore[type-arg]  # noqa: E501
         raw_image_uri = raw_data.get("image")
-        image_uri = quote(await self.fetcher.gen_fetch_content(raw_image_uri))  # type: ignore[arg-type]  # noqa: E501
+        image = await self.fetcher.gen_fetch_content(raw_image_uri)  # type: ignore[arg-type]  # noqa: E501
+        image_uri = await run_cpu_bound(quote, image, size=len(image))
 
         return MediaDetails(
             uri=image_uri, size=None, sha256=None, mime_type="image/svg+xml"
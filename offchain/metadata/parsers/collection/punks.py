@@ -2,6 +2,7 @@ import asyncio
 from typing import Optional
 from urllib.parse import quote
 
+from offchain.concurrency import run_cpu_bound
 from offchain.constants.addresses import CollectionAddress
 from offchain.metadata.models.metadata import (
     Attribute,
@@ -59,7 +60,9 @@ class PunksParser(CollectionParser):
 
     async def gen_image(self, index: int) -> Optional[MediaDetails]:
         raw_uri = await self.gen_call(index, "punkImageSvg(uint16)")
-        image_uri = self.encode_uri_data(raw_uri)  # type: ignore[arg-type]
+        image_uri = await run_cpu_bound(
+            self.encode_uri_data, raw_uri, size=len(raw_uri or "")
+        )
         return MediaDetails(
             uri=image_uri, size=None, sha256=None, mime_type="image/svg+xml"
         )  # noqa: E501
@@ -1,2 +1,3 @@
 from .base_pipeline import BasePipeline
 from .metadata_pipeline import MetadataPipeline
+from .incremental_refresh import BlockCursorStore, IncrementalRefresher, RefreshPlan
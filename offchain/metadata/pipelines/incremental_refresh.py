@@ -0,0 +1,296 @@
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional, Union
+
+from offchain.logger.logging import logger
+from offchain.metadata.models.metadata import Metadata
+from offchain.metadata.models.metadata_processing_error import MetadataProcessingError
+from offchain.metadata.pipelines.metadata_pipeline import (
+    COLLECTION_WINDOW_SIZE,
+    MetadataPipeline,
+)
+from offchain.web3.logs import (
+    AdaptiveLogRange,
+    get_block_number,
+    iter_logs,
+    TRANSFER_EVENT_TOPIC,
+    ZERO_ADDRESS_TOPIC,
+)
+
+# keccak256("MetadataUpdate(uint256)") and keccak256("BatchMetadataUpdate(uint256,uint256)"), see ERC4906
+METADATA_UPDATE_TOPIC = "0xf8e1a15aba9398e019f0b49df1a4fde98ee17ae345cb5f6b5e2c27f5033e8ce7"
+BATCH_METADATA_UPDATE_TOPIC = "0x6bd5c950a8d8df17f772f5af37cb3655737899cbf903264b9795592da439661c"
+# BatchMetadataUpdate ranges larger than this refresh the whole collection instead
+MAX_BATCH_UPDATE_SIZE = 100_000
+
+
+class BlockCursorStore:
+    """Next block to read the logs of each collection from.
+
+    Cursors are kept in memory, and saved to a JSON file if a path is given.
+
+    Attributes:
+        path (Optional[str]): JSON file cursors are loaded from and saved to.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self._cursors: dict[str, int] = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self._cursors = json.load(f)
+
+    @staticmethod
+    def _key(chain_identifier: str, collection_address: str) -> str:
+        return f"{chain_identifier}:{collection_address.lower()}"
+
+    def get(self, chain_identifier: str, collection_address: str) -> Optional[int]:
+        with self._lock:
+            return self._cursors.get(self._key(chain_identifier, collection_address))
+
+    def set(self, chain_identifier: str, collection_address: str, block_number: int) -> None:
+        with self._lock:
+            self._cursors[self._key(chain_identifier, collection_address)] = block_number
+            if self.path is not None:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(self._cursors, f)
+                os.replace(tmp_path, self.path)
+
+
+@dataclass
+class RefreshPlan:
+    """Tokens of a collection to re-process after the logs of a range of blocks.
+
+    Attributes:
+        chain_identifier (str): chain of the collection.
+        collection_address (str): collection address.
+        from_block (int): first block the logs were read from.
+        to_block (int): last block the logs were read from.
+        token_ids (set[int]): tokens minted or updated one at a time.
+        ranges (list[range]): ranges of tokens updated by BatchMetadataUpdate events.
+        full_refresh (bool): whether every token of the collection needs re-processing.
+    """
+
+    chain_identifier: str
+    collection_address: str
+    from_block: int
+    to_block: int
+    token_ids: set[int] = field(default_factory=set)
+    ranges: list[range] = field(default_factory=list)
+    full_refresh: bool = False
+
+    def is_empty(self) -> bool:
+        return not (self.full_refresh or self.token_ids or self.ranges)
+
+    def merged_ranges(self) -> list[range]:
+        merged: list[range] = []
+        for r in sorted(self.ranges, key=lambda r: r.start):
+            if merged and r.start <= merged[-1].stop:
+                merged[-1] = range(merged[-1].start, max(merged[-1].stop, r.stop))
+            else:
+                merged.append(r)
+        return merged
+
+    def iter_token_ids(self) -> Iterator[int]:
+        """Token ids to re-process, each once."""
+        ranges = self.merged_ranges()
+        yield from sorted(
+            token_id
+            for token_id in self.token_ids
+            if not any(token_id in r for r in ranges)
+        )
+        for r in ranges:
+            yield from r
+
+
+class IncrementalRefresher:
+    """Re-processes only the tokens of a collection that changed since the last refresh.
+
+    Changed tokens are found from the ERC4906 `MetadataUpdate` / `BatchMetadataUpdate` and
+    mint (Transfer from zero) logs since the collection's block cursor, read with eth_getLogs
+    in block ranges adapted to the density of the logs. Their uris are dropped from the
+    pipeline's `uri_index`, if any, before they're re-processed. The first refresh of a
+    collection without a cursor or `from_block` re-processes the whole collection.
+
+    Attributes:
+        pipeline (MetadataPipeline): pipeline the changed tokens are processed with.
+        cursor_store (BlockCursorStore): next block to read the logs of each collection from.
+        confirmations (int): blocks behind the chain head to read logs up to, so reorgs don't
+            move the cursor past logs that end up in other blocks.
+        max_batch_update_size (int): BatchMetadataUpdate ranges larger than this refresh the
+            whole collection instead.
+    """  # noqa: E501
+
+    def __init__(
+        self,
+        pipeline: MetadataPipeline,
+        cursor_store: Optional[BlockCursorStore] = None,
+        confirmations: int = 0,
+        max_batch_update_size: int = MAX_BATCH_UPDATE_SIZE,
+    ) -> None:
+        self.pipeline = pipeline
+        self.cursor_store = cursor_store or BlockCursorStore()
+        self.confirmations = confirmations
+        self.max_batch_update_size = max_batch_update_size
+        self._log_ranges: dict[str, AdaptiveLogRange] = {}
+
+    def _get_log_range(self, chain_identifier: str) -> AdaptiveLogRange:
+        log_range = self._log_ranges.get(chain_identifier)
+        if log_range is None:
+            log_range = self._log_ranges[chain_identifier] = AdaptiveLogRange()
+        return log_range
+
+    def plan(
+        self,
+        collection_address: str,
+        chain_identifier: str = "ETHEREUM-MAINNET",
+        from_block: Optional[int] = None,
+        to_block: Optional[int] = None,
+    ) -> RefreshPlan:
+        """Find the tokens of a collection that changed in a range of blocks.
+
+        Args:
+            collection_address (str): collection address.
+            chain_identifier (str, optional): chain of the collection. Defaults to "ETHEREUM-MAINNET".
+            from_block (Optional[int], optional): first block to read logs from. Defaults to the
+                collection's cursor, or a full refresh up to `to_block` if it has none.
+            to_block (Optional[int], optional): last block to read logs from. Defaults to the
+                current block minus `confirmations`.
+
+        Returns:
+            RefreshPlan: tokens to re-process.
+        """  # noqa: E501
+        rpc = self.pipeline.chain_router.get_contract_caller(chain_identifier).rpc
+        if from_block is None:
+            from_block = self.cursor_store.get(chain_identifier, collection_address)
+        if to_block is None:
+            to_block = get_block_number(rpc) - self.confirmations
+        plan = RefreshPlan(
+            chain_identifier=chain_identifier,
+            collection_address=collection_address,
+            from_block=0 if from_block is None else from_block,
+            to_block=to_block,
+        )
+        if from_block is None:
+            # Without a cursor, every token changed: enumerate the collection rather than
+            # collect every mint since block 0
+            plan.full_refresh = True
+            return plan
+        if from_block > to_block:
+            return plan
+
+        log_range = self._get_log_range(chain_identifier)
+        update_logs = iter_logs(
+            rpc,
+            collection_address,
+            [[METADATA_UPDATE_TOPIC, BATCH_METADATA_UPDATE_TOPIC]],
+            from_block=from_block,
+            to_block=to_block,
+            log_range=log_range,
+        )
+        for log in update_logs:
+            topics, data = log.get("topics") or [], log.get("data") or "0x"
+            if not topics:
+                continue
+            if topics[0] == METADATA_UPDATE_TOPIC:
+                plan.token_ids.add(int(data[2:66], 16))
+                continue
+            start, stop = int(data[2:66], 16), int(data[66:130], 16) + 1
+            if stop - start > self.max_batch_update_size:
+                plan.full_refresh = True
+            elif stop > start:
+                plan.ranges.append(range(start, stop))
+
+        if not plan.full_refresh:
+            mint_logs = iter_logs(
+                rpc,
+                collection_address,
+                [TRANSFER_EVENT_TOPIC, ZERO_ADDRESS_TOPIC],
+                from_block=from_block,
+                to_block=to_block,
+                log_range=log_range,
+            )
+            for log in mint_logs:
+                topics = log.get("topics") or []
+                if len(topics) == 4:
+                    plan.token_ids.add(int(topics[3], 16))
+        return plan
+
+    def refresh(
+        self,
+        collection_address: str,
+        chain_identifier: str = "ETHEREUM-MAINNET",
+        from_block: Optional[int] = None,
+        to_block: Optional[int] = None,
+        window_size: int = COLLECTION_WINDOW_SIZE,
+        parallelize: bool = True,
+        select_metadata_fn: Optional[Callable] = None,  # type: ignore[type-arg]
+    ) -> Iterator[Union[Metadata, MetadataProcessingError]]:
+        """Re-process the tokens of a collection that changed since its cursor, see `plan`.
+
+        Contract calls are pinned to the last block logs were read from, and the cursor moves
+        past it once every result has been consumed.
+
+        Args:
+            collection_address (str): collection address.
+            chain_identifier (str, optional): chain of the collection. Defaults to "ETHEREUM-MAINNET".
+            from_block (Optional[int], optional): first block to read logs from. Defaults to the
+                collection's cursor, or a full refresh up to `to_block` if it has none.
+            to_block (Optional[int], optional): last block to read logs from. Defaults to the
+                current block minus `confirmations`.
+            window_size (int, optional): tokens processed at a time, see `MetadataPipeline.run_collection`.
+                Defaults to 500.
+            parallelize (bool, optional): whether or not metadata should be processed in parallel.
+                Defaults to True.
+            select_metadata_fn (Optional[Callable], optional): optionally specify a function to
+                select a metadata object from a list of metadata. Defaults to None.
+
+        Returns:
+            Iterator[Union[Metadata, MetadataProcessingError]]: lazy iterator of Metadatas or
+                MetadataProcessingErrors of the changed tokens.
+        """  # noqa: E501
+        plan = self.plan(collection_address, chain_identifier, from_block, to_block)
+        return self._run_plan(plan, window_size, parallelize, select_metadata_fn)
+
+    def _invalidate_uris(self, plan: RefreshPlan) -> None:
+        uri_index = self.pipeline.uri_index
+        if uri_index is None:
+            return
+        if plan.full_refresh:
+            uri_index.invalidate(plan.chain_identifier, plan.collection_address)
+            return
+        uri_index.invalidate(plan.chain_identifier, plan.collection_address, plan.token_ids)
+        for r in plan.merged_ranges():
+            uri_index.invalidate(plan.chain_identifier, plan.collection_address, r)
+
+    def _run_plan(
+        self,
+        plan: RefreshPlan,
+        window_size: int,
+        parallelize: bool,
+        select_metadata_fn: Optional[Callable],  # type: ignore[type-arg]
+    ) -> Iterator[Union[Metadata, MetadataProcessingError]]:
+        if not plan.is_empty():
+            self._invalidate_uris(plan)
+            logger.debug(
+                f"({plan.chain_identifier}-{plan.collection_address}) Refreshing blocks {plan.from_block} to {plan.to_block}. "  # noqa: E501
+                f"Full refresh: {plan.full_refresh}. Tokens: {len(plan.token_ids)}. Ranges: {len(plan.ranges)}."
+            )
+            yield from self.pipeline.run_collection(
+                plan.collection_address,
+                plan.chain_identifier,
+                id_range=None if plan.full_refresh else plan.iter_token_ids(),
+                enumerate=plan.full_refresh,
+                window_size=window_size,
+                parallelize=parallelize,
+                select_metadata_fn=select_metadata_fn,
+                block_number=plan.to_block,
+            )
+        if plan.to_block >= plan.from_block:
+            self.cursor_store.set(
+                plan.chain_identifier, plan.collection_address, plan.to_block + 1
+            )
@@ -1,10 +1,15 @@
 import asyncio
-from typing import Callable, Optional, Union
+import copy
+import random
+import time
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
 
 from offchain.concurrency import batched_parmap
 from offchain.logger.logging import logger
 from offchain.metadata.adapters import Adapter, AdapterConfig, DEFAULT_ADAPTER_CONFIGS
 from offchain.metadata.fetchers.base_fetcher import BaseFetcher
+from offchain.metadata.fetchers.circuit_breaker import FetchSkippedError
 from offchain.metadata.fetchers.metadata_fetcher import MetadataFetcher
 from offchain.metadata.models.metadata import Metadata
 from offchain.metadata.models.metadata_processing_error import MetadataProcessingError
@@ -15,7 +20,27 @@ from offchain.metadata.parsers import (  # type: ignore[attr-defined]  # noqa: E
 )
 from offchain.metadata.pipelines.base_pipeline import BasePipeline
 from offchain.metadata.registries.parser_registry import ParserRegistry
+from offchain.web3.block_pinning import pin_run_blocks
+from offchain.web3.chain_router import ChainRouter
 from offchain.web3.contract_caller import ContractCaller
+from offchain.web3.read_async import AsyncContractReader
+from offchain.web3.token_enumeration import iter_collection_token_ids
+from offchain.web3.token_standards import (
+    ERC1155_INTERFACE_ID,
+    ERC1155_URI_SIGNATURE,
+    SUPPORTS_INTERFACE_SIGNATURE,
+    TokenStandard,
+    get_token_uri_signature,
+    substitute_erc1155_id,
+)
+from offchain.web3.token_uri_index import TokenKey, TokenURIIndex
+from offchain.web3.uri_template import (
+    infer_uri_template,
+    URI_INFERENCE_MIN_TOKENS,
+    URI_INFERENCE_SAMPLE_SIZE,
+    URI_VERIFICATION_SAMPLE_SIZE,
+    UriTemplate,
+)
 
 
 DEFAULT_PARSERS = (
@@ -34,6 +59,29 @@ def _truncate_uri(uri: str, max_length: int = 100) -> str:
     return uri[:keep_length] + "..." + uri[-keep_length:]
 
 
+def _token_key(token: Token) -> TokenKey:
+    return (token.chain_identifier, token.collection_address, token.token_id)
+
+
+def _first(results: Optional[list[Any]]) -> Optional[Any]:
+    return results[0] if results else None
+
+
+def _wrap_fetch_error(e: Exception, error_message: str) -> Exception:
+    # Keep the type of errors raised when a fetch was skipped (e.g. open circuit)
+    # so callers can tell them apart from genuine fetch failures.
+    if isinstance(e, FetchSkippedError):
+        return e.__class__(error_message)
+    return Exception(error_message)
+
+
+# Tokens of a collection processed at a time by `run_collection`
+COLLECTION_WINDOW_SIZE = 500
+# Seconds a collection answering neither supportsInterface nor uri(uint256) is treated as
+# ERC721 before it's probed again, in case the calls failed rather than reverted
+TOKEN_STANDARD_RETRY_TTL = 5 * 60
+
+
 class MetadataPipeline(BasePipeline):
     """Pipeline for processing NFT metadata.
 
@@ -46,6 +94,15 @@ class MetadataPipeline(BasePipeline):
         parsers (list[BaseParser], optional): a list of parser instances for parsing token metadata.
         adapter_configs: (list[AdapterConfig], optional): a list of adapter configs used to register adapters
             to specified url prefixes. This configuration affects both sync and async requests.
+        chain_router (ChainRouter, optional): routes contract calls for each token to the rpc providers
+            of the token's chain. Defaults to sending every call through contract_caller.
+        pin_block (bool, optional): pin the contract calls of each run to the block current at the
+            start of the run, for a consistent (and cacheable) snapshot. Defaults to False.
+        infer_base_uri (bool, optional): for large ERC721 batches, infer the `prefix{id}suffix` template
+            of a collection's token uris from a sample of them and synthesize the rest, re-checking a
+            random sample of synthesized uris against the contract in every batch. Defaults to False.
+        uri_index (TokenURIIndex, optional): persistent index of resolved token uris, consulted
+            before resolving uris with contract calls and updated after. Defaults to None.
     """  # noqa: E501
 
     def __init__(
@@ -54,8 +111,21 @@ class MetadataPipeline(BasePipeline):
         fetcher: Optional[BaseFetcher] = None,
         parsers: Optional[list[BaseParser]] = None,
         adapter_configs: Optional[list[AdapterConfig]] = None,
+        chain_router: Optional[ChainRouter] = None,
+        pin_block: bool = False,
+        infer_base_uri: bool = False,
+        uri_index: Optional[TokenURIIndex] = None,
     ) -> None:
+        if contract_caller is None and chain_router is not None:
+            contract_caller = chain_router.default
         self.contract_caller = contract_caller or ContractCaller()
+        self.chain_router = chain_router or ChainRouter(default=self.contract_caller)
+        self.pin_block = pin_block
+        self._token_standards: dict[tuple[str, str], TokenStandard] = {}
+        self._token_standard_expiry: dict[tuple[str, str], float] = {}
+        self.infer_base_uri = infer_base_uri
+        self._uri_templates: dict[tuple[str, str], UriTemplate] = {}
+        self.uri_index = uri_index
         self.fetcher = fetcher or MetadataFetcher(async_adapter_configs=adapter_configs)
         if adapter_configs is None:
             adapter_configs = DEFAULT_ADAPTER_CONFIGS
@@ -72,6 +142,17 @@ class MetadataPipeline(BasePipeline):
                 for parser_cls in DEFAULT_PARSERS
             ]
         self.parsers = parsers
+        self._chain_parsers: dict[tuple[str, int], tuple[BaseParser, BaseParser]] = {}
+
+    async def aclose(self) -> None:
+        """Close the pooled rpc sessions of the contract callers of every chain."""
+        callers = [self.contract_caller, self.chain_router.default]
+        callers += [self.chain_router.get_contract_caller(chain) for chain in self.chain_router.chains]
+        closed: set[int] = set()
+        for caller in callers:
+            if id(caller.rpc) not in closed:
+                closed.add(id(caller.rpc))
+                await caller.aclose()
 
     def mount_adapter(  # type: ignore[no-untyped-def]
         self,
@@ -89,47 +170,436 @@ class MetadataPipeline(BasePipeline):
         for prefix in url_prefixes:
             self.fetcher.register_adapter(adapter, prefix)
 
+    def _get_cached_token_standard(self, key: tuple[str, str]) -> Optional[TokenStandard]:
+        standard = self._token_standards.get(key)
+        expires_at = self._token_standard_expiry.get(key)
+        if expires_at is not None and time.monotonic() >= expires_at:
+            return None
+        return standard
+
+    def _cache_token_standard(
+        self, key: tuple[str, str], standard: TokenStandard, definite: bool
+    ) -> TokenStandard:
+        self._token_standards[key] = standard
+        if definite:
+            self._token_standard_expiry.pop(key, None)
+        else:
+            self._token_standard_expiry[key] = time.monotonic() + TOKEN_STANDARD_RETRY_TTL
+        return standard
+
+    def _get_token_standard(self, token: Token) -> TokenStandard:
+        key = (token.chain_identifier, token.collection_address.lower())
+        standard = self._get_cached_token_standard(key)
+        if standard is not None:
+            return standard
+
+        contract_caller = self.chain_router.get_contract_caller(token.chain_identifier)
+        supports_erc1155 = _first(
+            contract_caller.single_address_single_fn_many_args(
+                address=token.collection_address,
+                function_sig=SUPPORTS_INTERFACE_SIGNATURE,
+                return_type=["bool"],
+                args=[[ERC1155_INTERFACE_ID]],
+            )
+        )
+        if not isinstance(supports_erc1155, bool):
+            # The contract doesn't implement ERC165, probe uri(uint256) instead
+            uri = _first(
+                contract_caller.single_address_single_fn_many_args(
+                    address=token.collection_address,
+                    function_sig=ERC1155_URI_SIGNATURE,
+                    return_type=["string"],
+                    args=[[token.token_id]],
+                )
+            )
+            if not uri:
+                # Most likely a legacy ERC721 without ERC165, but the calls may have failed
+                # rather than reverted, so probe again once the entry expires
+                return self._cache_token_standard(key, TokenStandard.ERC721, definite=False)
+            supports_erc1155 = True
+        standard = (
+            TokenStandard.ERC1155 if supports_erc1155 is True else TokenStandard.ERC721
+        )
+        return self._cache_token_standard(key, standard, definite=True)
+
+    async def _gen_get_token_standard(self, token: Token) -> TokenStandard:
+        key = (token.chain_identifier, token.collection_address.lower())
+        standard = self._get_cached_token_standard(key)
+        if standard is not None:
+            return standard
+
+        contract_caller = self.chain_router.get_contract_caller(token.chain_identifier)
+        reader = contract_caller.rpc.async_reader
+        supports_erc1155 = _first(
+            await reader.gen_call_single_function_single_address_many_args(
+                address=token.collection_address,
+                function_sig=SUPPORTS_INTERFACE_SIGNATURE,
+                return_type=["bool"],
+                args=[[ERC1155_INTERFACE_ID]],
+            )
+        )
+        if not isinstance(supports_erc1155, bool):
+            # The contract doesn't implement ERC165, probe uri(uint256) instead
+            uri = _first(
+                await reader.gen_call_single_function_single_address_many_args(
+                    address=token.collection_address,
+                    function_sig=ERC1155_URI_SIGNATURE,
+                    return_type=["string"],
+                    args=[[token.token_id]],
+                )
+            )
+            if not uri:
+                # Most likely a legacy ERC721 without ERC165, but the calls may have failed
+                # rather than reverted, so probe again once the entry expires
+                return self._cache_token_standard(key, TokenStandard.ERC721, definite=False)
+            supports_erc1155 = True
+        standard = (
+            TokenStandard.ERC1155 if supports_erc1155 is True else TokenStandard.ERC721
+        )
+        return self._cache_token_standard(key, standard, definite=True)
+
     def fetch_token_uri(
-        self, token: Token, function_signature: str = "tokenURI(uint256)"
+        self, token: Token, function_signature: Optional[str] = None
     ) -> Optional[str]:
         """Given a token, fetch the token uri from the contract using a specified function signature.
 
         Args:
             token (Token): token whose uri we want to fetch.
-            function_signature (str, optional): token uri contract function signature. Defaults to "tokenURI(uint256)".
+            function_signature (str, optional): token uri contract function signature. Defaults to
+                "uri(uint256)" for ERC1155 collections and "tokenURI(uint256)" otherwise, the
+                standard of a collection being detected once and cached.
 
         Returns:
             Optional[str]: the token uri, if found.
         """  # noqa: E501
+        if function_signature is None:
+            function_signature = get_token_uri_signature(
+                self._get_token_standard(token)
+            )
 
-        res = self.contract_caller.single_address_single_fn_many_args(
+        contract_caller = self.chain_router.get_contract_caller(token.chain_identifier)
+        res = contract_caller.single_address_single_fn_many_args(
             address=token.collection_address,
             function_sig=function_signature,
             return_type=["string"],
             args=[[token.token_id]],
         )
-        return res[0] if res and len(res) > 0 else None
+        uri = res[0] if res and len(res) > 0 else None
+        if function_signature == ERC1155_URI_SIGNATURE:
+            uri = substitute_erc1155_id(uri, token.token_id)
+        return uri
 
     async def gen_fetch_token_uri(
-        self, token: Token, function_signature: str = "tokenURI(uint256)"
+        self, token: Token, function_signature: Optional[str] = None
     ) -> Optional[str]:
         """Given a token, fetch the token uri from the contract using a specified function signature.
 
         Args:
             token (Token): token whose uri we want to fetch.
-            function_signature (str, optional): token uri contract function signature. Defaults to "tokenURI(uint256)".
+            function_signature (str, optional): token uri contract function signature. Defaults to
+                "uri(uint256)" for ERC1155 collections and "tokenURI(uint256)" otherwise, the
+                standard of a collection being detected once and cached.
 
         Returns:
             Optional[str]: the token uri, if found.
         """  # noqa: E501
+        if function_signature is None:
+            function_signature = get_token_uri_signature(
+                await self._gen_get_token_standard(token)
+            )
 
-        res = await self.contract_caller.rpc.async_reader.gen_call_single_function_single_address_many_args(
+        contract_caller = self.chain_router.get_contract_caller(token.chain_identifier)
+        res = await contract_caller.rpc.async_reader.gen_call_single_function_single_address_many_args(
             address=token.collection_address,
             function_sig=function_signature,
             return_type=["string"],
             args=[[token.token_id]],
         )
-        return res[0] if res and len(res) > 0 else None
+        uri = res[0] if res and len(res) > 0 else None
+        if function_signature == ERC1155_URI_SIGNATURE:
+            uri = substitute_erc1155_id(uri, token.token_id)
+        return uri
+
+    @staticmethod
+    def _group_by_collection(tokens: list[Token]) -> list[list[int]]:
+        groups: dict[tuple[str, str], list[int]] = {}
+        for i, token in enumerate(tokens):
+            key = (token.chain_identifier, token.collection_address.lower())
+            groups.setdefault(key, []).append(i)
+        return list(groups.values())
+
+    def _fetch_collection_token_uris(
+        self, tokens: list[Token]
+    ) -> tuple[list[Optional[str]], set[int]]:
+        # Uris of the tokens, and the indexes of those synthesized from the uri template
+        if len(tokens) == 1:
+            return [self.fetch_token_uri(tokens[0])], set()
+        token = tokens[0]
+        function_signature = get_token_uri_signature(self._get_token_standard(token))
+        contract_caller = self.chain_router.get_contract_caller(token.chain_identifier)
+
+        def fetch(indexes: list[int]) -> list[Optional[str]]:
+            if not indexes:
+                return []
+            return contract_caller.single_address_single_fn_many_args(  # type: ignore[no-any-return]  # noqa: E501
+                address=token.collection_address,
+                function_sig=function_signature,
+                return_type=["string"],
+                args=[[tokens[i].token_id] for i in indexes],
+            )
+
+        if function_signature == ERC1155_URI_SIGNATURE:
+            res = fetch(list(range(len(tokens))))
+            return [substitute_erc1155_id(uri, t.token_id) for uri, t in zip(res, tokens)], set()
+        if not self.infer_base_uri or len(tokens) < URI_INFERENCE_MIN_TOKENS:
+            return fetch(list(range(len(tokens)))), set()
+
+        key = (token.chain_identifier, token.collection_address.lower())
+        uris: list[Optional[str]] = [None] * len(tokens)
+        resolved: set[int] = set()
+        template = self._uri_templates.get(key)
+        if template is None:
+            sampled = random.sample(range(len(tokens)), URI_INFERENCE_SAMPLE_SIZE)
+            for i, uri in zip(sampled, fetch(sampled)):
+                uris[i] = uri
+            resolved.update(sampled)
+            template = infer_uri_template([(tokens[i].token_id, uris[i]) for i in sampled])
+        if template is not None:
+            checked = self._pick_verification_sample(len(tokens), resolved)
+            for i, uri in zip(checked, fetch(checked)):
+                uris[i] = uri
+            resolved.update(checked)
+            if self._apply_uri_template(key, template, tokens, uris, resolved, checked):
+                return uris, set(range(len(tokens))) - resolved
+        rest = [i for i in range(len(tokens)) if i not in resolved]
+        for i, uri in zip(rest, fetch(rest)):
+            uris[i] = uri
+        return uris, set()
+
+    async def _gen_fetch_collection_token_uris(
+        self, tokens: list[Token]
+    ) -> tuple[list[Optional[str]], set[int]]:
+        if len(tokens) == 1:
+            return [await self.gen_fetch_token_uri(tokens[0])], set()
+        token = tokens[0]
+        function_signature = get_token_uri_signature(
+            await self._gen_get_token_standard(token)
+        )
+        contract_caller = self.chain_router.get_contract_caller(token.chain_identifier)
+
+        async def fetch(indexes: list[int]) -> list[Optional[str]]:
+            if not indexes:
+                return []
+            return await contract_caller.rpc.async_reader.gen_call_single_function_single_address_many_args(  # type: ignore[no-any-return]  # noqa: E501
+                address=token.collection_address,
+                function_sig=function_signature,
+                return_type=["string"],
+                args=[[tokens[i].token_id] for i in indexes],
+            )
+
+        if function_signature == ERC1155_URI_SIGNATURE:
+            res = await fetch(list(range(len(tokens))))
+            return [substitute_erc1155_id(uri, t.token_id) for uri, t in zip(res, tokens)], set()
+        if not self.infer_base_uri or len(tokens) < URI_INFERENCE_MIN_TOKENS:
+            return await fetch(list(range(len(tokens)))), set()
+
+        key = (token.chain_identifier, token.collection_address.lower())
+        uris: list[Optional[str]] = [None] * len(tokens)
+        resolved: set[int] = set()
+        template = self._uri_templates.get(key)
+        if template is None:
+            sampled = random.sample(range(len(tokens)), URI_INFERENCE_SAMPLE_SIZE)
+            for i, uri in zip(sampled, await fetch(sampled)):
+                uris[i] = uri
+            resolved.update(sampled)
+            template = infer_uri_template([(tokens[i].token_id, uris[i]) for i in sampled])
+        if template is not None:
+            checked = self._pick_verification_sample(len(tokens), resolved)
+            for i, uri in zip(checked, await fetch(checked)):
+                uris[i] = uri
+            resolved.update(checked)
+            if self._apply_uri_template(key, template, tokens, uris, resolved, checked):
+                return uris, set(range(len(tokens))) - resolved
+        rest = [i for i in range(len(tokens)) if i not in resolved]
+        for i, uri in zip(rest, await fetch(rest)):
+            uris[i] = uri
+        return uris, set()
+
+    @staticmethod
+    def _pick_verification_sample(n_tokens: int, resolved: set[int]) -> list[int]:
+        candidates = [i for i in range(n_tokens) if i not in resolved]
+        return random.sample(candidates, min(URI_VERIFICATION_SAMPLE_SIZE, len(candidates)))
+
+    def _apply_uri_template(
+        self,
+        key: tuple[str, str],
+        template: UriTemplate,
+        tokens: list[Token],
+        uris: list[Optional[str]],
+        resolved: set[int],
+        checked: list[int],
+    ) -> bool:
+        """Synthesize the unresolved uris of a collection from its template.
+
+        The template is only applied if the uris checked against the contract fit it.
+
+        Args:
+            key (tuple[str, str]): chain identifier and lowercase address of the collection.
+            template (UriTemplate): inferred template of the collection.
+            tokens (list[Token]): tokens of the collection.
+            uris (list[Optional[str]]): uris of the tokens, filled in place.
+            resolved (set[int]): indexes of the tokens whose uri was fetched.
+            checked (list[int]): indexes of the tokens fetched to verify the template.
+
+        Returns:
+            bool: whether the template was applied, otherwise the remaining uris need real calls.
+        """  # noqa: E501
+        if any(uris[i] != template.format(tokens[i].token_id) for i in checked):
+            logger.warning(
+                f"({key[0]}-{key[1]}) Token uris don't fit {template.format(0)!r} template, fetching them instead"  # noqa: E501
+            )
+            self._uri_templates.pop(key, None)
+            return False
+        self._uri_templates[key] = template
+        for i, token in enumerate(tokens):
+            if i not in resolved:
+                uris[i] = template.format(token.token_id)
+        return True
+
+    def _lookup_token_uris(
+        self, tokens: list[Token]
+    ) -> tuple[list[Optional[str]], list[int]]:
+        # Indexed uris, and the indexes of the tokens still to resolve
+        if self.uri_index is None:
+            return [None] * len(tokens), list(range(len(tokens)))
+        uris = self.uri_index.get_many([_token_key(token) for token in tokens])
+        return uris, [i for i, uri in enumerate(uris) if uri is None]
+
+    def _index_token_uris(
+        self, tokens: list[Token], uris: list[Optional[str]], synthesized: set[int]
+    ) -> None:
+        if self.uri_index is None:
+            return
+        by_chain: dict[str, list[int]] = {}
+        for i, token in enumerate(tokens):
+            if i not in synthesized and uris[i] is not None:
+                by_chain.setdefault(token.chain_identifier, []).append(i)
+        for chain_identifier, indexes in by_chain.items():
+            # Record the block the uris were read at, if the run is pinned
+            contract_caller = self.chain_router.get_contract_caller(chain_identifier)
+            self.uri_index.set_many(
+                [_token_key(tokens[i]) for i in indexes],
+                [uris[i] for i in indexes],
+                block_number=contract_caller.get_pinned_block(),
+            )
+        if synthesized:
+            # Synthesized uris were never read from the chain, so they have no block
+            self.uri_index.set_many(
+                [_token_key(tokens[i]) for i in sorted(synthesized)],
+                [uris[i] for i in sorted(synthesized)],
+            )
+
+    def fetch_token_uris(self, tokens: list[Token]) -> list[Optional[str]]:
+        """Fetch the uris of many tokens, with one batch of calls per collection.
+
+        Uris found in `uri_index` are used without any call, and resolved uris are added to it.
+
+        Args:
+            tokens (list[Token]): tokens whose uris we want to fetch.
+
+        Returns:
+            list[Optional[str]]: token uris mapped 1-1 with tokens, None if not found.
+        """
+        return self._fetch_token_uris(tokens)[0]
+
+    def _fetch_token_uris(
+        self, tokens: list[Token]
+    ) -> tuple[list[Optional[str]], dict[int, BaseException]]:
+        # Uris of the tokens, and the error of the tokens whose collection failed
+        uris, missing = self._lookup_token_uris(tokens)
+        if not missing:
+            return uris, {}
+        missing_tokens = [tokens[i] for i in missing]
+        resolved, synthesized, errors = self._resolve_token_uris(missing_tokens)
+        for i, uri in zip(missing, resolved):
+            uris[i] = uri
+        self._index_token_uris(missing_tokens, resolved, synthesized)
+        return uris, {missing[i]: e for i, e in errors.items()}
+
+    def _resolve_token_uris(
+        self, tokens: list[Token]
+    ) -> tuple[list[Optional[str]], set[int], dict[int, BaseException]]:
+        uris: list[Optional[str]] = [None] * len(tokens)
+        synthesized: set[int] = set()
+        errors: dict[int, BaseException] = {}
+        for indexes in self._group_by_collection(tokens):
+            group = [tokens[i] for i in indexes]
+            try:
+                group_uris, group_synthesized = self._fetch_collection_token_uris(group)
+            except Exception as e:
+                logger.error(
+                    f"({group[0].chain_identifier}-{group[0].collection_address}) Failed to fetch token uris. {str(e)}"  # noqa: E501
+                )
+                errors.update((i, e) for i in indexes)
+                continue
+            for i, uri in zip(indexes, group_uris):
+                uris[i] = uri
+            synthesized.update(indexes[i] for i in group_synthesized)
+        return uris, synthesized, errors
+
+    async def gen_fetch_token_uris(self, tokens: list[Token]) -> list[Optional[str]]:
+        """Async fetch the uris of many tokens, with one batch of calls per collection.
+
+        Uris found in `uri_index` are used without any call, and resolved uris are added to it.
+
+        Args:
+            tokens (list[Token]): tokens whose uris we want to fetch.
+
+        Returns:
+            list[Optional[str]]: token uris mapped 1-1 with tokens, None if not found.
+        """
+        return (await self._gen_fetch_token_uris(tokens))[0]
+
+    async def _gen_fetch_token_uris(
+        self, tokens: list[Token]
+    ) -> tuple[list[Optional[str]], dict[int, BaseException]]:
+        uris, missing = self._lookup_token_uris(tokens)
+        if not missing:
+            return uris, {}
+        missing_tokens = [tokens[i] for i in missing]
+        resolved, synthesized, errors = await self._gen_resolve_token_uris(missing_tokens)
+        for i, uri in zip(missing, resolved):
+            uris[i] = uri
+        self._index_token_uris(missing_tokens, resolved, synthesized)
+        return uris, {missing[i]: e for i, e in errors.items()}
+
+    async def _gen_resolve_token_uris(
+        self, tokens: list[Token]
+    ) -> tuple[list[Optional[str]], set[int], dict[int, BaseException]]:
+        groups = self._group_by_collection(tokens)
+        results = await asyncio.gather(
+            *[
+                self._gen_fetch_collection_token_uris([tokens[i] for i in indexes])
+                for indexes in groups
+            ],
+            return_exceptions=True,
+        )
+        uris: list[Optional[str]] = [None] * len(tokens)
+        synthesized: set[int] = set()
+        errors: dict[int, BaseException] = {}
+        for indexes, result in zip(groups, results):
+            if isinstance(result, BaseException):
+                token = tokens[indexes[0]]
+                logger.error(
+                    f"({token.chain_identifier}-{token.collection_address}) Failed to fetch token uris. {str(result)}"  # noqa: E501
+                )
+                errors.update((i, result) for i in indexes)
+                continue
+            group_uris, group_synthesized = result
+            for i, uri in zip(indexes, group_uris):
+                uris[i] = uri
+            synthesized.update(indexes[i] for i in group_synthesized)
+        return uris, synthesized, errors
 
     def fetch_token_metadata(
         self,
@@ -148,14 +618,27 @@ class MetadataPipeline(BasePipeline):
             Union[Metadata, MetadataProcessingError]: returns either a Metadata
                 or a MetadataProcessingError if unable to parse.
         """
+        return self._fetch_token_metadata(token, metadata_selector_fn)
+
+    def _fetch_token_metadata(
+        self,
+        token: Token,
+        metadata_selector_fn: Optional[Callable] = None,  # type: ignore[type-arg]
+        uri_fetched: bool = False,
+        uri_error: Optional[BaseException] = None,
+    ) -> Union[Metadata, MetadataProcessingError]:
+        # uri_fetched and uri_error are the outcome of a batch uri fetch, not repeated here
         possible_metadatas_or_errors = []
 
         # If no token uri is passed in, try to fetch the token uri from the contract
-        if token.uri is None:
-            try:
-                token.uri = self.fetch_token_uri(token)
-            except Exception as e:
-                error_message = f"({token.chain_identifier}-{token.collection_address}-{token.token_id}) Failed to fetch token uri. {str(e)}"  # noqa: E501
+        if not token.uri:
+            if uri_error is None and not uri_fetched:
+                try:
+                    token.uri = self.fetch_token_uri(token)
+                except Exception as e:
+                    uri_error = e
+            if uri_error is not None:
+                error_message = f"({token.chain_identifier}-{token.collection_address}-{token.token_id}) Failed to fetch token uri. {str(uri_error)}"  # noqa: E501
                 logger.error(error_message)
                 possible_metadatas_or_errors.append(
                     MetadataProcessingError.from_token_and_error(
@@ -166,7 +649,7 @@ class MetadataPipeline(BasePipeline):
         raw_data = None
 
         # Try to fetch the raw data from the token uri
-        if token.uri is not None:
+        if token.uri:
             try:
                 raw_data = self.fetcher.fetch_content(token.uri)
             except Exception as e:
@@ -174,11 +657,11 @@ class MetadataPipeline(BasePipeline):
                 logger.error(error_message)
                 possible_metadatas_or_errors.append(
                     MetadataProcessingError.from_token_and_error(
-                        token=token, e=Exception(error_message)
+                        token=token, e=_wrap_fetch_error(e, error_message)
                     )
                 )
 
-        for parser in self.parsers:
+        for parser in self._get_parsers(token.chain_identifier):
             if not parser.should_parse_token(token=token, raw_data=raw_data):  # type: ignore[arg-type]  # noqa: E501
                 continue
             try:
@@ -225,10 +708,33 @@ class MetadataPipeline(BasePipeline):
             Union[Metadata, MetadataProcessingError]: returns either a Metadata
                 or a MetadataProcessingError if unable to parse.
         """
+        return await self._gen_fetch_token_metadata(token, metadata_selector_fn)
+
+    async def _gen_fetch_token_metadata(
+        self,
+        token: Token,
+        metadata_selector_fn: Optional[Callable] = None,  # type: ignore[type-arg]
+        uri_fetched: bool = False,
+        uri_error: Optional[BaseException] = None,
+    ) -> Union[Metadata, MetadataProcessingError]:
         possible_metadatas_or_errors: list[Union[Metadata, MetadataProcessingError]] = (
             []
         )
 
+        # If no token uri is passed in, try to fetch the token uri from the contract
+        if not token.uri:
+            if uri_error is None and not uri_fetched:
+                try:
+                    token.uri = await self.gen_fetch_token_uri(token)
+                except Exception as e:
+                    uri_error = e
+            if uri_error is not None:
+                error_message = f"({token.chain_identifier}-{token.collection_address}-{token.token_id}) Failed to fetch token uri. {str(uri_error)}"  # noqa: E501
+                logger.error(error_message)
+                return MetadataProcessingError.from_token_and_error(
+                    token=token, e=Exception(error_message)
+                )
+
         if not token.uri:
             return MetadataProcessingError.from_token_and_error(
                 token=token, e=Exception("Token has not uri")
@@ -243,7 +749,7 @@ class MetadataPipeline(BasePipeline):
             logger.error(error_message)
             possible_metadatas_or_errors.append(
                 MetadataProcessingError.from_token_and_error(
-                    token=token, e=Exception(error_message)
+                    token=token, e=_wrap_fetch_error(e, error_message)
                 )
             )
 
@@ -269,7 +775,10 @@ class MetadataPipeline(BasePipeline):
         nullable_possible_metadatas_or_errors: list[
             Optional[Union[Metadata, MetadataProcessingError]]
         ] = await asyncio.gather(
-            *(gen_parse_metadata(parser) for parser in self.parsers)
+            *(
+                gen_parse_metadata(parser)
+                for parser in self._get_parsers(token.chain_identifier)
+            )
         )
         possible_metadatas_or_errors += filter(
             None, nullable_possible_metadatas_or_errors
@@ -288,12 +797,109 @@ class MetadataPipeline(BasePipeline):
             return metadata_selector_fn(possible_metadatas_or_errors)  # type: ignore[no-any-return]  # noqa: E501
         return possible_metadatas_or_errors[0]
 
+    def _get_parsers(self, chain_identifier: str) -> list[BaseParser]:
+        """Return the parsers for a chain, with their contract calls sent to that chain's providers.
+
+        Parsers built with the pipeline's contract caller are copied per chain with the chain's
+        contract caller. They are skipped for chains without an rpc provider.
+        """  # noqa: E501
+        try:
+            caller: Optional[ContractCaller] = self.chain_router.get_contract_caller(chain_identifier)  # noqa: E501
+        except ValueError:
+            caller = None
+        parsers: list[BaseParser] = []
+        for parser in self.parsers:
+            if (
+                getattr(parser, "contract_caller", None) is not self.contract_caller
+                or caller is self.contract_caller
+            ):
+                parsers.append(parser)
+                continue
+            if caller is None:
+                continue
+            key = (chain_identifier, id(parser))
+            cached = self._chain_parsers.get(key)
+            if cached is None or cached[0] is not parser:
+                chain_parser = copy.copy(parser)
+                chain_parser.contract_caller = caller  # type: ignore[attr-defined]
+                cached = self._chain_parsers[key] = (parser, chain_parser)
+            parsers.append(cached[1])
+        return parsers
+
+    def _get_run_callers(self, tokens: list[Token]) -> dict[str, ContractCaller]:
+        callers: dict[str, ContractCaller] = {}
+        for chain in dict.fromkeys(token.chain_identifier for token in tokens):
+            try:
+                callers[chain] = self.chain_router.get_contract_caller(chain)
+            except ValueError:
+                # Tokens on chains without a provider fail on their own, not the whole run
+                continue
+        return callers
+
+    @staticmethod
+    def _requested_block(
+        block_number: Optional[Union[int, dict[str, int]]], chain: str
+    ) -> Optional[int]:
+        if isinstance(block_number, dict):
+            return block_number.get(chain)
+        return block_number
+
+    def _pin_blocks(
+        self,
+        tokens: list[Token],
+        block_number: Optional[Union[int, dict[str, int]]],
+    ) -> tuple[dict[str, int], list[tuple[AsyncContractReader, int]]]:
+        # Returns the block pinned for each chain of the run, and the block of each rpc
+        # client to pin the run's calls to with `pin_run_blocks`. Shared contract callers
+        # are left untouched, so concurrent runs each keep their own block.
+        pinned: dict[str, int] = {}
+        run_blocks: list[tuple[AsyncContractReader, int]] = []
+        for chain, caller in self._get_run_callers(tokens).items():
+            reader = caller.rpc.async_reader
+            block = next((b for r, b in run_blocks if r is reader), None)
+            if block is None:
+                block = self._requested_block(block_number, chain)
+                if block is None:
+                    block = caller.get_block_number()
+                run_blocks.append((reader, block))
+            pinned[chain] = block
+        return pinned, run_blocks
+
+    async def _gen_pin_blocks(
+        self,
+        tokens: list[Token],
+        block_number: Optional[Union[int, dict[str, int]]],
+    ) -> tuple[dict[str, int], list[tuple[AsyncContractReader, int]]]:
+        pinned: dict[str, int] = {}
+        run_blocks: list[tuple[AsyncContractReader, int]] = []
+        for chain, caller in self._get_run_callers(tokens).items():
+            reader = caller.rpc.async_reader
+            block = next((b for r, b in run_blocks if r is reader), None)
+            if block is None:
+                block = self._requested_block(block_number, chain)
+                if block is None:
+                    block = await reader.gen_block_number()
+                run_blocks.append((reader, block))
+            pinned[chain] = block
+        return pinned, run_blocks
+
+    @staticmethod
+    def _record_blocks(
+        metadatas_or_errors: list[Union[Metadata, MetadataProcessingError]],
+        pinned: dict[str, int],
+    ) -> None:
+        for metadata_or_error in metadatas_or_errors:
+            metadata_or_error.block_number = pinned.get(
+                metadata_or_error.token.chain_identifier
+            )
+
     def run(  # type: ignore[no-untyped-def, override]
         self,
         tokens: list[Token],
         parallelize: bool = True,
         select_metadata_fn: Optional[Callable] = None,  # type: ignore[type-arg]
         *args,
+        block_number: Optional[Union[int, dict[str, int]]] = None,
         **kwargs,
     ) -> list[Union[Metadata, MetadataProcessingError]]:
         """Run metadata pipeline on a list of tokens.
@@ -304,6 +910,9 @@ class MetadataPipeline(BasePipeline):
                 Defaults to True. Turn off parallelization to reduce risk of getting rate-limited.
             select_metadata_fn (Optional[Callable], optional): optionally specify a function to
                 select a metadata object from a list of metadata. Defaults to None. Defaults to None.
+            block_number (Optional[Union[int, dict[str, int]]], optional): block to pin the contract
+                calls of the run to, or blocks keyed by chain identifier. Chains without a block are
+                pinned to their current block. Defaults to pinning only if `pin_block` is set.
 
         Returns:
             list[Union[Metadata, MetadataProcessingError]]: returns a list of Metadatas
@@ -312,22 +921,129 @@ class MetadataPipeline(BasePipeline):
         if len(tokens) == 0:
             return []
 
-        if parallelize:
-            metadatas_or_errors = batched_parmap(
-                lambda t: self.fetch_token_metadata(t, select_metadata_fn), tokens, 15
-            )
+        pinned: dict[str, int] = {}
+        run_blocks: list[tuple[AsyncContractReader, int]] = []
+        if self.pin_block or block_number is not None:
+            pinned, run_blocks = self._pin_blocks(tokens, block_number)
+
+        with pin_run_blocks(run_blocks):
+            # Fetch missing token uris in one batch of calls per collection, tokens left
+            # without a uri keep the outcome instead of calling again one by one
+            missing = [i for i, token in enumerate(tokens) if not token.uri]
+            uri_errors: dict[int, Optional[BaseException]] = {}
+            if missing:
+                uris, errors = self._fetch_token_uris([tokens[i] for i in missing])
+                for j, (i, uri) in enumerate(zip(missing, uris)):
+                    tokens[i].uri = uri
+                    uri_errors[i] = errors.get(j)
+
+            def fetch(i: int) -> Union[Metadata, MetadataProcessingError]:
+                return self._fetch_token_metadata(
+                    tokens[i], select_metadata_fn, i in uri_errors, uri_errors.get(i)
+                )
+
+            if parallelize:
+                metadatas_or_errors = batched_parmap(fetch, list(range(len(tokens))), 15)
+            else:
+                metadatas_or_errors = list(map(fetch, range(len(tokens))))
+
+        if pinned:
+            self._record_blocks(metadatas_or_errors, pinned)
+        return metadatas_or_errors
+
+    def run_collection(
+        self,
+        collection_address: str,
+        chain_identifier: str = "ETHEREUM-MAINNET",
+        id_range: Optional[Iterable[int]] = None,
+        enumerate: bool = False,
+        from_block: int = 0,
+        window_size: int = COLLECTION_WINDOW_SIZE,
+        parallelize: bool = True,
+        select_metadata_fn: Optional[Callable] = None,  # type: ignore[type-arg]
+        block_number: Optional[int] = None,
+    ) -> Iterator[Union[Metadata, MetadataProcessingError]]:
+        """Run metadata pipeline on every token of a collection, a window of tokens at a time.
+
+        Token ids are enumerated lazily and only `window_size` tokens are in flight at a time,
+        so memory stays flat however large the collection is.
+
+        Args:
+            collection_address (str): collection address.
+            chain_identifier (str, optional): chain of the collection. Defaults to "ETHEREUM-MAINNET".
+            id_range (Optional[Iterable[int]], optional): token ids of the collection, e.g. a range.
+                Defaults to None.
+            enumerate (bool, optional): enumerate the token ids from the contract instead, with
+                `tokenByIndex` if the collection is ERC721Enumerable or from its mint logs otherwise,
+                TransferSingle and TransferBatch logs for ERC1155 collections. Defaults to False.
+            from_block (int, optional): first block to read mint logs from. Defaults to 0.
+            window_size (int, optional): tokens processed at a time. Defaults to 500.
+            parallelize (bool, optional): whether or not metadata should be processed in parallel,
+                see `run`. Defaults to True.
+            select_metadata_fn (Optional[Callable], optional): optionally specify a function to
+                select a metadata object from a list of metadata. Defaults to None.
+            block_number (Optional[int], optional): block to pin the contract calls of each window
+                to, see `run`, and to enumerate the token ids at. Defaults to None.
+
+        Returns:
+            Iterator[Union[Metadata, MetadataProcessingError]]: lazy iterator of Metadatas or
+                MetadataProcessingErrors, in token id order.
+        """  # noqa: E501
+        if (id_range is None) == (not enumerate):
+            raise ValueError("Pass either an id_range or enumerate=True")
+        token_ids: Iterable[int]
+        if id_range is not None:
+            token_ids = id_range
         else:
-            metadatas_or_errors = list(
-                map(lambda t: self.fetch_token_metadata(t, select_metadata_fn), tokens)
+            # Tokens are enumerated at the block their metadata is read at
+            token_ids = iter_collection_token_ids(
+                self.chain_router.get_contract_caller(chain_identifier),
+                collection_address,
+                from_block=from_block,
+                to_block=block_number,
             )
+        return self._run_windows(
+            collection_address,
+            chain_identifier,
+            token_ids,
+            window_size,
+            parallelize=parallelize,
+            select_metadata_fn=select_metadata_fn,
+            block_number=block_number,
+        )
 
-        return metadatas_or_errors
+    def _run_windows(
+        self,
+        collection_address: str,
+        chain_identifier: str,
+        token_ids: Iterable[int],
+        window_size: int,
+        parallelize: bool,
+        select_metadata_fn: Optional[Callable],  # type: ignore[type-arg]
+        block_number: Optional[int],
+    ) -> Iterator[Union[Metadata, MetadataProcessingError]]:
+        token_ids = iter(token_ids)
+        while True:
+            window = [
+                Token(
+                    chain_identifier=chain_identifier,
+                    collection_address=collection_address,
+                    token_id=token_id,
+                )
+                for token_id in islice(token_ids, window_size)
+            ]
+            if not window:
+                return
+            yield from self.run(
+                window, parallelize, select_metadata_fn, block_number=block_number
+            )
 
     async def async_run(  # type: ignore[no-untyped-def]
         self,
         tokens: list[Token],
         select_metadata_fn: Optional[Callable] = None,  # type: ignore[type-arg]
         *args,
+        block_number: Optional[Union[int, dict[str, int]]] = None,
         **kwargs,
     ) -> list[Union[Metadata, MetadataProcessingError]]:
         """Async Run metadata pipeline on a list of tokens.
@@ -336,6 +1052,9 @@ class MetadataPipeline(BasePipeline):
             tokens (list[Token]): tokens for which to process metadata.
             select_metadata_fn (Optional[Callable], optional): optionally specify a function to
                 select a metadata object from a list of metadata. Defaults to None. Defaults to None.
+            block_number (Optional[Union[int, dict[str, int]]], optional): block to pin the contract
+                calls of the run to, or blocks keyed by chain identifier. Chains without a block are
+                pinned to their current block. Defaults to pinning only if `pin_block` is set.
 
         Returns:
             list[Union[Metadata, MetadataProcessingError]]: returns a list of Metadatas
@@ -343,9 +1062,30 @@ class MetadataPipeline(BasePipeline):
         """  # noqa: E501
         if len(tokens) == 0:
             return []
-        tasks = [
-            self.gen_fetch_token_metadata(token, select_metadata_fn) for token in tokens
-        ]
+        pinned: dict[str, int] = {}
+        run_blocks: list[tuple[AsyncContractReader, int]] = []
+        if self.pin_block or block_number is not None:
+            pinned, run_blocks = await self._gen_pin_blocks(tokens, block_number)
+
+        with pin_run_blocks(run_blocks):
+            # Fetch missing token uris in one batch of calls per collection, tokens left
+            # without a uri keep the outcome instead of calling again one by one
+            missing = [i for i, token in enumerate(tokens) if not token.uri]
+            uri_errors: dict[int, Optional[BaseException]] = {}
+            if missing:
+                uris, errors = await self._gen_fetch_token_uris([tokens[i] for i in missing])
+                for j, (i, uri) in enumerate(zip(missing, uris)):
+                    tokens[i].uri = uri
+                    uri_errors[i] = errors.get(j)
+
+            tasks = [
+                self._gen_fetch_token_metadata(
+                    token, select_metadata_fn, i in uri_errors, uri_errors.get(i)
+                )
+                for i, token in enumerate(tokens)
+            ]
+            metadatas_or_errors = await asyncio.gather(*tasks)
 
-        metadatas_or_errors = await asyncio.gather(*tasks)
+        if pinned:
+            self._record_blocks(metadatas_or_errors, pinned)
         return metadatas_or_errors
@@ -0,0 +1,59 @@
+from typing import Any, Callable, Optional, Sequence
+
+from eth_abi import decode as decode_abi  # type: ignore[attr-defined]
+
+_ZERO_PADDING = "0" * 24
+
+
+def _decode_uint256(data: str) -> Optional[tuple[Any, ...]]:
+    if len(data) < 64:
+        return None
+    return (int(data[:64], 16),)
+
+
+def _decode_address(data: str) -> Optional[tuple[Any, ...]]:
+    if len(data) < 64 or not data.startswith(_ZERO_PADDING):
+        return None
+    return ("0x" + data[24:64].lower(),)
+
+
+def _decode_string(data: str) -> Optional[tuple[Any, ...]]:
+    # Only the usual layout (offset of 32, zero padded data) takes the fast path
+    if len(data) < 128 or int(data[:64], 16) != 32:
+        return None
+    length = int(data[64:128], 16)
+    end = 128 + 2 * length
+    padded_end = 128 + 64 * -(-length // 32)
+    if len(data) < padded_end or data[end:padded_end].strip("0"):
+        return None
+    return (bytes.fromhex(data[128:end]).decode("utf-8"),)
+
+
+# Decoders of common return types, from the hex result (without 0x prefix) to the decoded
+# values. They return None for results they can't decode, which then go through eth_abi.
+FAST_DECODERS: dict[tuple[str, ...], Callable[[str], Optional[tuple[Any, ...]]]] = {
+    ("uint256",): _decode_uint256,
+    ("address",): _decode_address,
+    ("string",): _decode_string,
+}
+
+
+def decode_hex_result(return_types: Sequence[str], data: str) -> tuple[Any, ...]:
+    """Decode a hex encoded eth_call result, same as `eth_abi.decode` but faster for common return types.
+
+    Args:
+        return_types (Sequence[str]): return types of the function (ex: ["string"]).
+        data (str): hex encoded result, without the 0x prefix.
+
+    Returns:
+        tuple[Any, ...]: decoded values.
+    """  # noqa: E501
+    decoder = FAST_DECODERS.get(tuple(return_types))
+    if decoder is not None and len(data) % 2 == 0:
+        try:
+            decoded = decoder(data)
+        except ValueError:
+            decoded = None
+        if decoded is not None:
+            return decoded
+    return decode_abi(return_types, bytes.fromhex(data))  # type: ignore[no-any-return]
@@ -0,0 +1,223 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from offchain.logger.logging import logger
+
+DEFAULT_BATCH_SIZE = 100
+# Full batches answered in a row at the ceiling before sizes above it are tried again
+CEILING_REPROBE_SUCCESSES = 50
+
+# HTTP statuses and JSON-RPC error codes providers answer oversized batches with
+BATCH_LIMIT_HTTP_STATUSES = {413}
+BATCH_LIMIT_ERROR_CODES = {-32005}
+BATCH_LIMIT_ERROR_MESSAGES = ("batch size", "batch limit", "too large")
+# and the ones they throttle requests with, whatever their size
+RATE_LIMIT_HTTP_STATUSES = {429}
+RATE_LIMIT_ERROR_MESSAGES = ("too many requests", "rate limit")
+
+
+def _matches_error(
+    failure: Any, statuses: set[int], codes: set[int], messages: tuple[str, ...]
+) -> bool:
+    if isinstance(failure, BaseException):
+        response = getattr(failure, "response", None)
+        status = getattr(response, "status_code", None) or getattr(failure, "status", None)
+        return status in statuses
+    errors = failure if isinstance(failure, list) else [failure]
+    for response in errors:
+        error = response.get("error") if isinstance(response, dict) else None
+        if not isinstance(error, dict):
+            continue
+        message = str(error.get("message", "")).lower()
+        if error.get("code") in codes or any(m in message for m in messages):
+            return True
+    return False
+
+
+def is_rate_limit_error(failure: Any) -> bool:
+    """Whether a failed request was throttled (e.g. 429), rather than rejected for its size.
+
+    Args:
+        failure (Any): exception raised by the request, or the error response it got.
+
+    Returns:
+        bool: whether the endpoint is rate limiting requests.
+    """  # noqa: E501
+    return _matches_error(failure, RATE_LIMIT_HTTP_STATUSES, set(), RATE_LIMIT_ERROR_MESSAGES)
+
+
+def is_batch_limit_error(failure: Any) -> bool:
+    """Whether a failed request was rejected for its size or rate (e.g. 413, 429, -32005).
+
+    Args:
+        failure (Any): exception raised by the request, or the error response it got.
+
+    Returns:
+        bool: whether the batch should be made smaller.
+    """  # noqa: E501
+    return is_rate_limit_error(failure) or _matches_error(
+        failure, BATCH_LIMIT_HTTP_STATUSES, BATCH_LIMIT_ERROR_CODES, BATCH_LIMIT_ERROR_MESSAGES
+    )
+
+
+@dataclass
+class _EndpointBatchState:
+    size: int
+    ceiling: Optional[int] = None
+    successes_at_ceiling: int = 0
+    call_latency_ewma: Optional[float] = None
+
+
+class AdaptiveBatchSizer:
+    """Learns the JSON-RPC batch size that works best for each endpoint.
+
+    Sizes grow while full batches are answered quickly, shrink by `shrink_factor` when
+    the latency per call spikes or the endpoint rate limits a batch (429), and halve when
+    the endpoint rejects a batch for its size (413, -32005). A rejected size becomes a
+    ceiling the size doesn't grow back to, until `ceiling_reprobe_successes` full batches
+    in a row were answered at the ceiling.
+
+    Attributes:
+        initial_size (int): batch size of endpoints without samples yet.
+        min_size (int): smallest batch size.
+        max_size (int): largest batch size.
+        growth_factor (float): factor sizes grow by after a fast full batch.
+        shrink_factor (float): factor sizes shrink by after a latency spike.
+        latency_spike_multiplier (float): per call latency, as a multiple of its EWMA, that
+            counts as a spike.
+        min_spike_latency (float): batches faster than this many seconds never count as spikes.
+        ewma_alpha (float): weight of the newest sample in the latency EWMA.
+        ceiling_reprobe_successes (int): full batches answered at the ceiling before sizes
+            above it are tried again.
+    """  # noqa: E501
+
+    def __init__(
+        self,
+        initial_size: int = DEFAULT_BATCH_SIZE,
+        min_size: int = 1,
+        max_size: int = 1000,
+        growth_factor: float = 1.25,
+        shrink_factor: float = 0.75,
+        latency_spike_multiplier: float = 3.0,
+        min_spike_latency: float = 1.0,
+        ewma_alpha: float = 0.2,
+        ceiling_reprobe_successes: int = CEILING_REPROBE_SUCCESSES,
+    ) -> None:
+        self.initial_size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.growth_factor = growth_factor
+        self.shrink_factor = shrink_factor
+        self.latency_spike_multiplier = latency_spike_multiplier
+        self.min_spike_latency = min_spike_latency
+        self.ewma_alpha = ewma_alpha
+        self.ceiling_reprobe_successes = ceiling_reprobe_successes
+        self._states: dict[str, _EndpointBatchState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, url: str) -> _EndpointBatchState:
+        state = self._states.get(url)
+        if state is None:
+            state = self._states[url] = _EndpointBatchState(size=self.initial_size)
+        return state
+
+    def get_size(self, url: str) -> int:
+        """Batch size to send to an endpoint.
+
+        Args:
+            url (str): endpoint url.
+
+        Returns:
+            int: number of calls to pack in a batch.
+        """
+        with self._lock:
+            return self._state(url).size
+
+    def record_success(self, url: str, n_calls: int, latency: float) -> None:
+        """Record a batch an endpoint answered.
+
+        Args:
+            url (str): endpoint url.
+            n_calls (int): number of calls in the batch.
+            latency (float): seconds the batch took.
+        """
+        if n_calls <= 0:
+            return
+        with self._lock:
+            state = self._state(url)
+            call_latency = latency / n_calls
+            ewma = state.call_latency_ewma
+            if (
+                ewma is not None
+                and latency >= self.min_spike_latency
+                and call_latency > ewma * self.latency_spike_multiplier
+            ):
+                state.size = max(self.min_size, int(state.size * self.shrink_factor))
+                logger.debug(f"Latency spike on {url}, batch size lowered to {state.size}")
+            elif n_calls >= state.size:
+                if state.ceiling is not None and state.size >= state.ceiling:
+                    state.successes_at_ceiling += 1
+                    if state.successes_at_ceiling >= self.ceiling_reprobe_successes:
+                        # The limit may have been lifted, try larger sizes again
+                        state.ceiling, state.successes_at_ceiling = None, 0
+                        logger.debug(f"Batch size ceiling of {url} lifted, re-probing")
+                ceiling = min(self.max_size, state.ceiling or self.max_size)
+                grown = max(state.size + 1, int(state.size * self.growth_factor))
+                state.size = max(state.size, min(ceiling, grown))
+            state.call_latency_ewma = (
+                call_latency
+                if ewma is None
+                else (1 - self.ewma_alpha) * ewma + self.ewma_alpha * call_latency
+            )
+
+    def record_limit_error(self, url: str, n_calls: int, rate_limited: bool = False) -> None:
+        """Record a batch an endpoint rejected for its size or rate.
+
+        Args:
+            url (str): endpoint url.
+            n_calls (int): number of calls in the rejected batch.
+            rate_limited (bool, optional): whether the batch was throttled (e.g. 429) rather
+                than too large, which backs off without setting a ceiling. Defaults to False.
+        """  # noqa: E501
+        with self._lock:
+            state = self._state(url)
+            state.successes_at_ceiling = 0
+            if rate_limited:
+                state.size = max(self.min_size, int(min(state.size, n_calls) * self.shrink_factor))
+                logger.warning(f"{url} rate limited a batch of {n_calls} calls, batch size lowered to {state.size}")  # noqa: E501
+                return
+            state.ceiling = max(self.min_size, n_calls - 1)
+            state.size = max(self.min_size, min(state.size, n_calls) // 2)
+            logger.warning(
+                f"{url} rejected a batch of {n_calls} calls, batch size lowered to {state.size}"  # noqa: E501
+            )
+
+    def get_stats(self) -> dict[str, dict[str, Any]]:
+        """Learned batch size of every endpoint.
+
+        Returns:
+            dict[str, dict[str, Any]]: stats keyed by endpoint url.
+        """
+        with self._lock:
+            return {
+                url: {
+                    "size": state.size,
+                    "ceiling": state.ceiling,
+                    "call_latency_ewma": state.call_latency_ewma,
+                }
+                for url, state in self._states.items()
+            }
+
+
+_default_batch_sizer: Optional[AdaptiveBatchSizer] = None
+_default_batch_sizer_lock = threading.Lock()
+
+
+def get_default_batch_sizer() -> AdaptiveBatchSizer:
+    """Batch sizer shared by the rpc pools of the process, so sizes are learned once per endpoint."""  # noqa: E501
+    global _default_batch_sizer
+    with _default_batch_sizer_lock:
+        if _default_batch_sizer is None:
+            _default_batch_sizer = AdaptiveBatchSizer()
+        return _default_batch_sizer
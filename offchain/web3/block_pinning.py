@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+# Blocks the calls of the current run are pinned to, keyed by id of the async reader of the
+# rpc client the calls go through (each contract caller has its own)
+_run_blocks: ContextVar[Optional[dict[int, int]]] = ContextVar(
+    "offchain_run_blocks", default=None
+)
+
+
+def get_run_block(async_reader: Any) -> Optional[int]:
+    """Block the current run pinned the calls of an rpc client to, if any.
+
+    Args:
+        async_reader (AsyncContractReader): async reader of the rpc client.
+
+    Returns:
+        Optional[int]: the pinned block number.
+    """
+    blocks = _run_blocks.get()
+    return blocks.get(id(async_reader)) if blocks else None
+
+
+@contextmanager
+def pin_run_blocks(blocks: list[tuple[Any, int]]) -> Iterator[None]:
+    """Pin the calls made in this context (and threads or tasks it starts) to block numbers.
+
+    Unlike `ContractCaller.pin_block`, the pins don't touch the shared contract callers, so
+    runs made concurrently each read at their own block.
+
+    Args:
+        blocks (list[tuple[AsyncContractReader, int]]): async reader of each rpc client, and the
+            block number to pin its calls to.
+    """  # noqa: E501
+    if not blocks:
+        yield
+        return
+    merged = dict(_run_blocks.get() or {})
+    merged.update({id(async_reader): block for async_reader, block in blocks})
+    token = _run_blocks.set(merged)
+    try:
+        yield
+    finally:
+        _run_blocks.reset(token)
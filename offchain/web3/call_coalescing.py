@@ -0,0 +1,122 @@
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, Optional
+
+# eth_call params are [{"to": ..., "data": ...}, block_tag]
+_CALL_FIELDS = {"to", "data"}
+
+
+def call_key(params: list[Any], return_types: Optional[list[str]] = None) -> Hashable:
+    """Key identical calls share, (to, data, block) for eth_calls.
+
+    Args:
+        params (list[Any]): call params.
+        return_types (Optional[list[str]], optional): types the result is decoded to, for
+            results shared already decoded. Defaults to None, results shared as raw hex.
+
+    Returns:
+        Hashable: key of the call.
+    """  # noqa: E501
+    call = params[0] if params else None
+    if isinstance(call, dict) and call.keys() == _CALL_FIELDS and len(params) <= 2:
+        block_tag = params[1] if len(params) > 1 else None
+        key: Hashable = (str(call["to"]).lower(), str(call["data"]).lower(), str(block_tag))
+    else:
+        key = json.dumps(params, sort_keys=True, default=str)
+    if return_types is None:
+        return key
+    return (key, tuple(return_types))
+
+
+def dedupe_params(
+    params: list[list[Any]], return_types: Optional[list[list[str]]] = None
+) -> tuple[list[list[Any]], list[int]]:
+    """Drop duplicate calls.
+
+    Args:
+        params (list[list[Any]]): params of each call.
+        return_types (Optional[list[list[str]]], optional): types each call's result is decoded
+            to, if results are shared already decoded, see `call_key`. Defaults to None.
+
+    Returns:
+        tuple[list[list[Any]], list[int]]: params of the unique calls, and the index of each
+            call's unique call, to fan results back out.
+    """  # noqa: E501
+    positions: dict[Hashable, int] = {}
+    unique: list[list[Any]] = []
+    indexes = []
+    for i, call_params in enumerate(params):
+        key = call_key(call_params, return_types[i] if return_types is not None else None)
+        position = positions.get(key)
+        if position is None:
+            position = positions[key] = len(unique)
+            unique.append(call_params)
+        indexes.append(position)
+    return unique, indexes
+
+
+class InFlightCalls:
+    """Calls being sent by any thread, so identical calls made concurrently share one request.
+
+    Callers send the calls nobody else is sending, then wait for the others. Since every
+    caller sends its own calls before waiting, callers never wait on each other in a cycle.
+    """  # noqa: E501
+
+    def __init__(self) -> None:
+        self._futures: dict[Hashable, Future] = {}  # type: ignore[type-arg]
+        self._lock = threading.Lock()
+
+    def call(
+        self,
+        params: list[list[Any]],
+        send: Callable[[list[int]], list[Any]],
+        return_types: Optional[list[list[str]]] = None,
+    ) -> list[Any]:
+        """Send calls, sharing the results of identical calls already in flight.
+
+        Args:
+            params (list[list[Any]]): params of each call, without duplicates.
+            send (Callable[[list[int]], list[Any]]): sends the calls at the given indexes of params,
+                returns their results 1-1.
+            return_types (Optional[list[list[str]]], optional): types each call's result is
+                decoded to, if `send` returns decoded results, see `call_key`. Defaults to None.
+
+        Returns:
+            list[Any]: results mapped 1-1 with params.
+        """  # noqa: E501
+        keys = [
+            call_key(call_params, return_types[i] if return_types is not None else None)
+            for i, call_params in enumerate(params)
+        ]
+        owned: list[int] = []
+        borrowed: dict[int, Future] = {}  # type: ignore[type-arg]
+        with self._lock:
+            for i, key in enumerate(keys):
+                future = self._futures.get(key)
+                if future is None:
+                    self._futures[key] = Future()
+                    owned.append(i)
+                else:
+                    borrowed[i] = future
+
+        results: list[Any] = [None] * len(params)
+        if owned:
+            try:
+                sent = send(owned)
+            except BaseException as e:
+                for future in self._release([keys[i] for i in owned]):
+                    future.set_exception(e)
+                raise
+            released = self._release([keys[i] for i in owned])
+            for j, future in enumerate(released):
+                future.set_result(sent[j] if j < len(sent) else None)
+            for i, result in zip(owned, sent):
+                results[i] = result
+        for i, future in borrowed.items():
+            results[i] = future.result()
+        return results
+
+    def _release(self, keys: list[Hashable]) -> list[Future]:  # type: ignore[type-arg]
+        with self._lock:
+            return [self._futures.pop(key) for key in keys]
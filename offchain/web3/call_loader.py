@@ -0,0 +1,131 @@
+import asyncio
+import json
+from functools import partial
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+# Sends a group of calls sharing the same method and block tag, returns results 1-1
+SendCalls = Callable[
+    [str, list[list[Any]], Optional[Any], Optional[list[list[str]]]],
+    Awaitable[list[Any]],
+]
+
+
+class CallLoader:
+    """Merges RPC calls issued concurrently into batches, DataLoader style.
+
+    Calls made within `batch_window` seconds of each other (or within the same event
+    loop tick if 0) are collected, deduplicated and sent together. Every caller gets
+    back the result of its own call, identical calls share a single request, including
+    calls identical to one of an earlier batch that is still in flight.
+
+    Attributes:
+        send_calls (SendCalls): sends a group of calls with the same method and block tag.
+        batch_window (float): seconds to wait for more calls before sending a batch.
+        max_batch_size (int): number of pending calls that triggers sending right away.
+    """  # noqa: E501
+
+    def __init__(
+        self,
+        send_calls: SendCalls,
+        batch_window: float = 0.002,
+        max_batch_size: int = 100,
+    ) -> None:
+        self.send_calls = send_calls
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._pending: dict[Hashable, tuple[str, list[Any], Any, Optional[list[str]], asyncio.Future]] = {}  # type: ignore[type-arg]  # noqa: E501
+        self._in_flight: dict[Hashable, asyncio.Future] = {}  # type: ignore[type-arg]
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self._tasks: set[asyncio.Task] = set()  # type: ignore[type-arg]
+
+    @staticmethod
+    def _key(method: str, params: list[Any], block_tag: Optional[Any]) -> Hashable:
+        return json.dumps([method, params, block_tag], sort_keys=True, default=str)
+
+    async def load(
+        self,
+        method: str,
+        params: list[Any],
+        block_tag: Optional[Any] = "latest",
+        return_types: Optional[list[str]] = None,
+    ) -> Any:
+        """Queue a call for the next batch and wait for its result.
+
+        Args:
+            method (str): JSON-RPC method (ex: "eth_call")
+            params (list[Any]): call params
+            block_tag (Optional[Any], optional): block tag. Defaults to "latest".
+            return_types (Optional[list[str]], optional): return types of the call.
+
+        Returns:
+            Any: result of the call
+        """
+        key = self._key(method, params, block_tag)
+        if key in self._pending:
+            future = self._pending[key][4]
+        elif key in self._in_flight and not self._in_flight[key].done():
+            # An identical call was already sent with an earlier batch
+            future = self._in_flight[key]
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = (method, params, block_tag, return_types, future)
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                if self.batch_window > 0:
+                    self._flush_handle = loop.call_later(self.batch_window, self._flush)
+                else:
+                    self._flush_handle = loop.call_soon(self._flush)
+        # Other callers may share this future, don't let a cancelled caller cancel it
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for key, (_, _, _, _, future) in pending.items():
+            self._in_flight[key] = future
+            future.add_done_callback(partial(self._forget, key))
+
+        groups: dict[Hashable, list[tuple[list[Any], Optional[list[str]], asyncio.Future]]] = {}  # type: ignore[type-arg]  # noqa: E501
+        for method, params, block_tag, return_types, future in pending.values():
+            groups.setdefault((method, block_tag), []).append(
+                (params, return_types, future)
+            )
+        for (method, block_tag), calls in groups.items():  # type: ignore[misc]
+            task = asyncio.ensure_future(self._send(method, block_tag, calls))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:  # type: ignore[type-arg]
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    async def _send(
+        self,
+        method: str,
+        block_tag: Optional[Any],
+        calls: list[tuple[list[Any], Optional[list[str]], asyncio.Future]],  # type: ignore[type-arg]  # noqa: E501
+    ) -> None:
+        params = [params for params, _, _ in calls]
+        return_types = (
+            None
+            if any(types is None for _, types, _ in calls)
+            else [types for _, types, _ in calls]
+        )
+        try:
+            results = await self.send_calls(method, params, block_tag, return_types)  # type: ignore[arg-type]  # noqa: E501
+        except asyncio.CancelledError:
+            for _, _, future in calls:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, _, future in calls:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(calls, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,216 @@
+import re
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+from eth_abi import encode as encode_abi  # type: ignore[attr-defined]
+
+from offchain.web3.contract_utils import function_signature_to_sighash
+
+_UINT_RE = re.compile(r"^uint(\d*)$")
+_INT_RE = re.compile(r"^int(\d*)$")
+_BYTES_N_RE = re.compile(r"^bytes(\d+)$")
+_HEX_CHARS = frozenset("0123456789abcdef")
+
+# Encodes a single argument to its 64 hex chars ABI word, None if it can't take the fast path
+WordEncoder = Callable[[Any], Optional[str]]
+
+
+def split_arg_types(function_sig: str) -> list[str]:
+    """Get the argument types of a function signature (ex: "balanceOf(address,uint256)").
+
+    Args:
+        function_sig (str): function signature
+
+    Returns:
+        list[str]: argument types, ex: ["address", "uint256"]
+    """  # noqa: E501
+    start, end = function_sig.find("("), function_sig.rfind(")")
+    inner = function_sig[start + 1 : end]  # noqa: E203
+    arg_types, depth, current = [], 0, ""
+    for char in inner:
+        if char == "," and depth == 0:
+            arg_types.append(current.strip())
+            current = ""
+            continue
+        depth += char == "("
+        depth -= char == ")"
+        current += char
+    if current.strip():
+        arg_types.append(current.strip())
+    return arg_types
+
+
+def _uint_encoder(bits: int) -> WordEncoder:
+    upper = 2**bits
+
+    def encode(value: Any) -> Optional[str]:
+        if type(value) is not int or not 0 <= value < upper:
+            return None
+        return f"{value:064x}"
+
+    return encode
+
+
+def _int_encoder(bits: int) -> WordEncoder:
+    lower, upper = -(2 ** (bits - 1)), 2 ** (bits - 1)
+
+    def encode(value: Any) -> Optional[str]:
+        if type(value) is not int or not lower <= value < upper:
+            return None
+        return f"{value % 2**256:064x}"
+
+    return encode
+
+
+def _encode_address(value: Any) -> Optional[str]:
+    # Mixed case addresses go through eth_abi, which validates their checksum
+    if type(value) is not str or len(value) != 42 or not value.startswith("0x"):
+        return None
+    address = value[2:]
+    if address != address.lower() and address != address.upper():
+        return None
+    address = address.lower()
+    if not _HEX_CHARS.issuperset(address):
+        return None
+    return "0" * 24 + address
+
+
+def _encode_bool(value: Any) -> Optional[str]:
+    if type(value) is not bool:
+        return None
+    return f"{int(value):064x}"
+
+
+def _bytes_encoder(size: int) -> WordEncoder:
+    def encode(value: Any) -> Optional[str]:
+        if type(value) is not bytes or len(value) > size:
+            return None
+        return value.hex().ljust(64, "0")
+
+    return encode
+
+
+def _get_word_encoder(arg_type: str) -> Optional[WordEncoder]:
+    if arg_type == "address":
+        return _encode_address
+    if arg_type == "bool":
+        return _encode_bool
+    if match := _UINT_RE.match(arg_type):
+        bits = int(match.group(1) or 256)
+        return _uint_encoder(bits) if 0 < bits <= 256 and bits % 8 == 0 else None
+    if match := _INT_RE.match(arg_type):
+        bits = int(match.group(1) or 256)
+        return _int_encoder(bits) if 0 < bits <= 256 and bits % 8 == 0 else None
+    if match := _BYTES_N_RE.match(arg_type):
+        size = int(match.group(1))
+        return _bytes_encoder(size) if 0 < size <= 32 else None
+    return None
+
+
+class CallTemplate:
+    """Compiled eth_call calldata encoder of a function.
+
+    The function signature is parsed and its selector hashed once. Calls whose arguments
+    are all of static types (uint, int, address, bool, bytes1 to bytes32) are encoded by
+    packing their words directly, other calls by `eth_abi`. Use `get_call_template` to
+    share compiled templates.
+
+    Usage:
+        >>> template = get_call_template("tokenURI(uint256)")
+        >>> template.encode([1])
+        >>> template.encode_range(0, 10_000)
+
+    Attributes:
+        function_sig (str): function signature (ex: "tokenURI(uint256)").
+        arg_types (tuple[str, ...]): argument types of the function.
+        selector (str): hex encoded 4 byte selector, without the 0x prefix.
+    """  # noqa: E501
+
+    def __init__(
+        self, function_sig: str, arg_types: Optional[Sequence[str]] = None
+    ) -> None:
+        self.function_sig = function_sig
+        self.arg_types = tuple(
+            split_arg_types(function_sig) if arg_types is None else arg_types
+        )
+        self.selector = function_signature_to_sighash(function_sig)[2:]
+        encoders = [_get_word_encoder(arg_type) for arg_type in self.arg_types]
+        self._word_encoders: Optional[list[WordEncoder]] = (
+            encoders if all(encoders) else None  # type: ignore[assignment]
+        )
+
+    @property
+    def is_static(self) -> bool:
+        """Whether all arguments can be encoded without `eth_abi`."""
+        return self._word_encoders is not None
+
+    def encode(self, args: Optional[Sequence[Any]] = None) -> str:
+        """Encode the calldata of a call.
+
+        Args:
+            args (Optional[Sequence[Any]], optional): arguments of the call. Defaults to None.
+
+        Returns:
+            str: hex encoded calldata, ex: "0xc87b56dd0000..."
+        """  # noqa: E501
+        if args is None or (not args and not self.arg_types):
+            return "0x" + self.selector
+        if self._word_encoders is not None and len(args) == len(self._word_encoders):
+            words = [encode(arg) for encode, arg in zip(self._word_encoders, args)]
+            if None not in words:
+                return "0x" + self.selector + "".join(words)  # type: ignore[arg-type]
+        return "0x" + self.selector + encode_abi(list(self.arg_types), list(args)).hex()
+
+    def encode_many(self, args: Iterable[Sequence[Any]]) -> list[str]:
+        """Encode the calldata of many calls.
+
+        Args:
+            args (Iterable[Sequence[Any]]): arguments of each call.
+
+        Returns:
+            list[str]: hex encoded calldata, mapped 1-1 with args.
+        """
+        return [self.encode(call_args) for call_args in args]
+
+    def encode_range(self, start: int, stop: int) -> list[str]:
+        """Encode the calldata of calls for a range of ids, for functions taking a single uint (ex: token ids).
+
+        Args:
+            start (int): first id.
+            stop (int): id after the last one.
+
+        Returns:
+            list[str]: hex encoded calldata of each id in the range.
+        """  # noqa: E501
+        match = _UINT_RE.match(self.arg_types[0]) if len(self.arg_types) == 1 else None
+        assert match is not None, f"{self.function_sig} doesn't take a single uint"
+        if start < 0 or stop > 2 ** int(match.group(1) or 256):
+            # Out of range ids, let the encoder raise
+            return self.encode_many([i] for i in range(start, stop))
+        prefix = "0x" + self.selector
+        return [f"{prefix}{i:064x}" for i in range(start, stop)]
+
+
+@lru_cache(maxsize=1024)
+def _get_call_template(
+    function_sig: str, arg_types: Optional[tuple[str, ...]]
+) -> CallTemplate:
+    return CallTemplate(function_sig, arg_types)
+
+
+def get_call_template(
+    function_sig: str, arg_types: Optional[Sequence[str]] = None
+) -> CallTemplate:
+    """Get the compiled call template of a function, compiling it on first use.
+
+    Args:
+        function_sig (str): function signature (ex: "tokenURI(uint256)").
+        arg_types (Optional[Sequence[str]], optional): argument types, parsed from the
+            signature if not set. Defaults to None.
+
+    Returns:
+        CallTemplate: shared call template of the function.
+    """
+    return _get_call_template(
+        function_sig, tuple(arg_types) if arg_types is not None else None
+    )
@@ -0,0 +1,111 @@
+import threading
+from typing import Optional, Sequence, Union
+
+from offchain.web3.contract_caller import ContractCaller
+from offchain.web3.jsonrpc import EthereumJSONRPC
+from offchain.web3.multicall import Multicall3
+from offchain.web3.provider_pool import RPCEndpoint, RPCProviderPool
+from offchain.web3.rpc_cache import RPCResultCache
+
+DEFAULT_CHAIN_IDENTIFIER = "ETHEREUM-MAINNET"
+
+ChainProvider = Union[
+    str, Sequence[Union[str, RPCEndpoint]], RPCProviderPool, ContractCaller
+]
+
+
+class ChainRouter:
+    """Maps chain identifiers (ex: "POLYGON-MAINNET") to the contract callers of their RPC providers.
+
+    Each chain gets its own contract caller, rpc client and async reader, so calls are
+    batched per chain and every chain's providers are used concurrently. Once providers are
+    registered, calls for any other chain are rejected rather than sent to another chain's
+    provider; a router without registered providers sends every chain to the default one.
+
+    Usage:
+        >>> router = ChainRouter(
+        ...     {
+        ...         "ETHEREUM-MAINNET": ["https://eth.llamarpc.com", "https://cloudflare-eth.com"],
+        ...         "POLYGON-MAINNET": "https://polygon-rpc.com",
+        ...     }
+        ... )
+        >>> router.get_contract_caller("POLYGON-MAINNET")
+
+    Attributes:
+        default (ContractCaller): contract caller used for chains without a provider.
+        cache (Optional[RPCResultCache]): cache shared by the contract callers the router creates.
+        multicall (Optional[Multicall3]): multicall config of the contract callers the router creates.
+    """  # noqa: E501
+
+    def __init__(
+        self,
+        providers: Optional[dict[str, ChainProvider]] = None,
+        default: Optional[ContractCaller] = None,
+        cache: Optional[RPCResultCache] = None,
+        multicall: Optional[Multicall3] = None,
+    ) -> None:
+        self.cache = cache
+        self.multicall = multicall
+        self._callers: dict[str, ContractCaller] = {}
+        self._lock = threading.Lock()
+        for chain_identifier, provider in (providers or {}).items():
+            self.register(chain_identifier, provider)
+        self.default = default or self._callers.get(
+            DEFAULT_CHAIN_IDENTIFIER
+        ) or self._make_contract_caller(DEFAULT_CHAIN_IDENTIFIER, None)
+
+    def _make_contract_caller(
+        self, chain_identifier: str, provider: Optional[ChainProvider]
+    ) -> ContractCaller:
+        if isinstance(provider, ContractCaller):
+            return provider
+        if isinstance(provider, RPCProviderPool):
+            rpc = EthereumJSONRPC(pool=provider)
+        elif isinstance(provider, str) or provider is None:
+            rpc = EthereumJSONRPC(provider_url=provider)
+        else:
+            rpc = EthereumJSONRPC(pool=RPCProviderPool(list(provider)))
+        rpc.async_reader.chain_identifier = chain_identifier
+        return ContractCaller(
+            rpc,
+            multicall=self.multicall,
+            cache=self.cache,
+            chain_identifier=chain_identifier,
+        )
+
+    def register(self, chain_identifier: str, provider: ChainProvider) -> None:
+        """Route calls for a chain to a provider.
+
+        Args:
+            chain_identifier (str): chain identifier (ex: "POLYGON-MAINNET").
+            provider (ChainProvider): rpc url, list of urls or endpoints, provider pool or contract caller.
+        """  # noqa: E501
+        caller = self._make_contract_caller(chain_identifier, provider)
+        with self._lock:
+            self._callers[chain_identifier] = caller
+
+    @property
+    def chains(self) -> list[str]:
+        """Chain identifiers with a registered provider."""
+        return list(self._callers)
+
+    def get_contract_caller(self, chain_identifier: Optional[str]) -> ContractCaller:
+        """Get the contract caller for a chain.
+
+        Args:
+            chain_identifier (Optional[str]): chain identifier (ex: "POLYGON-MAINNET").
+
+        Raises:
+            ValueError: if providers are registered, but none for this chain.
+
+        Returns:
+            ContractCaller: contract caller of the chain, or the default one.
+        """
+        caller = self._callers.get(chain_identifier)  # type: ignore[arg-type]
+        if caller is None:
+            if chain_identifier not in (None, DEFAULT_CHAIN_IDENTIFIER) and self._callers:
+                raise ValueError(
+                    f"No rpc provider registered for {chain_identifier}, registered chains: {self.chains}"  # noqa: E501
+                )
+            return self.default
+        return caller
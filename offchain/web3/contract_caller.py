@@ -1,18 +1,94 @@
-from typing import Optional, Any
+from typing import Callable, Optional, Any
 
-from eth_abi import encode as encode_abi, decode as decode_abi  # type: ignore[attr-defined]
-from eth_utils import to_hex  # type: ignore[attr-defined]
-
-from offchain.concurrency import parmap
-from offchain.web3.contract_utils import function_signature_to_sighash
+from offchain.concurrency import rpc_parmap
+from offchain.web3.abi_decoding import decode_hex_result
+from offchain.web3.block_pinning import get_run_block
+from offchain.web3.call_coalescing import dedupe_params, InFlightCalls
+from offchain.web3.call_template import get_call_template
 from offchain.web3.jsonrpc import EthereumJSONRPC
+from offchain.web3.multicall import Multicall3
+from offchain.web3.retry_budget import retry_budget, run_with_budget
+from offchain.web3.rpc_cache import RPCResultCache
 
 CHUNK_SIZE = 500
+# Key of a response's result once decoded by the hook of `ContractCaller._decode_hook`
+DECODED_RESULT_KEY = "decoded"
 
 
 class ContractCaller:
-    def __init__(self, rpc: Optional[EthereumJSONRPC] = None) -> None:
+    def __init__(
+        self,
+        rpc: Optional[EthereumJSONRPC] = None,
+        multicall: Optional[Multicall3] = None,
+        cache: Optional[RPCResultCache] = None,
+        chain_identifier: str = "ETHEREUM-MAINNET",
+    ) -> None:
+        """
+        Args:
+            rpc (Optional[EthereumJSONRPC], optional): rpc client. Defaults to EthereumJSONRPC().
+            multicall (Optional[Multicall3], optional): when set, batches of calls are aggregated
+                into Multicall3 calls instead of one eth_call each. Defaults to None.
+            cache (Optional[RPCResultCache], optional): cache of immutable and block-pinned call
+                results, shared with the rpc's async reader. Defaults to None.
+            chain_identifier (str, optional): chain the rpc is connected to, part of the cache keys.
+                Defaults to "ETHEREUM-MAINNET".
+
+        Attributes:
+            pinned_block (Optional[int]): block number calls at "latest" are sent at instead,
+                for consistent (and cacheable) reads. See `pin_block`.
+        """  # noqa: E501
         self.rpc = rpc or EthereumJSONRPC()
+        self.multicall = multicall
+        self.cache = cache
+        self.chain_identifier = chain_identifier
+        self.pinned_block: Optional[int] = None
+        self._in_flight = InFlightCalls()
+        if cache is not None and self.rpc.async_reader.cache is None:
+            self.rpc.async_reader.cache = cache
+            self.rpc.async_reader.chain_identifier = chain_identifier
+
+    def pin_block(self, block_number: Optional[int] = None) -> int:
+        """Pin calls at "latest" to a block number, so a run reads a consistent snapshot of the chain.
+
+        Calls pinned to a block number can be cached, see `RPCResultCache`. The rpc's async
+        reader is pinned to the same block. The pin applies to every user of the caller, use
+        `pin_run_blocks` to only pin the calls of one run.
+
+        Args:
+            block_number (Optional[int], optional): block number to pin. Defaults to the current block.
+
+        Returns:
+            int: the pinned block number.
+        """  # noqa: E501
+        if block_number is None:
+            block_number = self.get_block_number()
+        self.pinned_block = block_number
+        self.rpc.async_reader.pinned_block = block_number
+        return block_number
+
+    def unpin_block(self) -> None:
+        """Go back to calling at the block tags passed in, "latest" by default."""
+        self.pinned_block = None
+        self.rpc.async_reader.pinned_block = None
+
+    async def aclose(self) -> None:
+        """Close the pooled session of the rpc's async reader."""
+        await self.rpc.aclose()
+
+    def get_block_number(self) -> int:
+        """Current block number of the chain."""
+        return int(self.rpc.call("eth_blockNumber", [])["result"], 16)
+
+    def get_pinned_block(self) -> Optional[int]:
+        """Block calls at "latest" are sent at, the block of the current run (see `pin_run_blocks`) or else the caller's own pin."""  # noqa: E501
+        block_number = get_run_block(self.rpc.async_reader)
+        return block_number if block_number is not None else self.pinned_block
+
+    def _resolve_block_tag(self, block_tag: Optional[str]) -> Optional[str]:
+        if block_tag not in (None, "latest"):
+            return block_tag
+        block_number = self.get_pinned_block()
+        return hex(block_number) if block_number is not None else block_tag
 
     def single_address_single_fn_many_args(  # type: ignore[no-untyped-def]
         self,
@@ -37,11 +113,28 @@ class ContractCaller:
             list[Optional[Any]]: list of returned values, mapped 1-1 with args
         """  # noqa: E501
 
-        req_params = [
-            self.request_builder(address, function_sig, args[i], block_tag, **kwargs)
-            for i in range(len(args))  # noqa: E501
-        ]
-        res = self._call_batch_chunked(req_params, chunk_size)
+        block_tag = self._resolve_block_tag(block_tag)
+        if (
+            not kwargs
+            and type(self).request_builder is ContractCaller.request_builder
+            and type(self).encode_params is ContractCaller.encode_params
+        ):
+            # Encode the calldata of all calls in bulk through the compiled template
+            req_params = [
+                [{"to": address, "data": data}, block_tag]
+                for data in get_call_template(function_sig).encode_many(args)
+            ]
+        else:
+            req_params = [
+                self.request_builder(address, function_sig, args[i], block_tag, **kwargs)
+                for i in range(len(args))  # noqa: E501
+            ]
+        res = self._call_batch_chunked(
+            req_params,
+            chunk_size,
+            return_types=[return_type] * len(req_params),
+            element_hook=self._decode_hook(return_type),
+        )
         return list(map(lambda r: self.decode_response(r, return_type), res))
 
     def single_address_many_fns_many_args(
@@ -68,11 +161,12 @@ class ContractCaller:
         assert len(function_sigs) == len(args) and len(args) == len(
             return_types
         ), "function names, return types, args must all be the same length"
+        block_tag = self._resolve_block_tag(block_tag)
         req_params = [
             self.request_builder(address, function_sigs[i], args[i], block_tag)
             for i in range(len(args))
         ]  # noqa: E501
-        res = self._call_batch_chunked(req_params, chunk_size)
+        res = self._call_batch_chunked(req_params, chunk_size, return_types=return_types)
         cleaned = list(
             map(
                 lambda i: self.decode_response(res[i], return_types[i]), range(len(res))
@@ -81,20 +175,94 @@ class ContractCaller:
         return {k: v for k, v in zip(function_sigs, cleaned)}
 
     def _call_batch_chunked(
-        self, request_params: list[list[Any]], chunk_size: int = CHUNK_SIZE
+        self,
+        request_params: list[list[Any]],
+        chunk_size: int = CHUNK_SIZE,
+        return_types: Optional[list[list[str]]] = None,
+        element_hook: Optional[Callable[[dict], dict]] = None,  # type: ignore[type-arg]
     ) -> list[Any]:  # noqa: E501
         """Perform concurrent batched requests by splitting a large batch into smaller chunks
 
         Args:
             request_params (list[list[Any]]): list of request parameters
             chunk_size (int, optional): size at which to split requests. Defaults to 500.
+            return_types (Optional[list[list[str]]], optional): return types of each call,
+                used to size multicall chunks.
+            element_hook (Optional[Callable[[dict], dict]], optional): applied to each eth_call
+                response as it's read, see `EthereumJSONRPC.call_batch`. Not applied to cached
+                or multicall responses.
 
         Returns:
             list[Any]: merged list of all data from the many requests
         """  # noqa: E501
+        # Identical calls are sent once, and calls already in flight from another thread
+        # aren't sent again, their results are fanned out to every caller. Results decoded
+        # by the element hook are only shared between calls decoded to the same types.
+        decoded_types = return_types if element_hook is not None else None
+        unique, positions = dedupe_params(request_params, decoded_types)
+        unique_types: list[list[str]] = [[]] * len(unique)
+        for position, types in zip(positions, return_types or []):
+            unique_types[position] = types
+
+        def send(indexes: list[int]) -> list[Any]:
+            return self._call_cached(
+                [unique[i] for i in indexes],
+                chunk_size,
+                [unique_types[i] for i in indexes] if return_types is not None else None,
+                element_hook,
+            )
+
+        results = self._in_flight.call(
+            unique, send, unique_types if decoded_types is not None else None
+        )
+        return [results[position] for position in positions]
+
+    def _call_cached(
+        self,
+        request_params: list[list[Any]],
+        chunk_size: int = CHUNK_SIZE,
+        return_types: Optional[list[list[str]]] = None,
+        element_hook: Optional[Callable[[dict], dict]] = None,  # type: ignore[type-arg]
+    ) -> list[Any]:
+        if self.cache is None:
+            return self._send_calls(request_params, chunk_size, return_types, element_hook)
+
+        cached = [self.cache.get(self.chain_identifier, p) for p in request_params]
+        results = [{"result": result} for _, result in cached]
+        misses = [i for i, (hit, _) in enumerate(cached) if not hit]
+        if misses:
+            miss_params = [request_params[i] for i in misses]
+            responses = self._send_calls(
+                miss_params,
+                chunk_size,
+                [return_types[i] for i in misses] if return_types is not None else None,
+            )
+            for i, response in zip(misses, responses):
+                results[i] = response
+            self.cache.set_many(
+                self.chain_identifier,
+                miss_params,
+                [
+                    r.get("result") if isinstance(r, dict) and "error" not in r else None
+                    for r in responses
+                ],
+            )
+        return results
+
+    def _send_calls(
+        self,
+        request_params: list[list[Any]],
+        chunk_size: int = CHUNK_SIZE,
+        return_types: Optional[list[list[str]]] = None,
+        element_hook: Optional[Callable[[dict], dict]] = None,  # type: ignore[type-arg]
+    ) -> list[Any]:
+        if self.multicall is not None and len(request_params) > 1:
+            return self._call_multicall(request_params, chunk_size, return_types)
 
         def call(params: list[list[Any]]) -> list[Any]:
-            return self.rpc.call_batch_chunked("eth_call", params)
+            if element_hook is None:
+                return self.rpc.call_batch_chunked("eth_call", params)
+            return self.rpc.call_batch_chunked("eth_call", params, element_hook=element_hook)
 
         size = len(request_params)
         if size < chunk_size:
@@ -108,9 +276,46 @@ class ContractCaller:
             prev_offset = curr_offest
             curr_offest = min(curr_offest + chunk_size, size)
 
-        results = parmap(call, chunks)
+        # Chunks share the retry budget of the whole request
+        with retry_budget(len(chunks)) as budget:
+            results = rpc_parmap(
+                lambda chunk: run_with_budget(budget, call, chunk), chunks
+            )
         return [i for res in results for i in res]
 
+    def _call_multicall(
+        self,
+        request_params: list[list[Any]],
+        chunk_size: int = CHUNK_SIZE,
+        return_types: Optional[list[list[str]]] = None,
+    ) -> list[Any]:
+        """Perform eth_calls aggregated into Multicall3 calls
+
+        Args:
+            request_params (list[list[Any]]): list of eth_call parameters
+            chunk_size (int, optional): size at which to split the aggregate calls. Defaults to 500.
+            return_types (Optional[list[list[str]]], optional): return types of each call.
+
+        Returns:
+            list[Any]: responses mapped 1-1 with request_params, shaped like eth_call responses
+        """  # noqa: E501
+        multicall: Multicall3 = self.multicall  # type: ignore[assignment]
+        chunks = multicall.chunk(request_params, return_types)
+        responses = self.rpc.call_batch_chunked(
+            "eth_call", [multicall.build_request(chunk) for chunk in chunks], chunk_size
+        )
+
+        results = []
+        for chunk, response in zip(chunks, responses):
+            unpacked = multicall.decode_result(response.get("result"), len(chunk))
+            if unpacked is None:
+                # The aggregate call itself failed (e.g. no Multicall3 on this chain,
+                # or over the gas cap), fall back to plain eth_calls for this chunk
+                results += self.rpc.call_batch_chunked("eth_call", chunk, chunk_size)
+            else:
+                results += [{"result": result} for result in unpacked]
+        return results
+
     def request_builder(  # type: ignore[no-untyped-def]
         self,
         address: str,
@@ -141,26 +346,33 @@ class ContractCaller:
     ) -> str:
         """Encode eth_call data by first taking the function sighash, then adding the encoded data
 
-        Args:w
+        The function's compiled call template is cached, see `CallTemplate`.
+
+        Args:
             function_sig (str): function signature
             args (Optional[list], optional): arguments to pass. Defaults to None.
 
         Returns:
-            str: [description]
+            str: hex encoded calldata
         """  # noqa: E501
-        b = bytes.fromhex(function_signature_to_sighash(function_sig)[2:])
+        return get_call_template(function_sig, arg_types).encode(args)
 
-        if args is not None:
-            if arg_types is None:
-                start = function_sig.find("(")
-                arg_types = function_sig[start:].strip("()").split(",")
+    def _decode_hook(self, return_types: list[str]) -> Callable[[dict], dict]:  # type: ignore[type-arg]
+        """Element hook decoding each eth_call response as it streams in.
 
-                if type(arg_types) == str:  # type: ignore[comparison-overlap]
-                    arg_types = [arg_types]
+        Large results (e.g. on-chain data uris) are decoded as soon as they're read and their
+        hex dropped, instead of buffering every hex result of the batch.
+        """  # noqa: E501
 
-            b += encode_abi(arg_types, args)
+        def decode(response: dict) -> dict:  # type: ignore[type-arg]
+            if not isinstance(response, dict) or "result" not in response:
+                return response
+            return {
+                "id": response.get("id"),
+                DECODED_RESULT_KEY: self.decode_response(response, return_types),
+            }
 
-        return to_hex(b)
+        return decode
 
     def decode_response(self, response: dict, return_types: list[str]) -> Optional[Any]:  # type: ignore[type-arg]  # noqa: E501
         """Decode responses, filling None for any errored requests
@@ -173,6 +385,8 @@ class ContractCaller:
             Optional[Any]: [description]
         """
         try:
+            if DECODED_RESULT_KEY in response:
+                return response[DECODED_RESULT_KEY]
             data = response.get("result")
             if data is None:
                 return None
@@ -181,7 +395,7 @@ class ContractCaller:
             if trimmed == "":
                 return None
 
-            parsed = decode_abi(return_types, bytes.fromhex(trimmed))
+            parsed = decode_hex_result(return_types, trimmed)
             n_expected, n_received = len(return_types), len(parsed)
 
             if n_expected == 1 or n_received == 1:
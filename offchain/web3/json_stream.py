@@ -0,0 +1,136 @@
+import codecs
+import json
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+class _ChunkReader:
+    """Rolling text buffer over a stream of utf-8 encoded chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.done = False
+
+    def read_more(self, min_pending: int = 0) -> bool:
+        """Read chunks until at least `min_pending` unconsumed characters are buffered (at least one chunk).
+
+        Args:
+            min_pending (int, optional): unconsumed characters to buffer. Defaults to 0.
+
+        Returns:
+            bool: whether anything was read, False at the end of the stream.
+        """  # noqa: E501
+        if self.done:
+            return False
+        parts, pending = [self.buffer[self.pos :]], len(self.buffer) - self.pos  # noqa: E203
+        read = False
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk)
+            parts.append(text)
+            pending += len(text)
+            read = read or bool(text)
+            if read and pending >= min_pending:
+                break
+        else:
+            parts.append(self._utf8.decode(b"", final=True))
+            self.done = True
+        # Join once, so a value spanning many chunks isn't copied once per chunk
+        self.buffer = "".join(parts)
+        self.pos = 0
+        return read
+
+    def skip_whitespace(self) -> Optional[str]:
+        """Skip whitespace and peek at the next character, None at the end of the stream."""  # noqa: E501
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_more():
+                return None
+
+    def decode_value(self) -> Any:
+        """Decode the JSON value starting at the current position."""
+        retry_at = 0
+        while True:
+            pending = len(self.buffer) - self.pos
+            if pending >= retry_at or self.done:
+                try:
+                    value, end = _decoder.raw_decode(self.buffer, self.pos)
+                except json.JSONDecodeError:
+                    if self.done:
+                        raise
+                    # Wait for the buffer to double before parsing a large value again
+                    retry_at = 2 * pending
+                else:
+                    # A value running to the end of the buffer may be cut (e.g. a number)
+                    if end < len(self.buffer) or self.done:
+                        self.pos = end
+                        return value
+                    retry_at = pending + 1
+            self.read_more(retry_at)
+
+
+def _iter_array(reader: _ChunkReader) -> Iterator[Any]:
+    # The reader is at the opening bracket of the array
+    reader.pos += 1
+    if reader.skip_whitespace() == "]":
+        return
+    while True:
+        reader.skip_whitespace()
+        yield reader.decode_value()
+        char = reader.skip_whitespace()
+        reader.pos += 1
+        if char == "]":
+            return
+        if char != ",":
+            raise ValueError(f"Expected ',' or ']' in JSON array, got {char!r}")
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Parse a JSON array from a stream of chunks, yielding its elements one at a time.
+
+    Only the element being parsed is kept in memory, along with the current chunk.
+
+    Args:
+        chunks (Iterable[bytes]): utf-8 encoded chunks of the body, ex: `response.iter_content()`.
+
+    Yields:
+        Any: elements of the array.
+    """  # noqa: E501
+    reader = _ChunkReader(chunks)
+    if reader.skip_whitespace() != "[":
+        raise ValueError("Expected a JSON array")
+    yield from _iter_array(reader)
+
+
+def parse_json_stream(
+    chunks: Iterable[bytes],
+    element_hook: Optional[Callable[[Any], Any]] = None,
+) -> Any:
+    """Parse a JSON body from a stream of chunks, element by element if it's an array.
+
+    Args:
+        chunks (Iterable[bytes]): utf-8 encoded chunks of the body.
+        element_hook (Optional[Callable[[Any], Any]], optional): applied to each element of
+            an array as soon as it's parsed, e.g. to decode large results before the next
+            element is read. Defaults to None.
+
+    Returns:
+        Any: the parsed body, with `element_hook` applied to its elements if it's an array.
+    """  # noqa: E501
+    reader = _ChunkReader(chunks)
+    if reader.skip_whitespace() != "[":
+        # Not a batch response (e.g. a single error object), it's small
+        value = reader.decode_value()
+        if reader.skip_whitespace() is not None:
+            raise ValueError("Extra data after JSON value")
+        return value
+    if element_hook is None:
+        return list(_iter_array(reader))
+    return [element_hook(element) for element in _iter_array(reader)]
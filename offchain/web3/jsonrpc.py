@@ -1,15 +1,25 @@
-from typing import Any, Optional, TypedDict
+import time
+from functools import partial
+from typing import Any, Callable, Optional, TypedDict
 
 import requests
 import requests.adapters
 from tenacity import retry, stop_after_attempt, wait_exponential
 
-from offchain.concurrency import parmap
+from offchain.concurrency import rpc_parmap
 from offchain.constants.providers import RPCProvider
 from offchain.logger.logging import logger
+from offchain.web3.json_stream import parse_json_stream
+from offchain.web3.provider_pool import RPCProviderPool
 from offchain.web3.read_async import AsyncContractReader
+from offchain.web3.retry_budget import retry_budget, run_with_budget
 
 MAX_REQUEST_BATCH_SIZE = 100
+MAX_BATCH_ATTEMPTS = 3
+# Bytes read at a time from batch response bodies
+STREAM_CHUNK_SIZE = 64 * 1024
+# Errors worth re-sending a call for: limit exceeded, internal error, rate limited
+RETRYABLE_ERROR_CODES = {-32005, -32603, 429}
 
 
 class RPCPayload(TypedDict):
@@ -23,7 +33,14 @@ class EthereumJSONRPC:
     def __init__(
         self,
         provider_url: Optional[str] = None,
+        pool: Optional[RPCProviderPool] = None,
     ) -> None:
+        """
+        Args:
+            provider_url (Optional[str], optional): rpc url. Defaults to RPCProvider.LLAMA_NODES_MAINNET.
+            pool (Optional[RPCProviderPool], optional): pool of endpoints to route requests between,
+                takes precedence over provider_url. Defaults to a pool of just provider_url.
+        """  # noqa: E501
         adapter = requests.adapters.HTTPAdapter(
             pool_connections=100, pool_maxsize=1000, max_retries=10
         )  # noqa: E501
@@ -31,8 +48,44 @@ class EthereumJSONRPC:
         self.sess.mount("https://", adapter)
         self.sess.mount("http://", adapter)
         self.sess.headers = {"Content-Type": "application/json"}
-        self.url = provider_url or RPCProvider.LLAMA_NODES_MAINNET
-        self.async_reader = AsyncContractReader(rpc_url=self.url)
+        self.pool = pool or RPCProviderPool(
+            [provider_url or RPCProvider.LLAMA_NODES_MAINNET]
+        )
+        self.url = self.pool.url
+        self.async_reader = AsyncContractReader(rpc_url=self.url, pool=self.pool)
+        self.retry_backoff_min = 1.0
+        self.retry_backoff_max = 5.0
+
+    async def aclose(self) -> None:
+        """Close the pooled session of the async reader."""
+        await self.async_reader.aclose()
+
+    def _post_to(
+        self,
+        url: str,
+        payload: Any,
+        element_hook: Optional[Callable[[Any], Any]] = None,
+    ) -> Any:
+        # Called by the pool, which holds one of the shared in-flight slots meanwhile
+        if not isinstance(payload, list):
+            resp = self.sess.post(url, json=payload)
+            resp.raise_for_status()
+            return resp.json()
+
+        # Batch responses can be megabytes (e.g. on-chain data uris), parse them
+        # element by element as they arrive instead of buffering the whole body.
+        with self.sess.post(url, json=payload, stream=True) as resp:
+            resp.raise_for_status()
+            return parse_json_stream(
+                resp.iter_content(chunk_size=STREAM_CHUNK_SIZE), element_hook
+            )
+
+    def _post(
+        self, payload: Any, element_hook: Optional[Callable[[Any], Any]] = None
+    ) -> Any:
+        if element_hook is None:
+            return self.pool.post(payload, self._post_to)
+        return self.pool.post(payload, partial(self._post_to, element_hook=element_hook))
 
     def __payload_factory(self, method: str, params: list[Any], id: int) -> RPCPayload:
         return {"method": method, "params": params, "id": id, "jsonrpc": "2.0"}
@@ -44,9 +97,7 @@ class EthereumJSONRPC:
     def call(self, method: str, params: list[dict]) -> dict:  # type: ignore[type-arg]
         try:
             payload = self.__payload_factory(method, params, 1)
-            resp = self.sess.post(self.url, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
+            data = self._post(payload)
             return data  # type: ignore[no-any-return]
         except Exception as e:
             logger.error(
@@ -54,41 +105,143 @@ class EthereumJSONRPC:
             )
             raise
 
-    @retry(
-        stop=stop_after_attempt(2),
-        wait=wait_exponential(multiplier=1, min=1, max=5),
-    )
-    def call_batch(self, method: str, params: list[list[Any]]) -> list[dict]:  # type: ignore[type-arg]  # noqa: E501
+    def call_batch(
+        self,
+        method: str,
+        params: list[list[Any]],
+        element_hook: Optional[Callable[[dict], dict]] = None,  # type: ignore[type-arg]
+    ) -> list[dict]:  # type: ignore[type-arg]
+        """Send a batch of calls, matching responses to calls by id.
+
+        Calls whose response is missing or a transient error (e.g. rate limited) are re-sent,
+        with exponential backoff, while the request's retry budget allows it. Calls that still
+        have no response get an error response, unless no call succeeded at all, in which
+        case the last error is raised.
+
+        Args:
+            method (str): rpc method (ex: "eth_call")
+            params (list[list[Any]]): params of each call
+            element_hook (Optional[Callable[[dict], dict]], optional): applied to each response
+                as soon as it's read from the body, e.g. to decode a large result and drop its
+                hex. Must keep the "id" and "error" of the response. Defaults to None.
+
+        Returns:
+            list[dict]: responses mapped 1-1 with params
+        """  # noqa: E501
+        responses: list[Optional[dict]] = [None] * len(params)  # type: ignore[type-arg]
+        pending = list(range(len(params)))
+        last_error: Optional[Exception] = None
+        with retry_budget() as budget:
+            for attempt in range(MAX_BATCH_ATTEMPTS):
+                if attempt > 0:
+                    if not budget.acquire():
+                        break
+                    time.sleep(
+                        min(self.retry_backoff_max, self.retry_backoff_min * 2 ** (attempt - 1))  # noqa: E501
+                    )
+                    logger.warning(
+                        f"Retrying {len(pending)} of {len(params)} batched rpc calls. Method: {method}. Error: {last_error}"  # noqa: E501
+                    )
+                # Split by the current batch size, lowered if a batch was rejected
+                batch_size = self.pool.get_batch_size()
+                errors = [
+                    self._send_batch(
+                        method,
+                        params,
+                        pending[offset : offset + batch_size],  # noqa: E203
+                        responses,
+                        element_hook,
+                    )
+                    for offset in range(0, len(pending), batch_size)
+                ]
+                pending = [i for i in pending if self._should_retry(responses[i])]
+                if not pending:
+                    break
+                last_error = next(
+                    (e for e in errors if e is not None),
+                    Exception(f"{len(pending)} calls without a successful response"),
+                )
+
+        if all(response is None for response in responses) and last_error is not None:
+            raise last_error
+        return [
+            response
+            if response is not None
+            else {
+                "jsonrpc": "2.0",
+                "id": i,
+                "error": {"code": -32603, "message": f"No response: {last_error}"},
+            }
+            for i, response in enumerate(responses)
+        ]
+
+    def _send_batch(
+        self,
+        method: str,
+        params: list[list[Any]],
+        ids: list[int],
+        responses: list[Optional[dict]],  # type: ignore[type-arg]
+        element_hook: Optional[Callable[[dict], dict]] = None,  # type: ignore[type-arg]
+    ) -> Optional[Exception]:
+        payload = [self.__payload_factory(method, params[i], i) for i in ids]
         try:
-            payload = [
-                self.__payload_factory(method, param, i)
-                for i, param in enumerate(params)
-            ]  # noqa: E501
-            resp = self.sess.post(self.url, json=payload)
-            resp.raise_for_status()
-            result = resp.json()
-            return result  # type: ignore[no-any-return]
+            result = (
+                self._post(payload, element_hook)
+                if element_hook is not None
+                else self._post(payload)
+            )
         except Exception as e:
             logger.error(
                 f"Caught exception while making batch rpc call. "
-                f"Method: {method}. Params: {params}. Retrying. Error: {e}"
-                # noqa
+                f"Method: {method}. Params: {[params[i] for i in ids]}. Error: {e}"
             )
-            raise
+            return e
+        if not isinstance(result, list):
+            # The whole batch was rejected (e.g. rate limited)
+            return Exception(str(result))
+        for response in result:
+            i = response.get("id") if isinstance(response, dict) else None
+            if isinstance(i, int) and 0 <= i < len(params):
+                responses[i] = response
+        return None
+
+    @staticmethod
+    def _should_retry(response: Optional[dict]) -> bool:  # type: ignore[type-arg]
+        if response is None:
+            return True
+        error = response.get("error")
+        return isinstance(error, dict) and error.get("code") in RETRYABLE_ERROR_CODES
 
-    @retry(
-        stop=stop_after_attempt(2),
-        wait=wait_exponential(multiplier=1, min=1, max=5),
-    )
     def call_batch_chunked(
         self,
         method: str,
         params: list[list[Any]],
-        chunk_size: Optional[int] = MAX_REQUEST_BATCH_SIZE,
+        chunk_size: Optional[int] = None,
+        element_hook: Optional[Callable[[dict], dict]] = None,  # type: ignore[type-arg]
     ) -> list[dict]:  # type: ignore[type-arg]
+        """Send calls in concurrent batches.
+
+        Args:
+            method (str): rpc method (ex: "eth_call")
+            params (list[list[Any]]): params of each call
+            chunk_size (Optional[int], optional): number of calls per batch. Defaults to the
+                batch size learned for the pool's endpoints, see `AdaptiveBatchSizer`.
+            element_hook (Optional[Callable[[dict], dict]], optional): applied to each response
+                as soon as it's read, see `call_batch`. Defaults to None.
+
+        Returns:
+            list[dict]: responses mapped 1-1 with params
+        """  # noqa: E501
+        if chunk_size is None:
+            chunk_size = self.pool.get_batch_size()
+        call_batch = (
+            partial(self.call_batch, element_hook=element_hook)
+            if element_hook is not None
+            else self.call_batch
+        )
         size = len(params)
         if size < chunk_size:  # type: ignore[operator]
-            return self.call_batch(method, params)
+            return call_batch(method, params)
 
         prev_offset, curr_offset = 0, chunk_size
 
@@ -98,5 +251,10 @@ class EthereumJSONRPC:
             prev_offset = curr_offset  # type: ignore[assignment]
             curr_offset = min(curr_offset + chunk_size, size)  # type: ignore[operator]
 
-        results = parmap(lambda chunk: self.call_batch(method, chunk), chunks)
+        # Chunks share the retry budget of the whole request
+        with retry_budget(len(chunks)) as budget:
+            results = rpc_parmap(
+                lambda chunk: run_with_budget(budget, call_batch, method, chunk),
+                chunks,
+            )
         return [i for res in results for i in res]
@@ -0,0 +1,149 @@
+from typing import Any, Iterator, Optional, Union
+
+from offchain.logger.logging import logger
+from offchain.web3.jsonrpc import EthereumJSONRPC
+
+# keccak256("Transfer(address,address,uint256)")
+TRANSFER_EVENT_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+ZERO_ADDRESS_TOPIC = "0x" + "0" * 64
+# keccak256("TransferSingle(address,address,address,uint256,uint256)")
+TRANSFER_SINGLE_EVENT_TOPIC = "0xc3d58168c5ae7397731d063d5bbf3d657854427343f4c083240f7aacaa2d0f62"
+# keccak256("TransferBatch(address,address,address,uint256[],uint256[])")
+TRANSFER_BATCH_EVENT_TOPIC = "0x4a39dc06d4c0dbc64b70af90fd698a233a518aa5d07e595d983b8c0526c8f7fb"
+# Blocks per eth_getLogs request, before adapting to the logs density and provider limits
+LOGS_BLOCK_CHUNK_SIZE = 2000
+
+# JSON-RPC error codes and messages providers reject too large log queries with
+LOG_RANGE_ERROR_CODES = {-32005, -32602}
+LOG_RANGE_ERROR_MESSAGES = (
+    "block range",
+    "range too large",
+    "query returned more than",
+    "response size",
+    "too many",
+    "limit exceeded",
+)
+
+
+def is_log_range_error(error: Any) -> bool:
+    """Whether an eth_getLogs error asks for a smaller block range.
+
+    Args:
+        error (Any): "error" of the response.
+
+    Returns:
+        bool: whether the range should be split.
+    """
+    if not isinstance(error, dict):
+        return False
+    message = str(error.get("message", "")).lower()
+    return error.get("code") in LOG_RANGE_ERROR_CODES or any(
+        m in message for m in LOG_RANGE_ERROR_MESSAGES
+    )
+
+
+class AdaptiveLogRange:
+    """Block range of eth_getLogs requests, adapted to the density of the logs.
+
+    The range doubles while requests return few logs and halves when the provider rejects
+    a range (too many results, range too large) or the request fails, after which it never
+    grows past 3/4 of the rejected range.
+
+    Attributes:
+        size (int): blocks of the next request.
+        min_size (int): smallest range.
+        max_size (int): largest range.
+        target_logs (int): logs per request the range grows towards.
+    """  # noqa: E501
+
+    def __init__(
+        self,
+        size: int = LOGS_BLOCK_CHUNK_SIZE,
+        min_size: int = 1,
+        max_size: int = 1_000_000,
+        target_logs: int = 2000,
+    ) -> None:
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_logs = target_logs
+        self._ceiling = max_size
+
+    def record_success(self, n_logs: int) -> None:
+        """Record the number of logs a request returned."""
+        if n_logs < self.target_logs // 2:
+            self.size = max(self.size, min(self._ceiling, self.size * 2))
+
+    def record_failure(self) -> bool:
+        """Record a rejected request.
+
+        Returns:
+            bool: whether the range could be made smaller.
+        """
+        if self.size <= self.min_size:
+            return False
+        # Don't grow back near a rejected range
+        self._ceiling = max(self.min_size, self.size * 3 // 4)
+        self.size = max(self.min_size, self.size // 2)
+        return True
+
+
+def get_block_number(rpc: EthereumJSONRPC) -> int:
+    """Current block number of the rpc's chain."""
+    return int(rpc.call("eth_blockNumber", [])["result"], 16)
+
+
+def iter_logs(
+    rpc: EthereumJSONRPC,
+    address: str,
+    topics: list[Optional[Union[str, list[str]]]],
+    from_block: int = 0,
+    to_block: Optional[int] = None,
+    log_range: Optional[AdaptiveLogRange] = None,
+) -> Iterator[dict[str, Any]]:
+    """Fetch the logs of a contract with eth_getLogs, one range of blocks at a time.
+
+    Args:
+        rpc (EthereumJSONRPC): rpc client.
+        address (str): contract address.
+        topics (list[Optional[Union[str, list[str]]]]): topic filters, None matching any topic
+            and a list matching any of its topics.
+        from_block (int, optional): first block, inclusive. Defaults to 0.
+        to_block (Optional[int], optional): last block, inclusive. Defaults to the current block.
+        log_range (Optional[AdaptiveLogRange], optional): block range of the requests, pass one
+            to reuse what was learned across calls. Defaults to a new AdaptiveLogRange.
+
+    Yields:
+        dict[str, Any]: logs, in block order.
+    """  # noqa: E501
+    if to_block is None:
+        to_block = get_block_number(rpc)
+    log_range = log_range or AdaptiveLogRange()
+    start = from_block
+    while start <= to_block:
+        end = min(to_block, start + log_range.size - 1)
+        params = {
+            "address": address,
+            "topics": topics,
+            "fromBlock": hex(start),
+            "toBlock": hex(end),
+        }
+        try:
+            response = rpc.call("eth_getLogs", [params])
+        except Exception:
+            # e.g. the provider timed out on a dense range
+            if end > start and log_range.record_failure():
+                continue
+            raise
+        error = response.get("error")
+        if error is not None:
+            if end > start and is_log_range_error(error) and log_range.record_failure():
+                logger.debug(
+                    f"eth_getLogs range of {address} lowered to {log_range.size} blocks. Error: {error}"  # noqa: E501
+                )
+                continue
+            raise Exception(f"eth_getLogs failed for {address} from {start} to {end}: {error}")
+        logs = response["result"]
+        log_range.record_success(len(logs))
+        yield from logs
+        start = end + 1
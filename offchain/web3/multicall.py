@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from eth_abi import decode as decode_abi, encode as encode_abi  # type: ignore[attr-defined]  # noqa: E501
+from eth_utils import to_hex  # type: ignore[attr-defined]
+
+from offchain.web3.contract_utils import function_signature_to_sighash
+
+# Canonical Multicall3 deployment, same address on every EVM chain it is deployed to
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+AGGREGATE3_SIGNATURE = "aggregate3((address,bool,bytes)[])"
+AGGREGATE3_SIGHASH = function_signature_to_sighash(AGGREGATE3_SIGNATURE)
+
+# Return types whose encoded size depends on the returned value
+DYNAMIC_TYPES = ("string", "bytes")
+
+
+def _block_tag(params: list[Any]) -> Any:
+    return params[1] if len(params) > 1 else "latest"
+
+
+@dataclass
+class Multicall3:
+    """Packs many eth_calls into `aggregate3` calls on the Multicall3 contract.
+
+    Every wrapped call sets `allowFailure`, so a reverting call only fails itself and is
+    unpacked to None, the same way an errored eth_call is. Calls are split into chunks
+    that stay within a gas budget (to fit under the node's eth_call gas cap) and a
+    response size budget (to fit under the provider's response size limit). An aggregate
+    call runs at a single block, so calls at different block tags never share a chunk.
+
+    Attributes:
+        address (str): Multicall3 contract address.
+        gas_budget (int): max estimated gas of a single aggregate call.
+        gas_per_call (int): estimated gas of a single wrapped call, on top of its calldata.
+        response_size_budget (int): max estimated size in bytes of a single aggregate response.
+        dynamic_return_size (int): estimated size in bytes of a dynamic return value (string, bytes, arrays).
+    """  # noqa: E501
+
+    address: str = MULTICALL3_ADDRESS
+    gas_budget: int = 25_000_000
+    gas_per_call: int = 40_000
+    response_size_budget: int = 512 * 1024
+    dynamic_return_size: int = 512
+
+    def estimate_response_size(self, return_types: Optional[list[str]]) -> int:
+        # Every result is wrapped in a (bool, bytes) tuple: offset, success flag,
+        # bytes length, on top of the abi encoded return value itself.
+        size = 3 * 32
+        if return_types is None:
+            return size + self.dynamic_return_size
+        for return_type in return_types:
+            if return_type.endswith("]") or return_type in DYNAMIC_TYPES:
+                size += self.dynamic_return_size
+            else:
+                size += 32
+        return size
+
+    def chunk(
+        self,
+        request_params: list[list[Any]],
+        return_types: Optional[list[list[str]]] = None,
+    ) -> list[list[list[Any]]]:
+        """Split eth_call params into chunks that each fit in a single aggregate call.
+
+        Args:
+            request_params (list[list[Any]]): eth_call params, ex: [{"to": ..., "data": ...}, "latest"]
+            return_types (Optional[list[list[str]]], optional): return types of each call, used to
+                estimate the response size.
+
+        Returns:
+            list[list[list[Any]]]: chunks of eth_call params, in order. All calls of a chunk share a block tag.
+        """  # noqa: E501
+        chunks: list[list[list[Any]]] = []
+        chunk: list[list[Any]] = []
+        gas, size = 0, 0
+        block_tag = None
+        for i, params in enumerate(request_params):
+            call_gas = self.gas_per_call + 16 * (len(params[0]["data"]) - 2) // 2
+            call_size = self.estimate_response_size(
+                return_types[i] if return_types is not None else None
+            )
+            if chunk and (
+                gas + call_gas > self.gas_budget
+                or size + call_size > self.response_size_budget
+                or _block_tag(params) != block_tag
+            ):
+                chunks.append(chunk)
+                chunk, gas, size = [], 0, 0
+            chunk.append(params)
+            block_tag = _block_tag(params)
+            gas += call_gas
+            size += call_size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def build_request(self, chunk: list[list[Any]]) -> list[Any]:
+        """Build the eth_call params of the aggregate call for a chunk of calls.
+
+        Args:
+            chunk (list[list[Any]]): eth_call params of the wrapped calls.
+
+        Returns:
+            list[Any]: eth_call params, at the block tag of the wrapped calls.
+
+        Raises:
+            ValueError: if the wrapped calls are at different block tags.
+        """
+        block_tag = _block_tag(chunk[0])
+        if any(_block_tag(params) != block_tag for params in chunk):
+            raise ValueError("Multicall3 chunk mixes calls at different block tags")
+        calls = [
+            (
+                bytes.fromhex(params[0]["to"][2:]),
+                True,
+                bytes.fromhex(params[0]["data"][2:]),
+            )
+            for params in chunk
+        ]
+        data = AGGREGATE3_SIGHASH + encode_abi(
+            ["(address,bool,bytes)[]"], [calls]
+        ).hex()
+        return [{"to": self.address, "data": data}, block_tag]
+
+    @staticmethod
+    def decode_result(result: Optional[str], n_calls: int) -> Optional[list[Optional[str]]]:  # noqa: E501
+        """Unpack the result of an aggregate call into the results of the wrapped calls.
+
+        Args:
+            result (Optional[str]): hex encoded result of the aggregate call.
+            n_calls (int): number of wrapped calls.
+
+        Returns:
+            Optional[list[Optional[str]]]: hex encoded result of each call, None for failed calls.
+                None if the aggregate call itself failed.
+        """  # noqa: E501
+        if not result or result == "0x":
+            return None
+        try:
+            (results,) = decode_abi(["(bool,bytes)[]"], bytes.fromhex(result[2:]))
+        except Exception:
+            return None
+        if len(results) != n_calls:
+            return None
+        return [to_hex(data) if success else None for success, data in results]
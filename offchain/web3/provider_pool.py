@@ -0,0 +1,374 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional, Sequence, Union
+
+from offchain.concurrency import in_rpc_worker, rpc_in_flight_slot, submit_rpc
+from offchain.logger.logging import logger
+from offchain.web3.batch_sizer import (
+    AdaptiveBatchSizer,
+    get_default_batch_sizer,
+    is_batch_limit_error,
+    is_rate_limit_error,
+)
+
+
+class AllEndpointsFailedError(Exception):
+    """Raised when a request failed on every endpoint of an RPC pool."""
+
+
+@dataclass
+class RPCEndpoint:
+    """An RPC endpoint of a pool, along with its health stats.
+
+    Attributes:
+        url (str): JSON-RPC url.
+        weight (float): relative share of the traffic the endpoint should get when healthy.
+        max_concurrency (int): in-flight requests above which the endpoint is only used
+            if every other endpoint is saturated too.
+    """  # noqa: E501
+
+    url: str
+    weight: float = 1.0
+    max_concurrency: int = 20
+    latency_ewma: Optional[float] = None
+    error_rate: float = 0.0
+    in_flight: int = 0
+    requests: int = 0
+    errors: int = 0
+    hedged: int = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_flight >= self.max_concurrency
+
+
+class RPCProviderPool:
+    """Routes JSON-RPC requests between several endpoints based on their health.
+
+    Each request goes to the endpoint with the best score, a mix of its latency EWMA,
+    error rate EWMA, load and weight. A request still running after `hedge_delay` (or
+    `hedge_latency_multiplier` times the endpoint's usual latency) is hedged: the same
+    request is sent to the next best endpoint and whichever answers first wins. Failed
+    requests are retried on the other endpoints, up to `max_attempts` endpoints.
+
+    Attributes:
+        endpoints (list[RPCEndpoint]): endpoints of the pool.
+        hedge (bool): whether to hedge slow requests.
+        hedge_delay (Optional[float]): fixed seconds after which to hedge, if set.
+        hedge_latency_multiplier (float): hedge after this multiple of the latency EWMA.
+        min_hedge_delay (float): never hedge earlier than this many seconds.
+        max_attempts (Optional[int]): max number of endpoints a request is tried on.
+        ewma_alpha (float): weight of the newest sample in the latency and error EWMAs.
+        batch_sizer (AdaptiveBatchSizer): learns the batch size of each endpoint from the
+            batches sent through the pool. Defaults to the sizer shared by all pools.
+    """  # noqa: E501
+
+    def __init__(
+        self,
+        endpoints: Sequence[Union[str, RPCEndpoint]],
+        hedge: bool = True,
+        hedge_delay: Optional[float] = None,
+        hedge_latency_multiplier: float = 3.0,
+        min_hedge_delay: float = 0.5,
+        max_attempts: Optional[int] = None,
+        ewma_alpha: float = 0.2,
+        clock: Callable[[], float] = time.monotonic,
+        batch_sizer: Optional[AdaptiveBatchSizer] = None,
+    ) -> None:
+        assert endpoints, "an rpc pool needs at least one endpoint"
+        self.endpoints = [
+            endpoint if isinstance(endpoint, RPCEndpoint) else RPCEndpoint(url=endpoint)
+            for endpoint in endpoints
+        ]
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_latency_multiplier = hedge_latency_multiplier
+        self.min_hedge_delay = min_hedge_delay
+        self.max_attempts = max_attempts or len(self.endpoints)
+        self.ewma_alpha = ewma_alpha
+        self._clock = clock
+        self.batch_sizer = batch_sizer or get_default_batch_sizer()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """Url of the first endpoint, for callers that need a single url."""
+        return self.endpoints[0].url
+
+    def _score(self, endpoint: RPCEndpoint) -> float:
+        # Lower is better. Endpoints without samples yet are tried early.
+        latency = endpoint.latency_ewma if endpoint.latency_ewma is not None else 0.0
+        load = 1 + endpoint.in_flight / endpoint.max_concurrency
+        return (latency + 0.01) * load * (1 + 10 * endpoint.error_rate) / endpoint.weight
+
+    def select(self, exclude: Sequence[RPCEndpoint] = ()) -> Optional[RPCEndpoint]:
+        """Pick the healthiest endpoint, preferring ones under their concurrency limit.
+
+        Args:
+            exclude (Sequence[RPCEndpoint], optional): endpoints not to pick.
+
+        Returns:
+            Optional[RPCEndpoint]: best endpoint, None if all are excluded.
+        """
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            available = [e for e in candidates if not e.saturated] or candidates
+            return min(available, key=self._score)
+
+    def _start(self, endpoint: RPCEndpoint) -> float:
+        with self._lock:
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+        return self._clock()
+
+    def get_batch_size(self) -> int:
+        """Learned batch size of the endpoint requests are about to be sent to.
+
+        Returns:
+            int: number of calls to pack in a batch.
+        """
+        endpoint = self.select()
+        return self.batch_sizer.get_size((endpoint or self.endpoints[0]).url)
+
+    def _finish(
+        self,
+        endpoint: RPCEndpoint,
+        started_at: float,
+        ok: bool,
+        payload: Any = None,
+        failure: Any = None,
+    ) -> None:
+        latency = self._clock() - started_at
+        if isinstance(payload, list):
+            # Calls of an answered batch may be rate limited one by one too
+            if is_batch_limit_error(failure):
+                self.batch_sizer.record_limit_error(
+                    endpoint.url, len(payload), rate_limited=is_rate_limit_error(failure)
+                )
+            elif ok:
+                self.batch_sizer.record_success(endpoint.url, len(payload), latency)
+        alpha = self.ewma_alpha
+        with self._lock:
+            endpoint.in_flight = max(0, endpoint.in_flight - 1)
+            endpoint.error_rate = (1 - alpha) * endpoint.error_rate + alpha * (not ok)
+            if ok:
+                endpoint.latency_ewma = (
+                    latency
+                    if endpoint.latency_ewma is None
+                    else (1 - alpha) * endpoint.latency_ewma + alpha * latency
+                )
+            else:
+                endpoint.errors += 1
+
+    def _cancel(self, endpoint: RPCEndpoint) -> None:
+        # A hedged request that lost the race, it says nothing about the endpoint
+        with self._lock:
+            endpoint.in_flight = max(0, endpoint.in_flight - 1)
+
+    def _abandon(self, future: Future, endpoint: RPCEndpoint) -> None:  # type: ignore[type-arg]
+        # Cancelling a thread's future doesn't stop a request already sent, it keeps its
+        # connection until it's answered, so it only stops counting once it's done
+        future.cancel()
+        future.add_done_callback(lambda _: self._cancel(endpoint))
+
+    def _hedge_delay(self, endpoint: RPCEndpoint) -> Optional[float]:
+        if not self.hedge or len(self.endpoints) < 2:
+            return None
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        if endpoint.latency_ewma is None:
+            return None
+        return max(
+            self.min_hedge_delay,
+            endpoint.latency_ewma * self.hedge_latency_multiplier,
+        )
+
+    @staticmethod
+    def _is_failure(payload: Any, response: Any) -> bool:
+        # A batch answered with a single error object was rejected as a whole
+        # (e.g. rate limited), single calls may legitimately error (e.g. reverts).
+        return isinstance(payload, list) and not isinstance(response, list)
+
+    def post(self, payload: Any, post_fn: Callable[[str, Any], Any]) -> Any:
+        """Send a request through the pool.
+
+        Args:
+            payload (Any): JSON-RPC payload, a single call or a batch.
+            post_fn (Callable[[str, Any], Any]): sends a payload to an url and returns the
+                parsed response, raising on http errors.
+
+        Returns:
+            Any: parsed response of the first endpoint to answer successfully.
+        """  # noqa: E501
+        # Requests made from a task of the shared RPC executor aren't hedged, hedges run on
+        # that executor too and tasks waiting on tasks queued behind them would deadlock
+        if not self.hedge or len(self.endpoints) < 2 or in_rpc_worker():
+            return self._post_sequential(payload, post_fn)
+
+        def post_in_slot(url: str) -> Any:
+            with rpc_in_flight_slot():
+                return post_fn(url, payload)
+
+        tried: list[RPCEndpoint] = []
+        running: dict[Future, tuple[RPCEndpoint, float]] = {}  # type: ignore[type-arg]
+        last_error: Optional[BaseException] = None
+
+        def launch() -> bool:
+            endpoint = self.select(exclude=tried)
+            if endpoint is None or len(tried) >= self.max_attempts:
+                return False
+            tried.append(endpoint)
+            started_at = self._start(endpoint)
+            running[submit_rpc(post_in_slot, endpoint.url)] = (endpoint, started_at)
+            return True
+
+        launch()
+        while running:
+            # Only hedge a request that isn't already hedged
+            endpoint, _ = next(iter(running.values()))
+            timeout = self._hedge_delay(endpoint) if len(running) == 1 else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if launch():
+                    endpoint.hedged += 1
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                endpoint, started_at = running.pop(future)
+                error = future.exception()
+                ok = error is None and not self._is_failure(payload, future.result())
+                self._finish(
+                    endpoint, started_at, ok, payload, error or future.result()
+                )
+                if ok:
+                    for other, (other_endpoint, _) in running.items():
+                        self._abandon(other, other_endpoint)
+                    return future.result()
+                last_error = error or Exception(str(future.result()))
+                logger.warning(
+                    f"RPC request to {endpoint.url} failed, failing over. Error: {last_error}"  # noqa: E501
+                )
+            if not running:
+                launch()
+        raise AllEndpointsFailedError(
+            f"RPC request failed on all endpoints. Last error: {last_error}"
+        ) from last_error
+
+    def _post_sequential(self, payload: Any, post_fn: Callable[[str, Any], Any]) -> Any:
+        tried: list[RPCEndpoint] = []
+        last_error: Optional[BaseException] = None
+        while len(tried) < self.max_attempts:
+            endpoint = self.select(exclude=tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            started_at = self._start(endpoint)
+            try:
+                with rpc_in_flight_slot():
+                    response = post_fn(endpoint.url, payload)
+            except Exception as e:
+                self._finish(endpoint, started_at, False, payload, e)
+                last_error = e
+            else:
+                ok = not self._is_failure(payload, response)
+                self._finish(endpoint, started_at, ok, payload, response)
+                if ok:
+                    return response
+                last_error = Exception(str(response))
+            if len(self.endpoints) > 1:
+                logger.warning(
+                    f"RPC request to {endpoint.url} failed, failing over. Error: {last_error}"  # noqa: E501
+                )
+        raise AllEndpointsFailedError(
+            f"RPC request failed on all endpoints. Last error: {last_error}"
+        ) from last_error
+
+    async def gen_post(
+        self, payload: Any, post_fn: Callable[[str, Any], Awaitable[Any]]
+    ) -> Any:
+        """Async send a request through the pool.
+
+        Args:
+            payload (Any): JSON-RPC payload, a single call or a batch.
+            post_fn (Callable[[str, Any], Awaitable[Any]]): sends a payload to an url and
+                returns the parsed response, raising on http errors.
+
+        Returns:
+            Any: parsed response of the first endpoint to answer successfully.
+        """
+        tried: list[RPCEndpoint] = []
+        running: dict[asyncio.Task, tuple[RPCEndpoint, float]] = {}  # type: ignore[type-arg]  # noqa: E501
+        last_error: Optional[BaseException] = None
+
+        def launch() -> bool:
+            endpoint = self.select(exclude=tried)
+            if endpoint is None or len(tried) >= self.max_attempts:
+                return False
+            tried.append(endpoint)
+            started_at = self._start(endpoint)
+            task = asyncio.ensure_future(post_fn(endpoint.url, payload))
+            running[task] = (endpoint, started_at)
+            return True
+
+        launch()
+        try:
+            while running:
+                # Only hedge a request that isn't already hedged
+                endpoint, _ = next(iter(running.values()))
+                timeout = self._hedge_delay(endpoint) if len(running) == 1 else None
+                done, _ = await asyncio.wait(
+                    running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if launch():
+                        endpoint.hedged += 1
+                        continue
+                    done, _ = await asyncio.wait(
+                        running, return_when=asyncio.FIRST_COMPLETED
+                    )
+                for task in done:
+                    endpoint, started_at = running.pop(task)
+                    error = task.exception()
+                    ok = error is None and not self._is_failure(payload, task.result())
+                    self._finish(
+                        endpoint, started_at, ok, payload, error or task.result()
+                    )
+                    if ok:
+                        return task.result()
+                    last_error = error or Exception(str(task.result()))
+                    logger.warning(
+                        f"RPC request to {endpoint.url} failed, failing over. Error: {last_error}"  # noqa: E501
+                    )
+                if not running:
+                    launch()
+        finally:
+            for task, (endpoint, _) in running.items():
+                task.cancel()
+                self._cancel(endpoint)
+        raise AllEndpointsFailedError(
+            f"RPC request failed on all endpoints. Last error: {last_error}"
+        ) from last_error
+
+    def get_stats(self) -> dict[str, dict[str, Any]]:
+        """Latency, error rate and request counts of every endpoint.
+
+        Returns:
+            dict[str, dict[str, Any]]: stats keyed by endpoint url.
+        """
+        with self._lock:
+            return {
+                endpoint.url: {
+                    "latency_ewma": endpoint.latency_ewma,
+                    "error_rate": endpoint.error_rate,
+                    "in_flight": endpoint.in_flight,
+                    "requests": endpoint.requests,
+                    "errors": endpoint.errors,
+                    "hedged": endpoint.hedged,
+                }
+                for endpoint in self.endpoints
+            }
@@ -1,15 +1,25 @@
 import asyncio
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from functools import cached_property
 from typing import Any, Literal, Optional, Union
 
 import aiohttp
-from eth_abi import decode as decode_abi, encode as encode_abi
-from eth_utils import to_hex
 from web3 import Web3
 from web3.eth import AsyncEth
 
-from offchain.web3.contract_utils import function_signature_to_sighash
+from offchain.concurrency import run_cpu_bound
+from offchain.logger.logging import logger
+from offchain.web3.abi_decoding import decode_hex_result
+from offchain.web3.block_pinning import get_run_block
+from offchain.web3.call_coalescing import dedupe_params
+from offchain.web3.call_loader import CallLoader
+from offchain.web3.call_template import get_call_template
+from offchain.web3.multicall import Multicall3
+from offchain.web3.provider_pool import RPCProviderPool
+from offchain.web3.rpc_cache import RPCResultCache
+
+MAX_REQUEST_BATCH_SIZE = 100
+MAX_CONCURRENT_BATCHES = 10
 
 
 def make_async_w3_client(url: str, request_kwargs: dict = {"timeout": 20}) -> Web3:
@@ -24,7 +34,163 @@ def make_async_w3_client(url: str, request_kwargs: dict = {"timeout": 20}) -> We
 
 @dataclass
 class AsyncContractReader:
+    """Async reader for contract view functions over JSON-RPC.
+
+    All requests share one pooled `aiohttp.ClientSession`, so connections are kept alive
+    and reused instead of paying for a new handshake on every call. The session is
+    created lazily and should be closed with `aclose`, or by using the reader as an
+    async context manager:
+
+        >>> async with AsyncContractReader(rpc_url=url) as reader:
+        ...     await reader.get_owner(address)
+
+    Attributes:
+        rpc_url (str): JSON-RPC endpoint.
+        connection_limit (int): max number of open connections, 0 for no limit.
+        connection_limit_per_host (int): max number of open connections per host, 0 for no limit.
+        keepalive_timeout (float): seconds an idle connection is kept open.
+        request_timeout (float): total timeout of a request in seconds.
+        max_batch_size (Optional[int]): max number of calls packed in a single JSON-RPC batch.
+            Defaults to the batch size the pool learned for its endpoints, see `AdaptiveBatchSizer`.
+        max_concurrent_batches (int): max number of batches in flight at once.
+        multicall (Optional[Multicall3]): when set, eth_calls are aggregated into Multicall3
+            calls instead of being sent one by one.
+        batch_window (float): seconds calls made concurrently through `gen_multi_call` are
+            collected for, to be deduplicated and sent as one batch. 0 to only merge calls
+            made within the same event loop tick.
+        use_call_loader (bool): whether to merge concurrent calls at all.
+        cache (Optional[RPCResultCache]): cache of immutable and block-pinned eth_call results.
+        chain_identifier (str): chain `rpc_url` is connected to, part of the cache keys.
+        pool (Optional[RPCProviderPool]): pool of endpoints to route requests between,
+            takes precedence over `rpc_url`.
+        pinned_block (Optional[int]): block number eth_calls at "latest" are sent at instead,
+            for consistent (and cacheable) reads. See `gen_pin_block`.
+    """  # noqa: E501
+
     rpc_url: str
+    connection_limit: int = 100
+    connection_limit_per_host: int = 0
+    keepalive_timeout: float = 30
+    request_timeout: float = 20
+    max_batch_size: Optional[int] = None
+    max_concurrent_batches: int = MAX_CONCURRENT_BATCHES
+    multicall: Optional[Multicall3] = None
+    batch_window: float = 0.002
+    use_call_loader: bool = True
+    cache: Optional[RPCResultCache] = None
+    chain_identifier: str = "ETHEREUM-MAINNET"
+    pool: Optional[RPCProviderPool] = None
+    pinned_block: Optional[int] = None
+    _session: Optional[aiohttp.ClientSession] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _session_loop: Optional[asyncio.AbstractEventLoop] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _batch_semaphore: Optional[asyncio.Semaphore] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _call_loader: Optional[CallLoader] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _call_loader_loop: Optional[asyncio.AbstractEventLoop] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    async def __aenter__(self) -> "AsyncContractReader":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if (
+            self._session is None
+            or self._session.closed
+            or self._session_loop is not loop
+        ):
+            # A session is bound to the loop it was created on, so a reader used from
+            # a new loop (e.g. successive asyncio.run calls) needs a new one.
+            self._discard_session()
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.connection_limit,
+                    limit_per_host=self.connection_limit_per_host,
+                    keepalive_timeout=self.keepalive_timeout,
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            )
+            self._session_loop = loop
+            self._batch_semaphore = asyncio.Semaphore(self.max_concurrent_batches)
+        return self._session
+
+    def _get_call_loader(self) -> CallLoader:
+        loop = asyncio.get_running_loop()
+        if self._call_loader is None or self._call_loader_loop is not loop:
+            self._call_loader = CallLoader(
+                self._gen_send_calls,
+                batch_window=self.batch_window,
+                max_batch_size=self._get_batch_size() * self.max_concurrent_batches,
+            )
+            self._call_loader_loop = loop
+        return self._call_loader
+
+    def _get_batch_size(self) -> int:
+        if self.max_batch_size is not None:
+            return self.max_batch_size
+        if self.pool is not None:
+            return self.pool.get_batch_size()
+        return MAX_REQUEST_BATCH_SIZE
+
+    def _resolve_block_tag(self, block_tag: Optional[Any]) -> Optional[Any]:
+        if block_tag not in (None, "latest"):
+            return block_tag
+        # The block of the current run takes precedence over the reader's own pin
+        block_number = get_run_block(self)
+        if block_number is None:
+            block_number = self.pinned_block
+        return hex(block_number) if block_number is not None else block_tag
+
+    async def gen_block_number(self) -> int:
+        """Current block number of the chain."""
+        result = await self._request("eth_blockNumber", [])
+        return int(result, 16)  # type: ignore[arg-type]
+
+    async def gen_pin_block(self, block_number: Optional[int] = None) -> int:
+        """Pin reads at "latest" to a block number, the current block if none is given.
+
+        Args:
+            block_number (Optional[int], optional): block number to pin. Defaults to the current block.
+
+        Returns:
+            int: the pinned block number.
+        """  # noqa: E501
+        if block_number is None:
+            block_number = await self.gen_block_number()
+        self.pinned_block = block_number
+        return block_number
+
+    def _discard_session(self) -> None:
+        """Stop using the session of another event loop, closing it on that loop if it still runs."""  # noqa: E501
+        session, loop = self._session, self._session_loop
+        self._session, self._session_loop = None, None
+        if session is None or session.closed:
+            return
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        else:
+            # Its loop is gone, the connections can't be closed gracefully anymore
+            session.detach()
+
+    async def aclose(self) -> None:
+        """Close the pooled session and its connections."""
+        if self._session_loop is not asyncio.get_running_loop():
+            self._discard_session()
+            return
+        session, self._session, self._session_loop = self._session, None, None
+        if session is not None and not session.closed:
+            await session.close()
 
     @cached_property
     def async_w3(self) -> Web3:
@@ -38,19 +204,22 @@ class AsyncContractReader:
         return_type: list[str],
         args: Optional[list[Any]] = None,
     ) -> Optional[Any]:
+        block_tag = self._resolve_block_tag("latest")
         result = await self._request(
             method="eth_call",
             params=[
                 {
                     "to": contract_address,
                     "data": self._encode_params(function_signature, args),
-                }
+                },
+                block_tag,
             ],
+            block_tag=block_tag,
         )
 
-        return self._decode_result(
-            result, return_type
-        )  # type:ignore[return-value,arg-type]
+        return await run_cpu_bound(
+            self._decode_result, result, return_type, size=len(result or "")
+        )
 
     async def gen_call_single_function_single_address_many_args(
         self,
@@ -74,13 +243,15 @@ class AsyncContractReader:
             list[Optional[Any]]: list of returned values, mapped 1-1 with args
         """
 
+        block_tag = self._resolve_block_tag(block_tag)
         req_params = [
             self.view_request_builder(address, function_sig, arg, block_tag, **kwargs)
             for arg in args
         ]
 
-        res = await self.gen_multi_call("eth_call", req_params, block_tag)
-        return list(map(lambda x: self._decode_result(x, return_type), res))
+        return_types = [return_type] * len(req_params)
+        res = await self.gen_multi_call("eth_call", req_params, block_tag, return_types)
+        return await self._gen_decode_results(res, return_types)
 
     async def gen_call_single_function_many_address_ordered_args(
         self,
@@ -103,6 +274,7 @@ class AsyncContractReader:
             [list[any]]: mapped 1-1 with addresses, all of same type
         """
 
+        block_tag = self._resolve_block_tag(block_tag)
         req_params = [
             self.view_request_builder(
                 addresses[i], function_signature, args[i], block_tag
@@ -110,8 +282,9 @@ class AsyncContractReader:
             for i in range(len(addresses))
         ]
 
-        res = await self.gen_multi_call("eth_call", req_params, block_tag)
-        return list(map(lambda x: self._decode_result(x, return_type), res))
+        return_types = [return_type] * len(req_params)
+        res = await self.gen_multi_call("eth_call", req_params, block_tag, return_types)
+        return await self._gen_decode_results(res, return_types)
 
     async def gen_call_ordered_function_many_address_ordered_args(
         self,
@@ -133,6 +306,7 @@ class AsyncContractReader:
             [list[Any]]: mapped 1-1 with addresses, may be of varying types
         """
 
+        block_tag = self._resolve_block_tag(block_tag)
         req_params = [
             self.view_request_builder(
                 addresses[i], function_sigs[i], args[i], block_tag
@@ -140,24 +314,170 @@ class AsyncContractReader:
             for i in range(len(addresses))
         ]
 
-        res = await self.gen_multi_call("eth_call", req_params, block_tag)
+        res = await self.gen_multi_call("eth_call", req_params, block_tag, return_types)
+        return await self._gen_decode_results(res, return_types)
+
+    async def gen_call_single_address_many_fns_many_args(
+        self,
+        address: str,
+        function_sigs: list[str],
+        return_types: list[list[str]],
+        args: list[list[Any]],
+        block_tag: Optional[str] = "latest",
+    ) -> dict[str, Optional[Any]]:
+        """Call many functions on a single address with different arguments per function
+
+        Args:
+            address (str): address to call functions on
+            function_sigs (list[str]): list of fn signatures (ex: ["totalSupply()", "symbol()"])
+            return_types (list[list[str]]): list of return function signatures (ex: [["uint256"]])
+            args (list[list[Any]]): list of arguments passed in each fn call (ex: [[1], [2], [3]])
+            block_tag (Optional[str], optional): block tag. Defaults to "latest".
+
+        Returns:
+            dict[str, Optional[Any]]: dicts with fn names as keys (ex: {"totalSupply()": 1234})
+        """  # noqa: E501
+        assert len(function_sigs) == len(args) and len(args) == len(
+            return_types
+        ), "function names, return types, args must all be the same length"
+        block_tag = self._resolve_block_tag(block_tag)
+        req_params = [
+            self.view_request_builder(address, function_sigs[i], args[i], block_tag)
+            for i in range(len(args))
+        ]
+
+        res = await self.gen_multi_call("eth_call", req_params, block_tag, return_types)
+        cleaned = await self._gen_decode_results(res, return_types)
+        return {k: v for k, v in zip(function_sigs, cleaned)}
+
+    async def gen_multi_call(
+        self,
+        method: str,
+        params: list[list[Any]],
+        block_tag: Optional[str] = "latest",
+        return_types: Optional[list[list[str]]] = None,
+    ) -> list[Any]:
+        """Make many calls of the same method, packed in JSON-RPC batches
+
+        Calls made concurrently (e.g. by parsers fetching one token each) are merged and
+        deduplicated by a `CallLoader` before being sent. Calls are split in batches of at
+        most `max_batch_size`, and at most `max_concurrent_batches` batches are in flight
+        at once. eth_calls are aggregated into Multicall3 calls if `multicall` is set, and
+        served from `cache` when their result is cached.
+
+        Args:
+            method (str): JSON-RPC method (ex: "eth_call")
+            params (list[list[Any]]): params of each call
+            block_tag (Optional[str], optional): block tag. Defaults to "latest".
+            return_types (Optional[list[list[str]]], optional): return types of each call,
+                used to size multicall chunks.
+
+        Returns:
+            list[Any]: results mapped 1-1 with params, None for errored calls
+        """  # noqa: E501
+        if method != "eth_call" or self.cache is None:
+            return await self._gen_load_calls(method, params, block_tag, return_types)
+
+        cached = [self.cache.get(self.chain_identifier, param) for param in params]
+        results = [result for _, result in cached]
+        misses = [i for i, (hit, _) in enumerate(cached) if not hit]
+        if misses:
+            miss_params = [params[i] for i in misses]
+            miss_results = await self._gen_load_calls(
+                method,
+                miss_params,
+                block_tag,
+                [return_types[i] for i in misses] if return_types is not None else None,
+            )
+            for i, result in zip(misses, miss_results):
+                results[i] = result
+            self.cache.set_many(self.chain_identifier, miss_params, miss_results)
+        return results
+
+    async def _gen_load_calls(
+        self,
+        method: str,
+        params: list[list[Any]],
+        block_tag: Optional[str] = "latest",
+        return_types: Optional[list[list[str]]] = None,
+    ) -> list[Any]:
+        if not self.use_call_loader:
+            # Send identical calls once, and fan their result out
+            unique, positions = dedupe_params(params)
+            unique_types: list[list[str]] = [[]] * len(unique)
+            for position, types in zip(positions, return_types or []):
+                unique_types[position] = types
+            results = await self._gen_send_calls(
+                method, unique, block_tag, unique_types if return_types is not None else None
+            )
+            return [results[position] for position in positions]
+
+        loader = self._get_call_loader()
         return list(
-            map(lambda x: self._decode_result(res[x], return_types[x]), range(len(res)))
+            await asyncio.gather(
+                *[
+                    loader.load(
+                        method,
+                        param,
+                        block_tag,
+                        return_types[i] if return_types is not None else None,
+                    )
+                    for i, param in enumerate(params)
+                ]
+            )
         )
 
-    async def gen_multi_call(
+    async def _gen_send_calls(
         self,
         method: str,
         params: list[list[Any]],
         block_tag: Optional[str] = "latest",
+        return_types: Optional[list[list[str]]] = None,
     ) -> list[Any]:
-        result = await asyncio.gather(
-            *[
-                self._request(method, param, block_tag)  # type:ignore[arg-type]
-                for param in params
-            ]
+        if method == "eth_call" and self.multicall is not None and len(params) > 1:
+            return await self._gen_multicall(params, block_tag, return_types)
+        return await self._gen_batch_call(method, params, block_tag)
+
+    async def _gen_multicall(
+        self,
+        params: list[list[Any]],
+        block_tag: Optional[str] = "latest",
+        return_types: Optional[list[list[str]]] = None,
+    ) -> list[Any]:
+        multicall: Multicall3 = self.multicall  # type: ignore[assignment]
+        chunks = multicall.chunk(params, return_types)
+        responses = await self._gen_batch_call(
+            "eth_call", [multicall.build_request(chunk) for chunk in chunks], block_tag
         )
-        return result
+
+        results: list[Any] = []
+        for chunk, response in zip(chunks, responses):
+            unpacked = multicall.decode_result(response, len(chunk))
+            if unpacked is None:
+                # The aggregate call itself failed (e.g. no Multicall3 on this chain,
+                # or over the gas cap), fall back to plain eth_calls for this chunk
+                results += await self._gen_batch_call("eth_call", chunk, block_tag)
+            else:
+                results += unpacked
+        return results
+
+    async def _gen_batch_call(
+        self,
+        method: str,
+        params: list[list[Any]],
+        block_tag: Optional[str] = "latest",
+    ) -> list[Any]:
+        if len(params) == 1:
+            return [await self._request(method, params[0], block_tag)]  # type: ignore[arg-type]  # noqa: E501
+
+        batch_size = self._get_batch_size()
+        chunks = [
+            params[i : i + batch_size] for i in range(0, len(params), batch_size)
+        ]
+        results = await asyncio.gather(
+            *[self._request_batch(method, chunk, block_tag) for chunk in chunks]
+        )
+        return [i for res in results for i in res]
 
     def view_request_builder(
         self,
@@ -193,15 +513,16 @@ class AsyncContractReader:
             params=[contract_address],
         )
 
-    async def _request(
-        self,
+    @staticmethod
+    def _payload(
         method: str,
         params: Optional[list[Any]] = None,
         block_tag: Optional[Union[Literal["latest"], int]] = None,
-    ) -> Optional[Union[Any, tuple[Any]]]:
+        id: int = 1,
+    ) -> dict[str, Any]:
         payload = {
             "jsonrpc": "2.0",
-            "id": 1,
+            "id": id,
             "method": method,
         }
 
@@ -209,12 +530,59 @@ class AsyncContractReader:
             if block_tag is None:
                 params.append("latest")
             payload["params"] = params
+        return payload
+
+    async def _request(
+        self,
+        method: str,
+        params: Optional[list[Any]] = None,
+        block_tag: Optional[Union[Literal["latest"], int]] = None,
+    ) -> Optional[Union[Any, tuple[Any]]]:
+        payload = self._payload(method, params, block_tag)
+
+        response_json = await self._post(payload)
+        return response_json.get("result")
 
-        # Make an async call with aiohttp
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.rpc_url, json=payload) as response:
-                response_json = await response.json()
-            return response_json.get("result")
+    async def _post(self, payload: Any) -> Any:
+        session = await self._get_session()
+
+        async def post_to(url: str, payload: Any) -> Any:
+            async with session.post(url, json=payload) as response:
+                response.raise_for_status()
+                return await response.json()
+
+        if self.pool is None:
+            return await post_to(self.rpc_url, payload)
+        return await self.pool.gen_post(payload, post_to)
+
+    async def _request_batch(
+        self,
+        method: str,
+        params: list[list[Any]],
+        block_tag: Optional[Union[Literal["latest"], int]] = None,
+    ) -> list[Any]:
+        """Send calls as a single JSON-RPC batch, matching responses back by id"""
+        payload = [
+            self._payload(method, param, block_tag, id=i)
+            for i, param in enumerate(params)
+        ]
+
+        await self._get_session()
+        async with self._batch_semaphore:  # type: ignore[union-attr]
+            response_json = await self._post(payload)
+
+        results: list[Any] = [None] * len(params)
+        if not isinstance(response_json, list):
+            # The whole batch was rejected, e.g. batch too large or rate limited
+            logger.error(
+                f"Batch rpc call failed. Method: {method}. Error: {response_json}"
+            )
+            return results
+        for item in response_json:
+            id = item.get("id") if isinstance(item, dict) else None
+            if isinstance(id, int) and 0 <= id < len(results):
+                results[id] = item.get("result")
+        return results
 
     @staticmethod
     def _encode_params(
@@ -232,16 +600,25 @@ class AsyncContractReader:
         Returns:
             str: [description]
         """
-        b = bytes.fromhex(function_signature_to_sighash(function_sig)[2:])
-        if args is not None:
-            if arg_types is None:
-                start = function_sig.find("(")
-                arg_types = function_sig[start:].strip("()").split(",")
-                if type(arg_types) is str:
-                    arg_types = [arg_types]
-            b += encode_abi(arg_types, args)
-        p = to_hex(b)
-        return p
+        return get_call_template(function_sig, arg_types).encode(args)
+
+    @classmethod
+    def _decode_results(
+        cls, results: list[Optional[Any]], return_types: list[list[str]]
+    ) -> list[Any]:
+        return [
+            cls._decode_result(result, types)
+            for result, types in zip(results, return_types)
+        ]
+
+    async def _gen_decode_results(
+        self, results: list[Optional[Any]], return_types: list[list[str]]
+    ) -> list[Any]:
+        """Decode many responses, off the event loop if they are large (e.g. long strings)"""  # noqa: E501
+        size = sum(len(r) for r in results if isinstance(r, str))
+        return await run_cpu_bound(  # type: ignore[no-any-return]
+            self._decode_results, results, return_types, size=size
+        )
 
     @staticmethod
     def _decode_result(
@@ -263,7 +640,7 @@ class AsyncContractReader:
             trimmed = result[2:]
             if trimmed == "":
                 return None
-            parsed = decode_abi(return_types, bytes.fromhex(trimmed))
+            parsed = decode_hex_result(return_types, trimmed)
             n_expected, n_received = len(return_types), len(parsed)
             if n_expected == 1 or n_received == 1:
                 return parsed[0]
@@ -0,0 +1,93 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Optional
+
+# Retries allowed for a top level request, on top of a share of its sub-requests
+MIN_RETRIES = 3
+RETRY_RATIO = 0.2
+
+_active_budget: ContextVar[Optional["RetryBudget"]] = ContextVar(
+    "offchain_retry_budget", default=None
+)
+
+
+class RetryBudget:
+    """Number of retries shared by every layer of a request (chunks, batches, sub-batches).
+
+    Layers draw from the budget of the outermost request instead of each retrying on
+    their own, so a flaky provider can't multiply the number of requests sent.
+
+    Attributes:
+        max_retries (int): number of retries the request may make.
+    """  # noqa: E501
+
+    def __init__(self, max_retries: int) -> None:
+        self.max_retries = max_retries
+        self._used = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_requests(cls, n_requests: int) -> "RetryBudget":
+        """Budget for a request made of `n_requests` sub-requests."""
+        return cls(max(MIN_RETRIES, int(n_requests * RETRY_RATIO)))
+
+    @property
+    def remaining(self) -> int:
+        with self._lock:
+            return self.max_retries - self._used
+
+    def acquire(self) -> bool:
+        """Take a retry from the budget.
+
+        Returns:
+            bool: whether the retry is allowed.
+        """
+        with self._lock:
+            if self._used >= self.max_retries:
+                return False
+            self._used += 1
+            return True
+
+
+def get_retry_budget() -> Optional[RetryBudget]:
+    """Budget of the request being made, if any."""
+    return _active_budget.get()
+
+
+@contextmanager
+def retry_budget(n_requests: int = 1) -> Iterator[RetryBudget]:
+    """Use the budget of the request being made, or start one for a new request.
+
+    Args:
+        n_requests (int, optional): number of sub-requests of a new request. Defaults to 1.
+
+    Yields:
+        RetryBudget: the active budget.
+    """  # noqa: E501
+    budget = _active_budget.get()
+    if budget is not None:
+        yield budget
+        return
+    token = _active_budget.set(RetryBudget.for_requests(n_requests))
+    try:
+        yield _active_budget.get()  # type: ignore[misc]
+    finally:
+        _active_budget.reset(token)
+
+
+def run_with_budget(budget: Optional[RetryBudget], fn: Callable, *args: Any) -> Any:  # type: ignore[type-arg]  # noqa: E501
+    """Run a function with a budget active, e.g. on a worker thread.
+
+    Args:
+        budget (Optional[RetryBudget]): budget to use.
+        fn (Callable): function to run.
+
+    Returns:
+        Any: result of the function.
+    """
+    token = _active_budget.set(budget)
+    try:
+        return fn(*args)
+    finally:
+        _active_budget.reset(token)
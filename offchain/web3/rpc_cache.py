@@ -0,0 +1,213 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Union
+
+from offchain.constants.addresses import CollectionAddress
+from offchain.logger.logging import logger
+from offchain.web3.contract_utils import function_signature_to_sighash
+
+# (contract, function signature) pairs whose results never change once set.
+# A None contract matches any contract, a None signature any function of the contract.
+DEFAULT_IMMUTABLE_CALLS: list[tuple[Optional[str], Optional[str]]] = [
+    (CollectionAddress.PUNKS_DATA, None),
+    (CollectionAddress.AUTOGLYPHS, "draw(uint256)"),
+    (CollectionAddress.AUTOGLYPHS, "symbolScheme(uint256)"),
+    (CollectionAddress.NOUNS, "seeds(uint256)"),
+    (CollectionAddress.LIL_NOUNS, "seeds(uint256)"),
+    (CollectionAddress.CHAINRUNNERS, "getDna(uint256)"),
+]
+
+# Marks entries that are valid at any block
+ANY_BLOCK = "*"
+
+
+def normalize_block_tag(block_tag: Optional[Union[str, int]]) -> Optional[int]:
+    """Get the block number a block tag is pinned to.
+
+    Args:
+        block_tag (Optional[Union[str, int]]): block number, hex block number or named tag.
+
+    Returns:
+        Optional[int]: block number, None for moving tags like "latest".
+    """
+    if isinstance(block_tag, int):
+        return block_tag
+    if isinstance(block_tag, str) and block_tag.startswith("0x"):
+        try:
+            return int(block_tag, 16)
+        except ValueError:
+            return None
+    return None
+
+
+class RPCResultCache:
+    """Tiered cache of eth_call results keyed by (chain, to, calldata, block).
+
+    Results of calls declared immutable (whole contracts or single functions) are valid
+    at every block and never expire. Results of other calls are only cached when read
+    at a pinned block number, since the result at "latest" changes over time. Entries
+    live in an in-memory LRU and, if `db_path` is set, in a SQLite database shared
+    between runs.
+
+    Errored calls, empty results and, for immutable calls, all-zero results (storage
+    that hasn't been written yet, e.g. the seed of a token that isn't minted) are never
+    cached.
+
+    Attributes:
+        max_size (int): max number of entries kept in memory.
+        db_path (Optional[str]): path of the SQLite database, None to only cache in memory.
+    """  # noqa: E501
+
+    def __init__(
+        self,
+        max_size: int = 100_000,
+        db_path: Optional[str] = None,
+        immutable_calls: Optional[
+            Iterable[tuple[Optional[str], Optional[str]]]
+        ] = None,
+    ) -> None:
+        self.max_size = max_size
+        self.db_path = db_path
+        self._immutable: set[tuple[Optional[str], Optional[str]]] = set()
+        for contract, function_sig in (
+            DEFAULT_IMMUTABLE_CALLS if immutable_calls is None else immutable_calls
+        ):
+            self.declare_immutable(contract, function_sig)
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path is not None:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rpc_results (key TEXT PRIMARY KEY, result TEXT NOT NULL)"  # noqa: E501
+            )
+            self._db.commit()
+
+    def declare_immutable(
+        self, contract: Optional[str] = None, function_sig: Optional[str] = None
+    ) -> None:
+        """Declare the results of a contract, a function or a function of a contract immutable.
+
+        Args:
+            contract (Optional[str], optional): contract address, None for any contract.
+            function_sig (Optional[str], optional): function signature (ex: "draw(uint256)"),
+                None for any function.
+        """  # noqa: E501
+        assert contract is not None or function_sig is not None
+        self._immutable.add(
+            (
+                contract.lower() if contract is not None else None,
+                function_signature_to_sighash(function_sig)
+                if function_sig is not None
+                else None,
+            )
+        )
+
+    def is_immutable(self, to: str, data: str) -> bool:
+        to, selector = to.lower(), data[:10].lower()
+        return (
+            (to, None) in self._immutable
+            or (None, selector) in self._immutable
+            or (to, selector) in self._immutable
+        )
+
+    def _key(self, chain: str, params: list[Any]) -> Optional[str]:
+        call = params[0]
+        to, data = call.get("to"), call.get("data")
+        if not to or not data:
+            return None
+        if self.is_immutable(to, data):
+            block = ANY_BLOCK
+        else:
+            block_number = normalize_block_tag(params[1] if len(params) > 1 else None)
+            if block_number is None:
+                return None
+            block = str(block_number)
+        return f"{chain}:{to.lower()}:{data.lower()}:{block}"
+
+    def get(self, chain: str, params: list[Any]) -> tuple[bool, Optional[str]]:
+        """Look up the cached result of an eth_call.
+
+        Args:
+            chain (str): chain identifier (ex: "ETHEREUM-MAINNET")
+            params (list[Any]): eth_call params, ex: [{"to": ..., "data": ...}, "latest"]
+
+        Returns:
+            tuple[bool, Optional[str]]: whether the call was cached, and its result.
+        """
+        key = self._key(chain, params)
+        if key is None:
+            return False, None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return True, self._entries[key]
+            if self._db is None:
+                return False, None
+            row = self._db.execute(
+                "SELECT result FROM rpc_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return False, None
+            self._set_in_memory(key, row[0])
+            return True, row[0]
+
+    def set(self, chain: str, params: list[Any], result: Optional[str]) -> None:
+        """Cache the result of an eth_call, if it can be cached.
+
+        Args:
+            chain (str): chain identifier (ex: "ETHEREUM-MAINNET")
+            params (list[Any]): eth_call params, ex: [{"to": ..., "data": ...}, 17000000]
+            result (Optional[str]): hex encoded result, None if the call errored.
+        """
+        self.set_many(chain, [params], [result])
+
+    def set_many(
+        self, chain: str, params: list[list[Any]], results: list[Optional[str]]
+    ) -> None:
+        """Cache the results of many eth_calls at once, in a single database transaction.
+
+        Args:
+            chain (str): chain identifier (ex: "ETHEREUM-MAINNET")
+            params (list[list[Any]]): eth_call params of each call
+            results (list[Optional[str]]): hex encoded results, mapped 1-1 with params.
+        """  # noqa: E501
+        entries = []
+        for call_params, result in zip(params, results):
+            if not isinstance(result, str) or result in ("", "0x"):
+                continue
+            key = self._key(chain, call_params)
+            if key is None:
+                continue
+            if key.endswith(ANY_BLOCK) and not result[2:].strip("0"):
+                continue
+            entries.append((key, result))
+        if not entries:
+            return
+
+        with self._lock:
+            for key, result in entries:
+                self._set_in_memory(key, result)
+            if self._db is not None:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO rpc_results (key, result) VALUES (?, ?)",
+                        entries,
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to write rpc results to cache. Error: {e}")
+
+    def _set_in_memory(self, key: str, result: str) -> None:
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def close(self) -> None:
+        """Close the SQLite database, if any."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,221 @@
+from typing import Iterator, Optional
+
+from eth_abi import decode as decode_abi  # type: ignore[attr-defined]
+
+from offchain.web3.contract_caller import ContractCaller
+from offchain.web3.logs import (
+    iter_logs,
+    TRANSFER_BATCH_EVENT_TOPIC,
+    TRANSFER_EVENT_TOPIC,
+    TRANSFER_SINGLE_EVENT_TOPIC,
+    ZERO_ADDRESS_TOPIC,
+)
+from offchain.web3.token_standards import (
+    ERC1155_INTERFACE_ID,
+    ERC721_ENUMERABLE_INTERFACE_ID,
+    SUPPORTS_INTERFACE_SIGNATURE,
+)
+
+# tokenByIndex calls fetched at a time
+ENUMERATION_BATCH_SIZE = 1000
+
+
+def _block_tag(block_number: Optional[int]) -> str:
+    return hex(block_number) if block_number is not None else "latest"
+
+
+def supports_interfaces(
+    contract_caller: ContractCaller,
+    address: str,
+    interface_ids: list[bytes],
+    block_number: Optional[int] = None,
+) -> list[Optional[bool]]:
+    """Whether a contract implements each of some interfaces, per ERC165, in one batch.
+
+    Args:
+        contract_caller (ContractCaller): contract caller of the contract's chain.
+        address (str): contract address.
+        interface_ids (list[bytes]): 4 bytes interface ids.
+        block_number (Optional[int], optional): block to call at. Defaults to the latest block.
+
+    Returns:
+        list[Optional[bool]]: whether each interface is implemented, None if the contract doesn't implement ERC165.
+    """  # noqa: E501
+    return contract_caller.single_address_single_fn_many_args(
+        address=address,
+        function_sig=SUPPORTS_INTERFACE_SIGNATURE,
+        return_type=["bool"],
+        args=[[interface_id] for interface_id in interface_ids],
+        block_tag=_block_tag(block_number),
+    )
+
+
+def supports_interface(
+    contract_caller: ContractCaller,
+    address: str,
+    interface_id: bytes,
+    block_number: Optional[int] = None,
+) -> Optional[bool]:
+    """Whether a contract implements an interface, per ERC165.
+
+    Args:
+        contract_caller (ContractCaller): contract caller of the contract's chain.
+        address (str): contract address.
+        interface_id (bytes): 4 bytes interface id.
+        block_number (Optional[int], optional): block to call at. Defaults to the latest block.
+
+    Returns:
+        Optional[bool]: whether the interface is implemented, None if the contract doesn't implement ERC165.
+    """  # noqa: E501
+    res = supports_interfaces(contract_caller, address, [interface_id], block_number)
+    return res[0] if res else None
+
+
+def iter_enumerable_token_ids(
+    contract_caller: ContractCaller,
+    address: str,
+    batch_size: int = ENUMERATION_BATCH_SIZE,
+    block_number: Optional[int] = None,
+) -> Iterator[int]:
+    """Enumerate the token ids of an ERC721Enumerable collection, with batched `tokenByIndex` calls.
+
+    Args:
+        contract_caller (ContractCaller): contract caller of the collection's chain.
+        address (str): collection address.
+        batch_size (int, optional): token ids fetched at a time. Defaults to 1000.
+        block_number (Optional[int], optional): block to enumerate the tokens at. Defaults to
+            the latest block of each call.
+
+    Yields:
+        int: token ids, in index order.
+    """  # noqa: E501
+    block_tag = _block_tag(block_number)
+    res = contract_caller.single_address_single_fn_many_args(
+        address=address,
+        function_sig="totalSupply()",
+        return_type=["uint256"],
+        args=[[]],
+        block_tag=block_tag,
+    )
+    total_supply = res[0] if res else None
+    if total_supply is None:
+        raise ValueError(f"Failed to fetch the total supply of {address}")
+    for start in range(0, total_supply, batch_size):
+        token_ids = contract_caller.single_address_single_fn_many_args(
+            address=address,
+            function_sig="tokenByIndex(uint256)",
+            return_type=["uint256"],
+            args=[[i] for i in range(start, min(total_supply, start + batch_size))],
+            block_tag=block_tag,
+        )
+        yield from (token_id for token_id in token_ids if token_id is not None)
+
+
+def iter_minted_token_ids(
+    contract_caller: ContractCaller,
+    address: str,
+    from_block: int = 0,
+    to_block: Optional[int] = None,
+) -> Iterator[int]:
+    """Enumerate the token ids of an ERC721 collection from its mint (Transfer from zero) logs.
+
+    Tokens burnt and minted again are yielded once per mint.
+
+    Args:
+        contract_caller (ContractCaller): contract caller of the collection's chain.
+        address (str): collection address.
+        from_block (int, optional): first block to read logs from. Defaults to 0.
+        to_block (Optional[int], optional): last block to read logs from. Defaults to the current block.
+
+    Yields:
+        int: token ids, in mint order.
+    """  # noqa: E501
+    logs = iter_logs(
+        contract_caller.rpc,
+        address,
+        [TRANSFER_EVENT_TOPIC, ZERO_ADDRESS_TOPIC],
+        from_block=from_block,
+        to_block=to_block,
+    )
+    for log in logs:
+        topics = log.get("topics") or []
+        # ERC20 transfers share the topic, but their value isn't indexed
+        if len(topics) == 4:
+            yield int(topics[3], 16)
+
+
+def iter_minted_erc1155_token_ids(
+    contract_caller: ContractCaller,
+    address: str,
+    from_block: int = 0,
+    to_block: Optional[int] = None,
+) -> Iterator[int]:
+    """Enumerate the token ids of an ERC1155 collection from its mint (TransferSingle and TransferBatch from zero) logs.
+
+    Ids minted several times are yielded once, so the ids seen so far are kept in memory.
+
+    Args:
+        contract_caller (ContractCaller): contract caller of the collection's chain.
+        address (str): collection address.
+        from_block (int, optional): first block to read logs from. Defaults to 0.
+        to_block (Optional[int], optional): last block to read logs from. Defaults to the current block.
+
+    Yields:
+        int: token ids, in first mint order.
+    """  # noqa: E501
+    logs = iter_logs(
+        contract_caller.rpc,
+        address,
+        [[TRANSFER_SINGLE_EVENT_TOPIC, TRANSFER_BATCH_EVENT_TOPIC], None, ZERO_ADDRESS_TOPIC],
+        from_block=from_block,
+        to_block=to_block,
+    )
+    seen: set[int] = set()
+    for log in logs:
+        topics = log.get("topics") or []
+        data = bytes.fromhex((log.get("data") or "0x")[2:])
+        if not topics or not data:
+            continue
+        if topics[0] == TRANSFER_SINGLE_EVENT_TOPIC:
+            token_ids = [decode_abi(["uint256", "uint256"], data)[0]]
+        else:
+            token_ids = list(decode_abi(["uint256[]", "uint256[]"], data)[0])
+        for token_id in token_ids:
+            if token_id not in seen:
+                seen.add(token_id)
+                yield token_id
+
+
+def iter_collection_token_ids(
+    contract_caller: ContractCaller,
+    address: str,
+    from_block: int = 0,
+    to_block: Optional[int] = None,
+) -> Iterator[int]:
+    """Enumerate the token ids of a collection, with `tokenByIndex` if it's ERC721Enumerable or its mint logs otherwise.
+
+    Args:
+        contract_caller (ContractCaller): contract caller of the collection's chain.
+        address (str): collection address.
+        from_block (int, optional): first block to read mint logs from. Defaults to 0.
+        to_block (Optional[int], optional): block to enumerate the tokens at, the last block to
+            read mint logs from. Defaults to the current block.
+
+    Returns:
+        Iterator[int]: lazy iterator of the token ids.
+    """  # noqa: E501
+    enumerable, erc1155 = supports_interfaces(
+        contract_caller,
+        address,
+        [ERC721_ENUMERABLE_INTERFACE_ID, ERC1155_INTERFACE_ID],
+        block_number=to_block,
+    )
+    if enumerable is True:
+        return iter_enumerable_token_ids(contract_caller, address, block_number=to_block)
+    if erc1155 is True:
+        return iter_minted_erc1155_token_ids(
+            contract_caller, address, from_block=from_block, to_block=to_block
+        )
+    return iter_minted_token_ids(
+        contract_caller, address, from_block=from_block, to_block=to_block
+    )
@@ -0,0 +1,47 @@
+from typing import Optional
+
+from offchain.base.types import StringEnum
+
+ERC1155_INTERFACE_ID = bytes.fromhex("d9b67a26")
+ERC721_ENUMERABLE_INTERFACE_ID = bytes.fromhex("780e9d63")
+SUPPORTS_INTERFACE_SIGNATURE = "supportsInterface(bytes4)"
+ERC721_TOKEN_URI_SIGNATURE = "tokenURI(uint256)"
+ERC1155_URI_SIGNATURE = "uri(uint256)"
+
+
+class TokenStandard(StringEnum):
+    """Token standards, which decide the function returning a token's uri"""
+
+    ERC721 = "ERC721"
+    ERC1155 = "ERC1155"
+
+
+def get_token_uri_signature(standard: Optional[TokenStandard]) -> str:
+    """Function returning the uri of a token of a standard.
+
+    Args:
+        standard (Optional[TokenStandard]): token standard, ERC721 if unknown.
+
+    Returns:
+        str: function signature, "uri(uint256)" for ERC1155, "tokenURI(uint256)" otherwise.
+    """  # noqa: E501
+    if standard == TokenStandard.ERC1155:
+        return ERC1155_URI_SIGNATURE
+    return ERC721_TOKEN_URI_SIGNATURE
+
+
+def substitute_erc1155_id(uri: Optional[str], token_id: int) -> Optional[str]:
+    """Replace the `{id}` placeholder of an ERC1155 uri with the token id.
+
+    Per the ERC1155 metadata spec, the id is lowercase hex, zero padded to 64 characters.
+
+    Args:
+        uri (Optional[str]): uri returned by `uri(uint256)`.
+        token_id (int): token id.
+
+    Returns:
+        Optional[str]: uri of the token.
+    """
+    if not uri or "{id}" not in uri:
+        return uri
+    return uri.replace("{id}", f"{int(token_id):064x}")
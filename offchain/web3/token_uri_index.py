@@ -0,0 +1,175 @@
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from offchain.logger.logging import logger
+
+# (chain identifier, collection address, token id)
+TokenKey = tuple[str, str, int]
+
+# Token ids in a single SELECT
+_QUERY_CHUNK_SIZE = 500
+
+
+def _id_key(token_id: int) -> str:
+    # uint256 ids overflow SQLite integers, zero padded text keeps them ordered
+    return f"{token_id:078d}"
+
+
+@dataclass
+class TokenURIEntry:
+    """Indexed uri of a token.
+
+    Attributes:
+        uri (str): resolved token uri.
+        block_number (Optional[int]): block the uri was read at, None if read at "latest".
+        updated_at (float): unix time the uri was read at.
+    """
+
+    uri: str
+    block_number: Optional[int]
+    updated_at: float
+
+
+class TokenURIIndex:
+    """Persistent index of resolved token uris keyed by (chain, collection, token id).
+
+    Each uri is stored with the block it was read at. Entries expire after `ttl` seconds,
+    and refresh events (e.g. ERC4906 MetadataUpdate) invalidate them explicitly.
+
+    Attributes:
+        db_path (str): path of the SQLite database, ":memory:" to only index in memory.
+        ttl (Optional[float]): seconds entries are valid for, None to never expire.
+    """  # noqa: E501
+
+    def __init__(self, db_path: str = ":memory:", ttl: Optional[float] = None) -> None:
+        self.db_path = db_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS token_uris ("
+            "chain TEXT NOT NULL, collection TEXT NOT NULL, token_id TEXT NOT NULL, "
+            "uri TEXT NOT NULL, block_number INTEGER, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (chain, collection, token_id))"
+        )
+        self._db.commit()
+
+    def get_entries(self, keys: list[TokenKey]) -> list[Optional[TokenURIEntry]]:
+        """Look up the indexed uris of many tokens.
+
+        Args:
+            keys (list[TokenKey]): (chain identifier, collection address, token id) of each token.
+
+        Returns:
+            list[Optional[TokenURIEntry]]: entries mapped 1-1 with keys, None if missing or expired.
+        """  # noqa: E501
+        groups: dict[tuple[str, str], list[int]] = {}
+        for i, (chain, collection, _) in enumerate(keys):
+            groups.setdefault((chain, collection.lower()), []).append(i)
+        min_updated_at = time.time() - self.ttl if self.ttl is not None else 0.0
+
+        entries: list[Optional[TokenURIEntry]] = [None] * len(keys)
+        with self._lock:
+            for (chain, collection), indexes in groups.items():
+                for offset in range(0, len(indexes), _QUERY_CHUNK_SIZE):
+                    chunk = indexes[offset : offset + _QUERY_CHUNK_SIZE]  # noqa: E203
+                    by_id: dict[str, list[int]] = {}
+                    for i in chunk:
+                        by_id.setdefault(_id_key(keys[i][2]), []).append(i)
+                    rows = self._db.execute(
+                        "SELECT token_id, uri, block_number, updated_at FROM token_uris "
+                        "WHERE chain = ? AND collection = ? AND updated_at >= ? "
+                        f"AND token_id IN ({','.join('?' * len(by_id))})",
+                        (chain, collection, min_updated_at, *by_id),
+                    ).fetchall()
+                    for token_id, uri, block_number, updated_at in rows:
+                        for i in by_id[token_id]:
+                            entries[i] = TokenURIEntry(uri, block_number, updated_at)
+        return entries
+
+    def get_many(self, keys: list[TokenKey]) -> list[Optional[str]]:
+        """Look up the indexed uris of many tokens.
+
+        Args:
+            keys (list[TokenKey]): (chain identifier, collection address, token id) of each token.
+
+        Returns:
+            list[Optional[str]]: uris mapped 1-1 with keys, None if missing or expired.
+        """  # noqa: E501
+        return [entry.uri if entry else None for entry in self.get_entries(keys)]
+
+    def set_many(
+        self,
+        keys: list[TokenKey],
+        uris: list[Optional[str]],
+        block_number: Optional[int] = None,
+    ) -> None:
+        """Index the uris of many tokens at once, in a single database transaction.
+
+        Args:
+            keys (list[TokenKey]): (chain identifier, collection address, token id) of each token.
+            uris (list[Optional[str]]): resolved uris mapped 1-1 with keys, None ones are skipped.
+            block_number (Optional[int], optional): block the uris were read at. Defaults to None.
+        """  # noqa: E501
+        now = time.time()
+        rows = [
+            (chain, collection.lower(), _id_key(token_id), uri, block_number, now)
+            for (chain, collection, token_id), uri in zip(keys, uris)
+            if uri
+        ]
+        if not rows:
+            return
+        with self._lock:
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO token_uris "
+                    "(chain, collection, token_id, uri, block_number, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write token uris to index. Error: {e}")
+
+    def invalidate(
+        self,
+        chain_identifier: str,
+        collection_address: str,
+        token_ids: Optional[Iterable[int]] = None,
+    ) -> None:
+        """Drop the indexed uris of tokens of a collection.
+
+        Args:
+            chain_identifier (str): chain of the collection.
+            collection_address (str): collection address.
+            token_ids (Optional[Iterable[int]], optional): tokens to drop, e.g. a range. Defaults to
+                every token of the collection.
+        """  # noqa: E501
+        collection = collection_address.lower()
+        with self._lock:
+            if token_ids is None:
+                self._db.execute(
+                    "DELETE FROM token_uris WHERE chain = ? AND collection = ?",
+                    (chain_identifier, collection),
+                )
+            elif isinstance(token_ids, range) and token_ids.step == 1:
+                if len(token_ids) > 0:
+                    self._db.execute(
+                        "DELETE FROM token_uris WHERE chain = ? AND collection = ? "
+                        "AND token_id >= ? AND token_id < ?",
+                        (
+                            chain_identifier,
+                            collection,
+                            _id_key(token_ids.start),
+                            _id_key(token_ids.stop),
+                        ),
+                    )
+            else:
+                self._db.executemany(
+                    "DELETE FROM token_uris WHERE chain = ? AND collection = ? AND token_id = ?",
+                    [(chain_identifier, collection, _id_key(i)) for i in token_ids],
+                )
+            self._db.commit()
@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+# Collections smaller than this are resolved with real calls, inference wouldn't pay off
+URI_INFERENCE_MIN_TOKENS = 32
+# Token uris sampled to infer the template of a collection
+URI_INFERENCE_SAMPLE_SIZE = 4
+# Synthesized token uris re-checked against the contract in every batch
+URI_VERIFICATION_SAMPLE_SIZE = 3
+
+
+@dataclass(frozen=True)
+class UriTemplate:
+    """Token uri of the form `prefix{id}suffix`, e.g. `ipfs://Qm.../{id}.json`.
+
+    Attributes:
+        prefix (str): part of the uri before the token id.
+        suffix (str): part of the uri after the token id.
+    """
+
+    prefix: str
+    suffix: str
+
+    def format(self, token_id: int) -> str:
+        """Synthesize the uri of a token.
+
+        Args:
+            token_id (int): token id.
+
+        Returns:
+            str: uri of the token.
+        """
+        return f"{self.prefix}{token_id}{self.suffix}"
+
+
+def _split_on_id(uri: str, token_id: int) -> set[tuple[str, str]]:
+    id_str = str(token_id)
+    splits = set()
+    start = uri.find(id_str)
+    while start != -1:
+        splits.add((uri[:start], uri[start + len(id_str) :]))  # noqa: E203
+        start = uri.find(id_str, start + 1)
+    return splits
+
+
+def infer_uri_template(samples: Sequence[tuple[int, Optional[str]]]) -> Optional[UriTemplate]:
+    """Find the `prefix{id}suffix` template all sampled token uris fit, if any.
+
+    Args:
+        samples (Sequence[tuple[int, Optional[str]]]): token ids and their uri.
+
+    Returns:
+        Optional[UriTemplate]: the template, None if the samples don't share one or don't
+            have at least two distinct token ids to tell the id apart from the base uri.
+    """  # noqa: E501
+    if len({token_id for token_id, _ in samples}) < 2:
+        return None
+    candidates: Optional[set[tuple[str, str]]] = None
+    for token_id, uri in samples:
+        if not uri:
+            return None
+        splits = _split_on_id(uri, token_id)
+        candidates = splits if candidates is None else candidates & splits
+        if not candidates:
+            return None
+    # Rarely ambiguous (e.g. the id appears twice in every uri), the id usually comes last
+    prefix, suffix = max(candidates, key=lambda split: len(split[0]))  # type: ignore[arg-type]
+    return UriTemplate(prefix=prefix, suffix=suffix)
@@ -1,7 +1,13 @@
 # flake8: noqa: E501
 
+from typing import Any, Callable, Optional
+from unittest.mock import MagicMock
+
 import pytest
 
+from offchain.web3.contract_caller import ContractCaller
+from offchain.web3.jsonrpc import EthereumJSONRPC
+
 
 @pytest.fixture
 def raw_crypto_coven_metadata():  # type: ignore[no-untyped-def]
@@ -162,3 +168,32 @@ def mock_image_rawdata():  # type: ignore[no-untyped-def]
         "image": "https://ipfs.io/ipfs/QmQaYaf3Q2oCBaUfUvV6mBP58EjbUTbMk6dC1o4YGjeWCo",
         "name": "CryptoFarm",
     }
+
+
+@pytest.fixture
+def mock_contract_caller():  # type: ignore[no-untyped-def]
+    """Factory of contract callers answering eth_calls locally instead of over the network.
+
+    `answer` maps the params of an eth_call to its response, `call` is the side effect of the
+    rpc's single calls (ex: eth_blockNumber, eth_getLogs). Other keyword arguments are passed
+    to the ContractCaller.
+    """
+
+    def make(
+        answer: Callable[[list], dict],  # type: ignore[type-arg]
+        call: Optional[Callable[[str, list], dict]] = None,  # type: ignore[type-arg]
+        **kwargs: Any,
+    ) -> ContractCaller:
+        def call_batch_chunked(method, params, chunk_size=None, element_hook=None):  # type: ignore[no-untyped-def]
+            responses = [dict(answer(p), id=i) for i, p in enumerate(params)]
+            if element_hook is not None:
+                responses = [element_hook(r) for r in responses]
+            return responses
+
+        rpc = EthereumJSONRPC()
+        rpc.call_batch_chunked = MagicMock(side_effect=call_batch_chunked)  # type: ignore[assignment]
+        if call is not None:
+            rpc.call = MagicMock(side_effect=call)  # type: ignore[assignment]
+        return ContractCaller(rpc, **kwargs)
+
+    return make
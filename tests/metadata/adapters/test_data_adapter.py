@@ -4,6 +4,10 @@ import pytest
 from pytest_httpx import HTTPXMock
 
 from offchain.metadata.adapters import DataURIAdapter  # type: ignore[attr-defined]
+from offchain.metadata.adapters.data_uri import (
+    decode_data_uri,
+    get_data_uri_mime_type_and_size,
+)
 
 
 class TestDataURIAdapter:
@@ -107,3 +111,23 @@ class TestDataURIAdapter:
         # no real request was made
         outgoing_request = httpx_mock.get_requests()
         assert not outgoing_request
+
+    def test_mime_type_and_size_without_decoding(self):  # type: ignore[no-untyped-def]
+        assert get_data_uri_mime_type_and_size("data:text/plain;base64,aGk=") == (
+            "text/plain",
+            2,
+        )
+        assert get_data_uri_mime_type_and_size("data:text/plain;base64,aGV5") == (
+            "text/plain",
+            3,
+        )
+        # percent-encoded payloads are measured after unquoting
+        assert get_data_uri_mime_type_and_size("data:,a%20b") == (
+            "text/plain;charset=US-ASCII",
+            3,
+        )
+
+    def test_decode_data_uri(self):  # type: ignore[no-untyped-def]
+        assert decode_data_uri("data:application/json;base64,eyJhIjogMX0=") == {"a": 1}
+        assert decode_data_uri('data:application/json;utf8,{"a":%201}') == {"a": 1}
+        assert decode_data_uri("data:text/plain;base64,aGk=") == "hi"
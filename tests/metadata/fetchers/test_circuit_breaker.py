@@ -0,0 +1,165 @@
+import asyncio
+
+import httpx
+import pytest
+from pytest_httpx import HTTPXMock
+
+from offchain.metadata.fetchers.circuit_breaker import (
+    CircuitState,
+    get_host_key,
+    HostCircuitBreaker,
+    HostCircuitOpenError,
+    NegativeURICache,
+    RecentlyFailedURIError,
+)
+from offchain.metadata.fetchers.metadata_fetcher import MetadataFetcher
+from offchain.metadata.models.token import Token
+from offchain.metadata.pipelines.metadata_pipeline import MetadataPipeline
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCircuitBreaker:
+    def test_get_host_key(self):  # type: ignore[no-untyped-def]
+        assert get_host_key("https://meta.sadgirlsbar.io/8403.json") == "meta.sadgirlsbar.io"  # noqa: E501
+        assert get_host_key("ipfs://QmSr3vdMuP2fSxWD7S26KzzBWcAN1eNhm4hk1qaR3x3vmj/1.json") == "ipfs://"  # noqa: E501
+        assert get_host_key("data:application/json,{}") is None
+
+    def test_negative_cache_backs_off_exponentially(self):  # type: ignore[no-untyped-def]  # noqa: E501
+        clock = FakeClock()
+        cache = NegativeURICache(base_ttl=10, max_ttl=25, clock=clock)
+        uri = "https://example.com/1.json"
+
+        cache.record_failure(uri)
+        with pytest.raises(RecentlyFailedURIError):
+            cache.check(uri)
+        clock.now = 10
+        cache.check(uri)
+
+        cache.record_failure(uri)
+        clock.now = 29
+        with pytest.raises(RecentlyFailedURIError):
+            cache.check(uri)
+        clock.now = 30
+        cache.check(uri)
+
+        # capped at max_ttl
+        cache.record_failure(uri)
+        clock.now = 55
+        cache.check(uri)
+
+        cache.record_success(uri)
+        cache.record_failure(uri)
+        clock.now = 65
+        cache.check(uri)
+
+    def test_circuit_opens_and_half_open_probe(self):  # type: ignore[no-untyped-def]
+        clock = FakeClock()
+        breaker = HostCircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+        host = "example.com"
+
+        breaker.before_request(host)
+        breaker.record_failure(host)
+        breaker.before_request(host)
+        breaker.record_failure(host)
+        assert breaker.get_state(host) == CircuitState.OPEN
+        with pytest.raises(HostCircuitOpenError):
+            breaker.before_request(host)
+
+        # a single probe is let through once the reset timeout has passed
+        clock.now = 30
+        breaker.before_request(host)
+        assert breaker.get_state(host) == CircuitState.HALF_OPEN
+        with pytest.raises(HostCircuitOpenError):
+            breaker.before_request(host)
+
+        # a failed probe re-opens the circuit
+        breaker.record_failure(host)
+        assert breaker.get_state(host) == CircuitState.OPEN
+        with pytest.raises(HostCircuitOpenError):
+            breaker.before_request(host)
+
+        clock.now = 60
+        breaker.before_request(host)
+        breaker.record_success(host)
+        assert breaker.get_state(host) == CircuitState.CLOSED
+        breaker.before_request(host)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_probe_is_released(self, monkeypatch):  # type: ignore[no-untyped-def]  # noqa: E501
+        clock = FakeClock()
+        fetcher = MetadataFetcher(
+            negative_cache=NegativeURICache(base_ttl=0),
+            circuit_breaker=HostCircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock),
+        )
+        host = "example.com"
+        fetcher.circuit_breaker.record_failure(host)
+        started = asyncio.Event()
+
+        async def hang(uri, method="GET"):  # type: ignore[no-untyped-def]
+            started.set()
+            await asyncio.sleep(10)
+
+        monkeypatch.setattr(fetcher, "_gen_send", hang)
+        clock.now = 30
+        task = asyncio.ensure_future(fetcher.gen_fetch_content("https://example.com/1.json"))
+        await started.wait()
+        assert fetcher.circuit_breaker.get_state(host) == CircuitState.HALF_OPEN
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # the cancelled probe doesn't keep the host rejected, the next request probes it
+        fetcher.circuit_breaker.before_request(host)
+        with pytest.raises(HostCircuitOpenError):
+            fetcher.circuit_breaker.before_request(host)
+
+    @pytest.mark.asyncio
+    async def test_fetcher_fails_fast_for_dead_host(self, httpx_mock: HTTPXMock):  # type: ignore[no-untyped-def]  # noqa: E501
+        httpx_mock.add_exception(httpx.ConnectTimeout("timed out"))
+        fetcher = MetadataFetcher(
+            negative_cache=NegativeURICache(base_ttl=0),
+            circuit_breaker=HostCircuitBreaker(failure_threshold=2),
+        )
+
+        for i in range(2):
+            with pytest.raises(Exception, match="Don't know how to fetch metadata"):
+                await fetcher.gen_fetch_content(f"https://dead.example.com/{i}.json")
+
+        with pytest.raises(HostCircuitOpenError):
+            await fetcher.gen_fetch_content("https://dead.example.com/2.json")
+        assert len(httpx_mock.get_requests()) == 2
+
+    @pytest.mark.asyncio
+    async def test_fetcher_skips_recently_failed_uri(self, httpx_mock: HTTPXMock):  # type: ignore[no-untyped-def]  # noqa: E501
+        httpx_mock.add_response(status_code=404)
+        fetcher = MetadataFetcher()
+        uri = "https://example.com/404.json"
+
+        with pytest.raises(Exception, match="Don't know how to fetch metadata"):
+            await fetcher.gen_fetch_content(uri)
+        with pytest.raises(RecentlyFailedURIError):
+            await fetcher.gen_fetch_content(uri)
+        assert len(httpx_mock.get_requests()) == 1
+        # a 404 means the host is up, so its circuit stays closed
+        assert fetcher.circuit_breaker.get_state("example.com") == CircuitState.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_pipeline_returns_typed_error(self, httpx_mock: HTTPXMock):  # type: ignore[no-untyped-def]  # noqa: E501
+        httpx_mock.add_response(status_code=404)
+        token = Token(
+            collection_address="0x5180db8f5c931aae63c74266b211f580155ecac8",
+            token_id=1,
+            uri="https://example.com/1.json",
+        )
+        pipeline = MetadataPipeline(parsers=[])
+
+        first, second = [(await pipeline.async_run([token]))[0] for _ in range(2)]
+        assert first.error_type == "Exception"  # type: ignore[union-attr]
+        assert second.error_type == "RecentlyFailedURIError"  # type: ignore[union-attr]
@@ -1,3 +1,6 @@
+import asyncio
+from unittest.mock import MagicMock
+
 import pytest
 
 from pytest_httpx import HTTPXMock
@@ -12,6 +15,28 @@ from offchain.metadata.fetchers.metadata_fetcher import MetadataFetcher
 
 
 class TestMetadataFetcher:
+    @pytest.mark.asyncio
+    async def test_cancelled_request_is_not_a_host_failure(self, monkeypatch):  # type: ignore[no-untyped-def]  # noqa: E501
+        fetcher = MetadataFetcher()
+        started = asyncio.Event()
+
+        async def hang(uri, method="GET"):  # type: ignore[no-untyped-def]
+            started.set()
+            await asyncio.sleep(10)
+
+        monkeypatch.setattr(fetcher, "_gen_send", hang)
+        fetcher.circuit_breaker.record_failure = MagicMock()  # type: ignore[assignment]
+        task = asyncio.ensure_future(fetcher._gen("https://example.com/1"))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        fetcher.circuit_breaker.record_failure.assert_not_called()
+        # the slot went back to the pool
+        assert fetcher.scheduler._in_flight == 0
+        assert all(m["in_flight"] == 0 for m in fetcher.get_host_metrics().values())
+
     def test_metadata_fetcher_register_adapter(self):  # type: ignore[no-untyped-def]
         fetcher = MetadataFetcher()
         adapter = IPFSAdapter()
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+from offchain.metadata.fetchers.metadata_fetcher import MetadataFetcher
+from offchain.metadata.fetchers.rate_limiter import (
+    AdaptiveHostLimiter,
+    parse_retry_after,
+)
+from offchain.metadata.fetchers.scheduler import FairHostScheduler
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestAdaptiveHostLimiter:
+    def test_parse_retry_after(self):  # type: ignore[no-untyped-def]
+        assert parse_retry_after("120") == 120
+        assert parse_retry_after(None) is None
+        assert parse_retry_after("not a date") is None
+        assert (
+            parse_retry_after("Wed, 21 Oct 2015 07:28:30 GMT", now=1445412480) == 30
+        )
+
+    def test_multiplicative_decrease_and_additive_increase(self):  # type: ignore[no-untyped-def]  # noqa: E501
+        clock = FakeClock()
+        limiter = AdaptiveHostLimiter(initial_limit=8, clock=clock)
+        host = "example.com"
+
+        started = [limiter.start_request(host) for _ in range(4)]
+        # only the first throttling response of a window shrinks the limit
+        for started_at in started:
+            clock.now += 0.1
+            limiter.release(host, started_at, 429)
+        assert limiter.get_metrics()[host]["limit"] == 4
+
+        for _ in range(10):
+            started_at = limiter.start_request(host)
+            clock.now += 0.1
+            limiter.release(host, started_at, 200)
+        assert limiter.get_metrics()[host]["limit"] == 6
+
+    def test_latency_baseline_follows_a_slower_host(self):  # type: ignore[no-untyped-def]
+        clock = FakeClock()
+        limiter = AdaptiveHostLimiter(initial_limit=10, min_latency_signal=0, clock=clock)
+        host = "example.com"
+
+        def request(latency: float) -> None:
+            started_at = limiter.start_request(host)
+            clock.now += latency
+            limiter.release(host, started_at, 200)
+
+        for _ in range(20):
+            request(0.1)
+        # the host is 10x slower for good: it's congested at first, then the new normal
+        for _ in range(500):
+            request(1.0)
+        assert limiter.get_metrics()[host]["limit"] >= 5
+
+    @pytest.mark.asyncio
+    async def test_honours_retry_after(self):  # type: ignore[no-untyped-def]
+        limiter = AdaptiveHostLimiter()
+        scheduler = FairHostScheduler(limiter)
+        host = "example.com"
+
+        started_at = await scheduler.acquire(host)
+        scheduler.release(host, started_at, 429, retry_after=0.05)
+        assert not limiter.has_capacity(host)
+
+        loop = asyncio.get_running_loop()
+        before = loop.time()
+        await scheduler.acquire(host)
+        assert loop.time() - before >= 0.04
+
+    @pytest.mark.asyncio
+    async def test_fetcher_backs_off_on_429(self, httpx_mock: HTTPXMock):  # type: ignore[no-untyped-def]  # noqa: E501
+        httpx_mock.add_response(status_code=429)
+        fetcher = MetadataFetcher(rate_limiter=AdaptiveHostLimiter(initial_limit=10))
+
+        with pytest.raises(Exception):
+            await fetcher.gen_fetch_content("https://example.com/1.json")
+        metrics = fetcher.get_host_metrics()["example.com"]
+        assert metrics["limit"] == 5
+        assert metrics["in_flight"] == 0
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from offchain.metadata.fetchers.rate_limiter import AdaptiveHostLimiter
+from offchain.metadata.fetchers.scheduler import FairHostScheduler
+
+
+class TestFairHostScheduler:
+    @pytest.mark.asyncio
+    async def test_round_robins_between_hosts(self):  # type: ignore[no-untyped-def]
+        scheduler = FairHostScheduler(max_concurrency=2)
+        order = []
+
+        async def request(host: str) -> None:
+            started_at = await scheduler.acquire(host)
+            order.append(host)
+            await asyncio.sleep(0.01)
+            scheduler.release(host, started_at, 200)
+
+        # the slow host queues up first, but the fast host still gets every other slot
+        await asyncio.gather(
+            *[request("slow.example.com") for _ in range(4)],
+            *[request("fast.example.com") for _ in range(2)],
+        )
+        assert order == [
+            "slow.example.com",
+            "slow.example.com",
+            "slow.example.com",
+            "fast.example.com",
+            "slow.example.com",
+            "fast.example.com",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_respects_per_host_limit(self):  # type: ignore[no-untyped-def]
+        scheduler = FairHostScheduler(
+            limiter=AdaptiveHostLimiter(initial_limit=1), max_concurrency=10
+        )
+
+        slow = await scheduler.acquire("slow.example.com")
+        queued = asyncio.ensure_future(scheduler.acquire("slow.example.com"))
+        await asyncio.sleep(0)
+        # the slow host is at its own limit, other hosts are not held back by it
+        await asyncio.wait_for(scheduler.acquire("fast.example.com"), timeout=1)
+        assert not queued.done()
+        assert scheduler.get_metrics()["slow.example.com"]["queue_depth"] == 1
+
+        scheduler.release("slow.example.com", slow, 200)
+        await asyncio.wait_for(queued, timeout=1)
+
+    @pytest.mark.asyncio
+    async def test_weights(self):  # type: ignore[no-untyped-def]
+        scheduler = FairHostScheduler(
+            max_concurrency=0, host_weights={"a.example.com": 2}
+        )
+        order = []
+
+        async def request(host: str) -> None:
+            await scheduler.acquire(host)
+            order.append(host)
+
+        tasks = [
+            asyncio.ensure_future(request(host))
+            for host in ["a.example.com"] * 4 + ["b.example.com"] * 4
+        ]
+        await asyncio.sleep(0)
+        scheduler.max_concurrency = 6
+        scheduler._dispatch()
+        await asyncio.sleep(0)
+
+        assert order == ["a.example.com", "a.example.com", "b.example.com"] * 2
+        for task in tasks:
+            task.cancel()
+
+    def test_rejects_non_positive_weights(self):  # type: ignore[no-untyped-def]
+        with pytest.raises(ValueError):
+            FairHostScheduler(host_weights={"a.example.com": 0})
+        with pytest.raises(ValueError):
+            FairHostScheduler(default_weight=-1)
@@ -0,0 +1,152 @@
+from unittest.mock import MagicMock
+
+from offchain.metadata.pipelines.incremental_refresh import (
+    BATCH_METADATA_UPDATE_TOPIC,
+    BlockCursorStore,
+    IncrementalRefresher,
+    METADATA_UPDATE_TOPIC,
+)
+from offchain.metadata.pipelines.metadata_pipeline import MetadataPipeline
+from offchain.web3.chain_router import ChainRouter
+from offchain.web3.contract_caller import ContractCaller
+from offchain.web3.jsonrpc import EthereumJSONRPC
+from offchain.web3.logs import AdaptiveLogRange, iter_logs, TRANSFER_EVENT_TOPIC, ZERO_ADDRESS_TOPIC
+from offchain.web3.token_uri_index import TokenURIIndex
+
+ADDRESS = "0x5180db8f5c931aae63c74266b211f580155ecac8"
+
+
+def word(value: int) -> str:
+    return f"{value:064x}"
+
+
+def metadata_update(block: int, token_id: int) -> dict:  # type: ignore[type-arg]
+    return {"blockNumber": hex(block), "topics": [METADATA_UPDATE_TOPIC], "data": "0x" + word(token_id)}
+
+
+def batch_metadata_update(block: int, start: int, end: int) -> dict:  # type: ignore[type-arg]
+    return {
+        "blockNumber": hex(block),
+        "topics": [BATCH_METADATA_UPDATE_TOPIC],
+        "data": "0x" + word(start) + word(end),
+    }
+
+
+def mint(block: int, token_id: int) -> dict:  # type: ignore[type-arg]
+    return {
+        "blockNumber": hex(block),
+        "topics": [TRANSFER_EVENT_TOPIC, ZERO_ADDRESS_TOPIC, "0x" + word(1), "0x" + word(token_id)],
+        "data": "0x",
+    }
+
+
+def make_rpc(logs, head=1000, max_range=None):  # type: ignore[no-untyped-def]
+    def call(method, params):  # type: ignore[no-untyped-def]
+        if method == "eth_blockNumber":
+            return {"result": hex(head)}
+        start, end = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+        if max_range is not None and end - start + 1 > max_range:
+            return {"error": {"code": -32005, "message": "query returned more than 10000 results"}}
+        topic0 = params[0]["topics"][0]
+        topic0 = topic0 if isinstance(topic0, list) else [topic0]
+        return {
+            "result": [
+                log
+                for log in logs
+                if start <= int(log["blockNumber"], 16) <= end and log["topics"][0] in topic0
+            ]
+        }
+
+    rpc = EthereumJSONRPC()
+    rpc.call = MagicMock(side_effect=call)  # type: ignore[assignment]
+    return rpc
+
+
+def make_refresher(rpc, **kwargs):  # type: ignore[no-untyped-def]
+    pipeline = MetadataPipeline(
+        chain_router=ChainRouter({"ETHEREUM-MAINNET": ContractCaller(rpc)}), parsers=[]
+    )
+    pipeline.run = MagicMock(  # type: ignore[assignment]
+        side_effect=lambda tokens, *args, **kwargs: [t.token_id for t in tokens]
+    )
+    return IncrementalRefresher(pipeline, **kwargs)
+
+
+class TestIncrementalRefresh:
+    def test_refreshes_changed_tokens_only(self):  # type: ignore[no-untyped-def]
+        rpc = make_rpc(
+            [
+                metadata_update(10, 5),
+                batch_metadata_update(20, 10, 12),
+                mint(30, 11),
+                mint(40, 20),
+                metadata_update(50, 5),
+            ]
+        )
+        refresher = make_refresher(rpc, confirmations=10)
+
+        assert list(refresher.refresh(ADDRESS, from_block=0)) == [5, 20, 10, 11, 12]
+        assert refresher.pipeline.run.call_args.kwargs["block_number"] == 990  # type: ignore[attr-defined]  # noqa: E501
+        assert refresher.cursor_store.get("ETHEREUM-MAINNET", ADDRESS) == 991
+
+        # nothing changed since the cursor
+        refresher.pipeline.run.reset_mock()  # type: ignore[attr-defined]
+        assert list(refresher.refresh(ADDRESS)) == []
+        refresher.pipeline.run.assert_not_called()  # type: ignore[attr-defined]
+        assert refresher.plan(ADDRESS).from_block == 991
+
+    def test_refresh_invalidates_indexed_uris(self):  # type: ignore[no-untyped-def]
+        rpc = make_rpc([metadata_update(10, 5), batch_metadata_update(20, 10, 12)])
+        refresher = make_refresher(rpc)
+        index = refresher.pipeline.uri_index = TokenURIIndex()
+        keys = [("ETHEREUM-MAINNET", ADDRESS, token_id) for token_id in (5, 6, 11)]
+        index.set_many(keys, ["ipfs://5", "ipfs://6", "ipfs://11"])
+
+        list(refresher.refresh(ADDRESS, from_block=0))
+        assert index.get_many(keys) == [None, "ipfs://6", None]
+
+    def test_large_batch_update_refreshes_collection(self):  # type: ignore[no-untyped-def]
+        rpc = make_rpc([batch_metadata_update(20, 0, 2**256 - 1), mint(30, 11)])
+        plan = make_refresher(rpc).plan(ADDRESS, from_block=0)
+        assert plan.full_refresh
+        assert (plan.from_block, plan.to_block) == (0, 1000)
+
+    def test_first_refresh_without_cursor_refreshes_collection(self):  # type: ignore[no-untyped-def]  # noqa: E501
+        rpc = make_rpc([mint(block, block) for block in range(0, 1000, 100)])
+        plan = make_refresher(rpc).plan(ADDRESS)
+        assert plan.full_refresh and not plan.token_ids
+        assert (plan.from_block, plan.to_block) == (0, 1000)
+        # the collection is enumerated instead of reading every log since block 0
+        assert [c.args[0] for c in rpc.call.call_args_list] == ["eth_blockNumber"]  # type: ignore[attr-defined]  # noqa: E501
+
+    def test_skips_logs_without_topics(self):  # type: ignore[no-untyped-def]
+        anonymous = {"blockNumber": hex(5), "topics": [], "data": "0x" + word(7)}
+        rpc = make_rpc([metadata_update(10, 5)])
+        call = rpc.call.side_effect  # type: ignore[attr-defined]
+
+        def call_with_anonymous_log(method, params):  # type: ignore[no-untyped-def]
+            response = call(method, params)
+            if method == "eth_getLogs" and params[0]["topics"][0] != TRANSFER_EVENT_TOPIC:
+                response["result"].insert(0, anonymous)
+            return response
+
+        rpc.call.side_effect = call_with_anonymous_log  # type: ignore[attr-defined]
+        plan = make_refresher(rpc).plan(ADDRESS, from_block=0)
+        assert plan.token_ids == {5}
+
+    def test_log_range_adapts_to_provider_limits(self):  # type: ignore[no-untyped-def]
+        logs = [mint(block, block) for block in range(0, 1000, 100)]
+        rpc = make_rpc(logs, max_range=300)
+        log_range = AdaptiveLogRange(size=1000)
+
+        assert list(iter_logs(rpc, ADDRESS, [TRANSFER_EVENT_TOPIC], 0, 999, log_range)) == logs
+        requests = [c.args[1][0] for c in rpc.call.call_args_list]  # type: ignore[attr-defined]
+        # 1000 and 500 blocks were rejected, 250 blocks went through
+        assert requests[2]["fromBlock"] == hex(0) and requests[2]["toBlock"] == hex(249)
+        assert log_range.size <= 300
+
+    def test_cursor_store_persists(self, tmp_path):  # type: ignore[no-untyped-def]
+        path = str(tmp_path / "cursors.json")
+        BlockCursorStore(path).set("ETHEREUM-MAINNET", ADDRESS.upper(), 42)
+        assert BlockCursorStore(path).get("ETHEREUM-MAINNET", ADDRESS) == 42
+        assert BlockCursorStore(path).get("POLYGON-MAINNET", ADDRESS) is None
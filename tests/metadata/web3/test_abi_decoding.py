@@ -0,0 +1,46 @@
+import pytest
+from eth_abi import decode as decode_abi, encode as encode_abi  # type: ignore[attr-defined]  # noqa: E501
+
+from offchain.web3.abi_decoding import decode_hex_result
+
+ADDRESS = "0x5180db8f5c931aae63c74266b211f580155ecac8"
+
+
+def generic_decode(return_types, data):  # type: ignore[no-untyped-def]
+    try:
+        return decode_abi(return_types, bytes.fromhex(data))
+    except Exception as e:
+        return type(e)
+
+
+def fast_decode(return_types, data):  # type: ignore[no-untyped-def]
+    try:
+        return decode_hex_result(return_types, data)
+    except Exception as e:
+        return type(e)
+
+
+class TestDecodeHexResult:
+    @pytest.mark.parametrize(
+        "return_types,data",
+        [
+            (["uint256"], encode_abi(["uint256"], [2**256 - 1]).hex()),
+            (["uint256"], "00" * 31),
+            (["address"], encode_abi(["address"], [ADDRESS]).hex()),
+            (["address"], "01" + encode_abi(["address"], [ADDRESS]).hex()[2:]),
+            (["string"], encode_abi(["string"], [""]).hex()),
+            (["string"], encode_abi(["string"], ["ipfs://" + "a" * 64]).hex()),
+            (["string"], encode_abi(["string"], ["héllo 🌈"]).hex() + "00" * 32),
+            # padding isn't zero
+            (["string"], encode_abi(["string"], ["hello"]).hex()[:-2] + "01"),
+            # truncated
+            (["string"], encode_abi(["string"], ["a" * 40]).hex()[:-64]),
+            # invalid utf-8
+            (["string"], encode_abi(["bytes"], [b"\xff"]).hex()),
+            # unusual offset
+            (["string"], "40".rjust(64, "0") + "00" * 32 + encode_abi(["string"], ["hi"]).hex()[64:]),  # noqa: E501
+            (["uint256", "string"], encode_abi(["uint256", "string"], [1, "a"]).hex()),
+        ],
+    )
+    def test_matches_eth_abi(self, return_types, data):  # type: ignore[no-untyped-def]  # noqa: E501
+        assert fast_decode(return_types, data) == generic_decode(return_types, data)
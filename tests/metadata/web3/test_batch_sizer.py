@@ -0,0 +1,88 @@
+import requests
+
+from offchain.web3.batch_sizer import (
+    AdaptiveBatchSizer,
+    is_batch_limit_error,
+    is_rate_limit_error,
+)
+from offchain.web3.provider_pool import RPCProviderPool
+
+URL = "https://rpc.example.com"
+
+
+class TestAdaptiveBatchSizer:
+    def test_grows_while_fast_and_shrinks_on_limit_errors(self):  # type: ignore[no-untyped-def]  # noqa: E501
+        sizer = AdaptiveBatchSizer(initial_size=100)
+        sizer.record_success(URL, 100, 0.1)
+        assert sizer.get_size(URL) == 125
+        # partial batches say nothing about larger ones
+        sizer.record_success(URL, 10, 0.01)
+        assert sizer.get_size(URL) == 125
+
+        sizer.record_limit_error(URL, 125)
+        assert sizer.get_size(URL) == 62
+        for _ in range(10):
+            sizer.record_success(URL, sizer.get_size(URL), 0.1)
+        # never grows back to the rejected size
+        assert sizer.get_size(URL) == 124
+        assert sizer.get_size("https://other.example.com") == 100
+
+    def test_recovers_after_rate_limits(self):  # type: ignore[no-untyped-def]
+        sizer = AdaptiveBatchSizer(initial_size=100)
+        sizer.record_limit_error(URL, 100, rate_limited=True)
+        assert sizer.get_size(URL) == 75
+        assert sizer.get_stats()[URL]["ceiling"] is None
+        for _ in range(3):
+            sizer.record_success(URL, sizer.get_size(URL), 0.1)
+        # a throttled batch says nothing about the sizes the endpoint accepts
+        assert sizer.get_size(URL) > 100
+
+    def test_ceiling_is_reprobed(self):  # type: ignore[no-untyped-def]
+        sizer = AdaptiveBatchSizer(initial_size=100, ceiling_reprobe_successes=5)
+        sizer.record_limit_error(URL, 100)
+        for _ in range(8):
+            sizer.record_success(URL, sizer.get_size(URL), 0.1)
+        # grown back to the ceiling, and held there for a while
+        assert sizer.get_size(URL) == 99
+        sizer.record_success(URL, 99, 0.1)
+        assert sizer.get_stats()[URL]["ceiling"] is None
+        assert sizer.get_size(URL) > 99
+
+    def test_shrinks_on_latency_spikes(self):  # type: ignore[no-untyped-def]
+        sizer = AdaptiveBatchSizer(initial_size=100, max_size=100)
+        sizer.record_success(URL, 100, 0.5)
+        sizer.record_success(URL, 100, 5)
+        assert sizer.get_size(URL) == 75
+
+    def test_detects_limit_errors(self):  # type: ignore[no-untyped-def]
+        response = requests.Response()
+        response.status_code = 413
+        assert is_batch_limit_error(requests.HTTPError(response=response))
+        assert is_batch_limit_error({"error": {"code": -32005, "message": "limit"}})
+        assert is_batch_limit_error(
+            [{"id": 0, "error": {"code": -32600, "message": "batch size too large"}}]
+        )
+        assert not is_batch_limit_error({"error": {"code": 3, "message": "reverted"}})
+        assert not is_batch_limit_error(ConnectionError("down"))
+        response.status_code = 429
+        assert is_batch_limit_error(requests.HTTPError(response=response))
+        assert is_rate_limit_error(requests.HTTPError(response=response))
+        assert is_rate_limit_error({"error": {"code": -32000, "message": "Too Many Requests"}})
+        assert not is_rate_limit_error({"error": {"code": -32005, "message": "batch limit exceeded"}})  # noqa: E501
+
+    def test_pool_learns_from_batches(self):  # type: ignore[no-untyped-def]
+        pool = RPCProviderPool([URL], batch_sizer=AdaptiveBatchSizer(initial_size=8))
+
+        def post(url, payload):  # type: ignore[no-untyped-def]
+            if len(payload) > 4:
+                return {"error": {"code": -32005, "message": "batch limit exceeded"}}
+            return [{"id": call["id"], "result": "0x"} for call in payload]
+
+        payload = [{"id": i, "method": "eth_call"} for i in range(8)]
+        try:
+            pool.post(payload, post)
+        except Exception:
+            pass
+        assert pool.get_batch_size() == 4
+        pool.post(payload[:4], post)
+        assert pool.get_batch_size() == 5
@@ -0,0 +1,111 @@
+import threading
+from unittest.mock import MagicMock
+
+from offchain.metadata.models.token import Token
+from offchain.metadata.pipelines.metadata_pipeline import MetadataPipeline
+from offchain.web3.chain_router import ChainRouter
+
+ADDRESS = "0x5180db8f5c931aae63c74266b211f580155ecac8"
+RESULT = "0x" + "00" * 31 + "01"
+
+
+def answer(call) -> dict:  # type: ignore[no-untyped-def,type-arg]
+    return {"result": RESULT}
+
+
+def block_number(method, params) -> dict:  # type: ignore[no-untyped-def,type-arg]
+    return {"result": hex(17_000_000)}
+
+
+class TestBlockPinning:
+    def test_pinned_calls_use_block_number(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        caller = mock_contract_caller(answer, block_number)
+        assert caller.pin_block() == 17_000_000
+        assert caller.rpc.async_reader.pinned_block == 17_000_000
+
+        caller.single_address_single_fn_many_args(
+            ADDRESS, "balanceOf(uint256)", ["uint256"], [[1]]
+        )
+        params = caller.rpc.call_batch_chunked.call_args.args[1]  # type: ignore[attr-defined]  # noqa: E501
+        assert params[0][1] == hex(17_000_000)
+
+        # explicit block tags are left alone
+        caller.single_address_single_fn_many_args(
+            ADDRESS, "balanceOf(uint256)", ["uint256"], [[1]], block_tag="0x1"
+        )
+        params = caller.rpc.call_batch_chunked.call_args.args[1]  # type: ignore[attr-defined]  # noqa: E501
+        assert params[0][1] == "0x1"
+
+        caller.unpin_block()
+        caller.single_address_single_fn_many_args(
+            ADDRESS, "balanceOf(uint256)", ["uint256"], [[1]]
+        )
+        params = caller.rpc.call_batch_chunked.call_args.args[1]  # type: ignore[attr-defined]  # noqa: E501
+        assert params[0][1] == "latest"
+
+    def test_pipeline_run_records_pinned_block(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        mainnet = mock_contract_caller(answer, block_number)
+        polygon = mock_contract_caller(answer, block_number)
+        pipeline = MetadataPipeline(
+            chain_router=ChainRouter(
+                {"ETHEREUM-MAINNET": mainnet, "POLYGON-MAINNET": polygon}
+            ),
+            parsers=[],
+        )
+        tokens = [
+            Token(
+                chain_identifier=chain, collection_address=ADDRESS, token_id=1
+            )
+            for chain in ("ETHEREUM-MAINNET", "POLYGON-MAINNET")
+        ]
+
+        results = pipeline.run(
+            tokens, parallelize=False, block_number={"POLYGON-MAINNET": 42}
+        )
+
+        assert [r.block_number for r in results] == [17_000_000, 42]
+        # the pins only last for the run
+        assert mainnet.pinned_block is None and polygon.pinned_block is None
+        assert polygon.rpc.async_reader.pinned_block is None
+        # without pinning, no block is recorded
+        assert pipeline.run(tokens, parallelize=False)[0].block_number is None
+
+    def test_concurrent_runs_keep_their_own_block(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        caller = mock_contract_caller(answer, block_number)
+        both_started = threading.Barrier(2, timeout=5)
+        blocks_by_thread: dict[str, set[str]] = {}
+        first_call = threading.local()
+
+        def call_batch_chunked(method, params, chunk_size=None, element_hook=None):  # type: ignore[no-untyped-def]  # noqa: E501
+            name = threading.current_thread().name
+            if name in ("1", "2") and not getattr(first_call, "done", False):
+                # make both runs overlap
+                first_call.done = True
+                both_started.wait()
+            blocks_by_thread.setdefault(name, set()).update(p[1] for p in params)
+            return [{"result": RESULT} for _ in params]
+
+        caller.rpc.call_batch_chunked = MagicMock(side_effect=call_batch_chunked)  # type: ignore[assignment]  # noqa: E501
+        pipeline = MetadataPipeline(
+            chain_router=ChainRouter({"ETHEREUM-MAINNET": caller}), parsers=[]
+        )
+
+        def run(block: int) -> None:
+            tokens = [
+                Token(chain_identifier="ETHEREUM-MAINNET", collection_address=ADDRESS, token_id=i)
+                for i in range(3)
+            ]
+            pipeline.run(tokens, block_number=block)
+
+        threads = [
+            threading.Thread(target=run, args=(block,), name=str(block)) for block in (1, 2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        assert blocks_by_thread["1"] == {hex(1)} and blocks_by_thread["2"] == {hex(2)}
+        # worker threads of the runs read at the block of their own run
+        assert all(len(blocks) == 1 for blocks in blocks_by_thread.values())
+        assert caller.pinned_block is None
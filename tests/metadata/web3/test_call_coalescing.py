@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import pytest
+from eth_abi import encode as encode_abi  # type: ignore[attr-defined]
+
+from offchain.web3.call_coalescing import dedupe_params, InFlightCalls
+from offchain.web3.call_loader import CallLoader
+
+ADDRESS = "0x5180db8f5c931aae63c74266b211f580155ecac8"
+
+
+def eth_call(data: str, block_tag: str = "latest") -> list:  # type: ignore[type-arg]
+    return [{"to": ADDRESS, "data": data}, block_tag]
+
+
+class TestCallCoalescing:
+    def test_dedupe_params(self):  # type: ignore[no-untyped-def]
+        params = [eth_call("0x01"), eth_call("0x02"), eth_call("0x01"), eth_call("0x01", "0x10")]
+        params.append([{"to": ADDRESS.upper(), "data": "0x02"}, "latest"])
+        unique, positions = dedupe_params(params)
+        assert unique == [eth_call("0x01"), eth_call("0x02"), eth_call("0x01", "0x10")]
+        assert positions == [0, 1, 0, 2, 1]
+
+    def test_contract_caller_sends_duplicates_once(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        caller = mock_contract_caller(lambda call: {"result": "0x" + call[0]["data"][10:]})
+        rpc = caller.rpc
+        results = caller.single_address_single_fn_many_args(
+            ADDRESS, "tokenByIndex(uint256)", ["uint256"], [[1], [2], [1], [1], [3]]
+        )
+        assert results == [1, 2, 1, 1, 3]
+        assert len(rpc.call_batch_chunked.call_args.args[1]) == 3
+
+    def test_decoded_results_are_shared_per_return_types(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        started, release = threading.Event(), threading.Event()
+
+        def answer(call) -> dict:  # type: ignore[no-untyped-def,type-arg]
+            if not started.is_set():
+                started.set()
+                release.wait(5)
+            return {"result": "0x" + encode_abi(["string"], ["abc"]).hex()}
+
+        caller = mock_contract_caller(answer)
+        results = {}
+
+        def call(name, return_type):  # type: ignore[no-untyped-def]
+            results[name] = caller.single_address_single_fn_many_args(ADDRESS, "name()", return_type, [[]])
+
+        first = threading.Thread(target=call, args=("string", ["string"]))
+        first.start()
+        started.wait(5)
+        # the same calldata decoded to other types doesn't borrow the decoded result in flight
+        call("uint256", ["uint256"])
+        release.set()
+        first.join(5)
+
+        assert results == {"string": ["abc"], "uint256": [32]}
+        assert dedupe_params([eth_call("0x01")] * 2, [["string"], ["uint256"]])[1] == [0, 1]
+
+    def test_in_flight_calls_are_shared_across_threads(self):  # type: ignore[no-untyped-def]
+        in_flight = InFlightCalls()
+        started, release = threading.Event(), threading.Event()
+        sent: list[list[str]] = []
+
+        def slow_send(params):  # type: ignore[no-untyped-def]
+            def send(indexes):  # type: ignore[no-untyped-def]
+                sent.append([params[i][0]["data"] for i in indexes])
+                started.set()
+                release.wait(5)
+                return [params[i][0]["data"] + "ff" for i in indexes]
+
+            return send
+
+        first_params = [eth_call("0x01"), eth_call("0x02")]
+        results = {}
+        thread = threading.Thread(
+            target=lambda: results.setdefault("first", in_flight.call(first_params, slow_send(first_params)))
+        )
+        thread.start()
+        started.wait(5)
+
+        second_params = [eth_call("0x02"), eth_call("0x03")]
+        second = threading.Thread(
+            target=lambda: results.setdefault("second", in_flight.call(second_params, slow_send(second_params)))
+        )
+        second.start()
+        release.set()
+        thread.join(5)
+        second.join(5)
+
+        assert results == {"first": ["0x01ff", "0x02ff"], "second": ["0x02ff", "0x03ff"]}
+        # 0x02 was in flight, only 0x03 was sent again
+        assert sorted(sent) == [["0x01", "0x02"], ["0x03"]]
+
+    def test_in_flight_failures_reach_every_caller(self):  # type: ignore[no-untyped-def]
+        in_flight = InFlightCalls()
+
+        def fail(indexes):  # type: ignore[no-untyped-def]
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            in_flight.call([eth_call("0x01")], fail)
+        # failed calls aren't kept in flight
+        assert in_flight.call([eth_call("0x01")], lambda indexes: ["0x"]) == ["0x"]
+
+    @pytest.mark.asyncio
+    async def test_call_loader_coalesces_in_flight_calls(self):  # type: ignore[no-untyped-def]  # noqa: E501
+        release = asyncio.Event()
+        batches = []
+
+        async def send_calls(method, params, block_tag, return_types):  # type: ignore[no-untyped-def]
+            batches.append(params)
+            await release.wait()
+            return [p[0]["data"] for p in params]
+
+        loader = CallLoader(send_calls, batch_window=0)
+        first = asyncio.ensure_future(loader.load("eth_call", [{"to": ADDRESS, "data": "0x01"}]))
+        while not batches:
+            await asyncio.sleep(0)
+
+        # the first batch is in flight, identical calls wait for its result
+        second = asyncio.ensure_future(loader.load("eth_call", [{"to": ADDRESS, "data": "0x01"}]))
+        third = asyncio.ensure_future(loader.load("eth_call", [{"to": ADDRESS, "data": "0x02"}]))
+        while len(batches) < 2:
+            await asyncio.sleep(0)
+        release.set()
+
+        assert await asyncio.gather(first, second, third) == ["0x01", "0x01", "0x02"]
+        assert [len(batch) for batch in batches] == [1, 1]
+        assert loader._in_flight == {}
@@ -0,0 +1,53 @@
+import pytest
+from eth_abi import encode as encode_abi  # type: ignore[attr-defined]
+
+from offchain.web3.call_template import (
+    CallTemplate,
+    get_call_template,
+    split_arg_types,
+)
+from offchain.web3.contract_utils import function_signature_to_sighash
+
+ADDRESS = "0x5180db8f5c931aae63c74266b211f580155ecac8"
+
+
+def generic_encode(function_sig, arg_types, args):  # type: ignore[no-untyped-def]
+    return function_signature_to_sighash(function_sig) + encode_abi(arg_types, args).hex()  # noqa: E501
+
+
+class TestCallTemplate:
+    @pytest.mark.parametrize(
+        "function_sig,arg_types,args",
+        [
+            ("tokenURI(uint256)", ["uint256"], [12345]),
+            ("balanceOf(address,uint256)", ["address", "uint256"], [ADDRESS, 1]),
+            ("balanceOf(address,uint256)", ["address", "uint256"], [ADDRESS.upper().replace("0X", "0x"), 1]),  # noqa: E501
+            ("f(int8,bool,bytes4)", ["int8", "bool", "bytes4"], [-2, True, b"\x01\x02"]),  # noqa: E501
+            ("f(bytes32,uint8)", ["bytes32", "uint8"], [b"\xff" * 32, 255]),
+            ("f(string,uint256[])", ["string", "uint256[]"], ["hello", [1, 2]]),
+        ],
+    )
+    def test_matches_generic_encoder(self, function_sig, arg_types, args):  # type: ignore[no-untyped-def]  # noqa: E501
+        template = CallTemplate(function_sig)
+        assert list(template.arg_types) == arg_types
+        assert template.encode(args) == generic_encode(function_sig, arg_types, args)
+
+    def test_falls_back_to_generic_encoder(self):  # type: ignore[no-untyped-def]
+        template = CallTemplate("f(uint8)")
+        assert template.is_static
+        with pytest.raises(Exception):
+            template.encode([256])
+        assert not CallTemplate("f(string)").is_static
+
+    def test_encode_range(self):  # type: ignore[no-untyped-def]
+        template = get_call_template("tokenURI(uint256)")
+        assert get_call_template("tokenURI(uint256)") is template
+        assert template.encode_range(0, 3) == template.encode_many([[0], [1], [2]])
+        assert template.encode(None) == "0xc87b56dd"
+
+    def test_split_arg_types(self):  # type: ignore[no-untyped-def]
+        assert split_arg_types("totalSupply()") == []
+        assert split_arg_types("f((uint256,address),bytes)") == [
+            "(uint256,address)",
+            "bytes",
+        ]
@@ -0,0 +1,107 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from offchain.metadata.models.metadata_processing_error import MetadataProcessingError
+from offchain.metadata.models.token import Token
+from offchain.metadata.parsers.collection.collection_parser import CollectionParser
+from offchain.metadata.pipelines.metadata_pipeline import MetadataPipeline
+from offchain.web3.chain_router import ChainRouter
+from offchain.web3.contract_caller import ContractCaller
+
+
+class _CallerRecordingParser(CollectionParser):
+    _COLLECTION_ADDRESSES = ["0x5180db8f5c931aae63c74266b211f580155ecac8"]
+
+    def __init__(self, *args, **kwargs):  # type: ignore[no-untyped-def]
+        super().__init__(*args, **kwargs)
+        self.callers: list[ContractCaller] = []
+
+    def parse_metadata(self, token, raw_data, *args, **kwargs):  # type: ignore[no-untyped-def]
+        self.callers.append(self.contract_caller)
+        return None
+
+    async def _gen_parse_metadata_impl(self, token, raw_data, *args, **kwargs):  # type: ignore[no-untyped-def]  # noqa: E501
+        return self.parse_metadata(token, raw_data)
+
+
+class TestChainRouter:
+    def test_routes_by_chain_identifier(self):  # type: ignore[no-untyped-def]
+        router = ChainRouter(
+            {
+                "ETHEREUM-MAINNET": ["https://a.example.com", "https://b.example.com"],
+                "POLYGON-MAINNET": "https://polygon.example.com",
+            }
+        )
+
+        polygon = router.get_contract_caller("POLYGON-MAINNET")
+        assert polygon.rpc.url == "https://polygon.example.com"
+        assert polygon.chain_identifier == "POLYGON-MAINNET"
+        assert polygon.rpc.async_reader.chain_identifier == "POLYGON-MAINNET"
+        assert router.default is router.get_contract_caller("ETHEREUM-MAINNET")
+        assert len(router.default.rpc.pool.endpoints) == 2
+        # unknown chains are not sent to another chain's provider
+        with pytest.raises(ValueError, match="OPTIMISM-MAINNET"):
+            router.get_contract_caller("OPTIMISM-MAINNET")
+
+    def test_router_without_providers_uses_default(self):  # type: ignore[no-untyped-def]
+        default = MagicMock(spec=ContractCaller)
+        router = ChainRouter(default=default)
+        assert router.get_contract_caller("POLYGON-MAINNET") is default
+
+    def test_pipeline_fetches_token_uri_on_token_chain(self):  # type: ignore[no-untyped-def]  # noqa: E501
+        mainnet, polygon = MagicMock(spec=ContractCaller), MagicMock(spec=ContractCaller)  # noqa: E501
+        mainnet.single_address_single_fn_many_args.return_value = ["ipfs://mainnet"]
+        polygon.single_address_single_fn_many_args.return_value = ["ipfs://polygon"]
+        pipeline = MetadataPipeline(
+            chain_router=ChainRouter(
+                {"ETHEREUM-MAINNET": mainnet, "POLYGON-MAINNET": polygon}
+            ),
+            parsers=[],
+        )
+
+        token = Token(
+            chain_identifier="POLYGON-MAINNET",
+            collection_address="0x5180db8f5c931aae63c74266b211f580155ecac8",
+            token_id=1,
+        )
+        assert pipeline.contract_caller is mainnet
+        assert pipeline.fetch_token_uri(token) == "ipfs://polygon"
+        mainnet.single_address_single_fn_many_args.assert_not_called()
+
+    def test_pipeline_reports_tokens_on_unregistered_chains(self):  # type: ignore[no-untyped-def]  # noqa: E501
+        mainnet = MagicMock(spec=ContractCaller)
+        pipeline = MetadataPipeline(chain_router=ChainRouter({"ETHEREUM-MAINNET": mainnet}), parsers=[])
+        token = Token(
+            chain_identifier="POLYGON-MAINNET",
+            collection_address="0x5180db8f5c931aae63c74266b211f580155ecac8",
+            token_id=1,
+        )
+        [error] = pipeline.run([token], parallelize=False)
+        assert isinstance(error, MetadataProcessingError)
+        assert "No rpc provider registered for POLYGON-MAINNET" in error.error_message
+        mainnet.single_address_single_fn_many_args.assert_not_called()
+
+    def test_pipeline_parsers_call_token_chain(self):  # type: ignore[no-untyped-def]
+        mainnet, polygon = MagicMock(spec=ContractCaller), MagicMock(spec=ContractCaller)  # noqa: E501
+        parser = _CallerRecordingParser(fetcher=MagicMock(), contract_caller=mainnet)
+        pipeline = MetadataPipeline(
+            fetcher=MagicMock(),
+            chain_router=ChainRouter(
+                {"ETHEREUM-MAINNET": mainnet, "POLYGON-MAINNET": polygon}
+            ),
+            parsers=[parser],
+        )
+        token = Token(
+            chain_identifier="POLYGON-MAINNET",
+            collection_address="0x5180db8f5c931aae63c74266b211f580155ecac8",
+            token_id=1,
+            uri="ipfs://polygon",
+        )
+        pipeline.fetch_token_metadata(token)
+        pipeline.fetch_token_metadata(token.copy(update={"chain_identifier": "ETHEREUM-MAINNET"}))  # noqa: E501
+        assert parser.callers == [polygon, mainnet]
+        assert pipeline._get_parsers("ETHEREUM-MAINNET") == [parser]
+        [chain_parser] = pipeline._get_parsers("POLYGON-MAINNET")
+        assert chain_parser.contract_caller is polygon
+        assert pipeline._get_parsers("POLYGON-MAINNET")[0] is chain_parser
@@ -0,0 +1,96 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from eth_abi import encode as encode_abi  # type: ignore[attr-defined]
+
+from offchain.web3.contract_caller import ContractCaller, DECODED_RESULT_KEY
+from offchain.web3.json_stream import iter_json_array, parse_json_stream
+from offchain.web3.jsonrpc import EthereumJSONRPC
+
+BODY = [
+    {"jsonrpc": "2.0", "id": 0, "result": "0x" + "ab" * 5000},
+    {"jsonrpc": "2.0", "id": 1, "error": {"code": 3, "message": "héllo 🌈"}},
+    {"jsonrpc": "2.0", "id": 2, "result": 12345},
+]
+
+
+def split(raw: bytes, size: int) -> list[bytes]:
+    return [raw[i : i + size] for i in range(0, len(raw), size)]  # noqa: E203
+
+
+class TestJSONStream:
+    @pytest.mark.parametrize("size", [1, 7, 1024, 1 << 20])
+    def test_parses_arrays_across_chunks(self, size):  # type: ignore[no-untyped-def]
+        raw = json.dumps(BODY, indent=2, ensure_ascii=False).encode()
+        assert list(iter_json_array(split(raw, size))) == BODY
+        assert parse_json_stream(split(raw, size)) == BODY
+
+    def test_parses_other_values_whole(self):  # type: ignore[no-untyped-def]
+        assert parse_json_stream([b'{"error": ', b"1}"]) == {"error": 1}
+        assert parse_json_stream([b"[", b"]"]) == []
+        # a number cut at a chunk boundary
+        assert parse_json_stream([b"[1", b"23]"]) == [123]
+        with pytest.raises(ValueError):
+            parse_json_stream([b"[1 2]"])
+        with pytest.raises(ValueError):
+            parse_json_stream([b"[1,"])
+
+    def test_call_batch_applies_element_hook(self):  # type: ignore[no-untyped-def]
+        rpc = EthereumJSONRPC()
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.iter_content.return_value = split(json.dumps(BODY).encode(), 100)
+        rpc.sess.post = MagicMock(return_value=response)  # type: ignore[assignment]
+
+        def hook(element):  # type: ignore[no-untyped-def]
+            if "result" in element:
+                element["result"] = len(str(element["result"]))
+            return element
+
+        results = rpc.call_batch("eth_call", [[0], [1], [2]], element_hook=hook)
+        assert [r.get("result") for r in results] == [10002, None, 5]
+        assert rpc.sess.post.call_args.kwargs["stream"] is True  # type: ignore[attr-defined]  # noqa: E501
+
+    def test_contract_caller_decodes_responses_as_they_stream(self):  # type: ignore[no-untyped-def]  # noqa: E501
+        rpc = EthereumJSONRPC()
+        rpc.pool.get_batch_size = lambda: 10  # type: ignore[assignment]
+
+        def uri(token_id: int) -> str:
+            return "data:," + "x" * 1000 + str(token_id)
+
+        def post(url, **kwargs):  # type: ignore[no-untyped-def]
+            # each call returns a large string ending with the token id it was called with
+            body = [
+                {
+                    "jsonrpc": "2.0",
+                    "id": call["id"],
+                    "result": "0x" + encode_abi(["string"], [uri(int(call["params"][0]["data"][10:], 16))]).hex(),  # noqa: E501
+                }
+                for call in kwargs["json"]
+            ]
+            response = MagicMock()
+            response.__enter__.return_value = response
+            response.iter_content.return_value = split(json.dumps(body).encode(), 100)
+            return response
+
+        rpc.sess.post = MagicMock(side_effect=post)  # type: ignore[assignment]
+        call_batch = rpc.call_batch
+        batches = []
+
+        def spy(method, params, element_hook=None):  # type: ignore[no-untyped-def]
+            responses = call_batch(method, params, element_hook=element_hook)
+            batches.append(responses)
+            return responses
+
+        rpc.call_batch = spy  # type: ignore[assignment]
+        caller = ContractCaller(rpc)
+        uris = caller.single_address_single_fn_many_args(
+            "0x1", "tokenURI(uint256)", ["string"], [[i] for i in range(25)]
+        )
+
+        assert uris == [uri(i) for i in range(25)]
+        # the hex results were decoded and dropped while reading the bodies
+        responses = [r for batch in batches for r in batch]
+        assert len(responses) == 25
+        assert all("result" not in r and DECODED_RESULT_KEY in r for r in responses)
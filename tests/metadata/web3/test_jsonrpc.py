@@ -13,3 +13,50 @@ def test_chunking_batch_calls():  # type: ignore[no-untyped-def]
         str(rpc.call_batch.call_args_list)
         == "[call('test', [0]),\n call('test', [1]),\n call('test', [2]),\n call('test', [3]),\n call('test', [4])]"  # noqa: E501
     )
+
+
+def make_rpc(post):  # type: ignore[no-untyped-def]
+    rpc = EthereumJSONRPC()
+    rpc.retry_backoff_min = rpc.retry_backoff_max = 0
+    rpc._post = MagicMock(side_effect=post)  # type: ignore[assignment]
+    return rpc
+
+
+def test_batch_calls_match_responses_by_id():  # type: ignore[no-untyped-def]
+    sent = []
+
+    def post(payload):  # type: ignore[no-untyped-def]
+        sent.append([call["id"] for call in payload])
+        responses = [{"id": call["id"], "result": call["params"][0]} for call in payload]
+        if len(sent) == 1:
+            # out of order, one rate limited and one missing
+            responses[1] = {"id": 1, "error": {"code": -32005, "message": "limit"}}
+            return list(reversed(responses[:-1]))
+        return responses
+
+    rpc = make_rpc(post)
+    results = rpc.call_batch("test", [["a"], ["b"], ["c"], ["d"]])
+    assert [r["result"] for r in results] == ["a", "b", "c", "d"]
+    # only the failed calls are re-sent
+    assert sent == [[0, 1, 2, 3], [1, 3]]
+
+
+def test_retry_budget_is_shared_between_chunks():  # type: ignore[no-untyped-def]
+    def post(payload):  # type: ignore[no-untyped-def]
+        raise ConnectionError("down")
+
+    rpc = make_rpc(post)
+    params = [[i] for i in range(100)]
+    try:
+        rpc.call_batch_chunked("test", params, chunk_size=10)  # type: ignore[arg-type]
+    except ConnectionError:
+        pass
+    # 10 first attempts, and 3 retries for the whole request
+    assert rpc._post.call_count == 13  # type: ignore[attr-defined]
+
+
+def test_batch_calls_without_response_get_an_error():  # type: ignore[no-untyped-def]
+    rpc = make_rpc(lambda payload: [{"id": 0, "result": "0x1"}])
+    results = rpc.call_batch("test", [[0], [1]])
+    assert results[0] == {"id": 0, "result": "0x1"}
+    assert "error" in results[1]
@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock
+
+import pytest
+from eth_abi import decode as decode_abi, encode as encode_abi  # type: ignore[attr-defined]  # noqa: E501
+from eth_utils import to_hex  # type: ignore[attr-defined]
+
+from offchain.web3.contract_caller import ContractCaller
+from offchain.web3.jsonrpc import EthereumJSONRPC
+from offchain.web3.multicall import AGGREGATE3_SIGHASH, MULTICALL3_ADDRESS, Multicall3
+
+ADDRESS = "0x335eeef8e93a7a757d9e7912044d9cd264e2b2d8"
+
+
+def fake_aggregate3(method, params, chunk_size=None):  # type: ignore[no-untyped-def]
+    """Answers aggregate3 calls: odd token ids revert, even ones return their uri"""
+    responses = []
+    for call, _ in params:
+        assert call["to"] == MULTICALL3_ADDRESS
+        assert call["data"].startswith(AGGREGATE3_SIGHASH)
+        (calls,) = decode_abi(
+            ["(address,bool,bytes)[]"], bytes.fromhex(call["data"][10:])
+        )
+        results = []
+        for _, allow_failure, data in calls:
+            assert allow_failure
+            (token_id,) = decode_abi(["uint256"], data[4:])
+            if token_id % 2:
+                results.append((False, b""))
+            else:
+                results.append((True, encode_abi(["string"], [f"ipfs://{token_id}"])))
+        responses.append({"result": to_hex(encode_abi(["(bool,bytes)[]"], [results]))})
+    return responses
+
+
+class TestMulticall3:
+    def test_chunks_within_budgets(self):  # type: ignore[no-untyped-def]
+        caller = ContractCaller()
+        params = [
+            caller.request_builder(ADDRESS, "tokenURI(uint256)", [i]) for i in range(10)
+        ]
+
+        # 40k gas per call plus calldata, 3 calls fit in the gas budget
+        chunks = Multicall3(gas_budget=130_000).chunk(params, [["string"]] * 10)
+        assert [len(chunk) for chunk in chunks] == [3, 3, 3, 1]
+
+        # a uint256 result takes 128 bytes, a string result 96 + 512 bytes
+        multicall = Multicall3(response_size_budget=1024)
+        assert len(multicall.chunk(params, [["uint256"]] * 10)) == 2
+        assert len(multicall.chunk(params, [["string"]] * 10)) == 10
+
+    def test_chunks_split_on_block_tag(self):  # type: ignore[no-untyped-def]
+        caller = ContractCaller()
+        tags = ["0x10", "0x10", "latest", "latest", "0x10"]
+        params = [
+            caller.request_builder(ADDRESS, "tokenURI(uint256)", [i], block_tag=tag)
+            for i, tag in enumerate(tags)
+        ]
+
+        multicall = Multicall3()
+        chunks = multicall.chunk(params, [["string"]] * 5)
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        assert [multicall.build_request(chunk)[1] for chunk in chunks] == ["0x10", "latest", "0x10"]  # noqa: E501
+        with pytest.raises(ValueError):
+            multicall.build_request(params)
+
+    def test_contract_caller_aggregates_calls(self):  # type: ignore[no-untyped-def]
+        rpc = EthereumJSONRPC()
+        rpc.call_batch_chunked = MagicMock(side_effect=fake_aggregate3)  # type: ignore[assignment]  # noqa: E501
+        caller = ContractCaller(rpc, multicall=Multicall3())
+
+        uris = caller.single_address_single_fn_many_args(
+            ADDRESS, "tokenURI(uint256)", ["string"], [[i] for i in range(4)]
+        )
+
+        assert uris == ["ipfs://0", None, "ipfs://2", None]
+        assert rpc.call_batch_chunked.call_count == 1
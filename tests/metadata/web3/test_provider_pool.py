@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from offchain.web3.provider_pool import (
+    AllEndpointsFailedError,
+    RPCEndpoint,
+    RPCProviderPool,
+)
+
+PAYLOAD = {"jsonrpc": "2.0", "id": 1, "method": "eth_blockNumber", "params": []}
+
+
+class TestRPCProviderPool:
+    def test_fails_over(self):  # type: ignore[no-untyped-def]
+        pool = RPCProviderPool(["https://down.example.com", "https://up.example.com"])
+        calls = []
+
+        def post(url, payload):  # type: ignore[no-untyped-def]
+            calls.append(url)
+            if "down" in url:
+                raise ConnectionError("down")
+            return {"result": "0x1"}
+
+        for _ in range(3):
+            assert pool.post(PAYLOAD, post) == {"result": "0x1"}
+
+        stats = pool.get_stats()
+        # the failing endpoint is only tried once, then avoided
+        assert calls.count("https://down.example.com") == 1
+        assert stats["https://down.example.com"]["errors"] == 1
+        assert stats["https://up.example.com"]["requests"] == 3
+
+    def test_raises_when_all_endpoints_fail(self):  # type: ignore[no-untyped-def]
+        pool = RPCProviderPool(["https://a.example.com", "https://b.example.com"])
+
+        def post(url, payload):  # type: ignore[no-untyped-def]
+            return {"error": {"code": -32005, "message": "rate limited"}}
+
+        # a batch answered with a single error object was rejected
+        with pytest.raises(AllEndpointsFailedError):
+            pool.post([PAYLOAD], post)
+
+    def test_routes_by_weight_and_latency(self):  # type: ignore[no-untyped-def]
+        pool = RPCProviderPool(
+            [
+                RPCEndpoint(url="https://slow.example.com", latency_ewma=1.0),
+                RPCEndpoint(url="https://fast.example.com", latency_ewma=0.1),
+            ]
+        )
+        assert pool.select().url == "https://fast.example.com"  # type: ignore[union-attr]  # noqa: E501
+        pool.endpoints[0].weight = 100
+        assert pool.select().url == "https://slow.example.com"  # type: ignore[union-attr]  # noqa: E501
+
+    @pytest.mark.asyncio
+    async def test_hedges_slow_requests(self):  # type: ignore[no-untyped-def]
+        pool = RPCProviderPool(
+            [
+                RPCEndpoint(url="https://slow.example.com", weight=10),
+                "https://fast.example.com",
+            ],
+            hedge_delay=0.05,
+        )
+
+        async def post(url, payload):  # type: ignore[no-untyped-def]
+            await asyncio.sleep(1 if "slow" in url else 0)
+            return {"result": url}
+
+        assert await pool.gen_post(PAYLOAD, post) == {
+            "result": "https://fast.example.com"
+        }
+        stats = pool.get_stats()
+        assert stats["https://slow.example.com"]["hedged"] == 1
+        assert stats["https://slow.example.com"]["in_flight"] == 0
+
+    def test_hedges_run_on_the_shared_rpc_executor(self):  # type: ignore[no-untyped-def]
+        pool = RPCProviderPool(
+            [
+                RPCEndpoint(url="https://slow.example.com", weight=10),
+                "https://fast.example.com",
+            ],
+            hedge_delay=0.05,
+        )
+        release, threads = threading.Event(), set()
+
+        def post(url, payload):  # type: ignore[no-untyped-def]
+            threads.add(threading.current_thread().name)
+            if "slow" in url:
+                release.wait(5)
+            return {"result": url}
+
+        assert pool.post(PAYLOAD, post) == {"result": "https://fast.example.com"}
+        assert all(name.startswith("offchain-rpc-fanout") for name in threads)
+        # the losing request is still running, so it still counts against its endpoint
+        assert pool.get_stats()["https://slow.example.com"]["in_flight"] == 1
+
+        release.set()
+        for _ in range(100):
+            if pool.get_stats()["https://slow.example.com"]["in_flight"] == 0:
+                break
+            time.sleep(0.01)
+        assert pool.get_stats()["https://slow.example.com"]["in_flight"] == 0
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from offchain.web3.read_async import AsyncContractReader
+
+OWNER = "0x" + "00" * 12 + "ab" * 20
+
+
+@pytest_asyncio.fixture
+async def rpc_server():  # type: ignore[no-untyped-def]
+    peers = set()
+    bodies = []
+
+    async def handler(request: web.Request) -> web.Response:
+        peers.add(request.transport.get_extra_info("peername"))  # type: ignore[union-attr]  # noqa: E501
+        payload = await request.json()
+        bodies.append(payload)
+        if isinstance(payload, list):
+            # answer out of order, each call returns the uint256 it was called with
+            return web.json_response(
+                [
+                    {"jsonrpc": "2.0", "id": p["id"], "result": "0x" + p["params"][0]["data"][10:]}  # noqa: E501
+                    for p in reversed(payload)
+                ]
+            )
+        return web.json_response({"jsonrpc": "2.0", "id": payload["id"], "result": OWNER})  # noqa: E501
+
+    app = web.Application()
+    app.router.add_post("/", handler)
+    server = TestServer(app)
+    await server.start_server()
+    server.peers = peers  # type: ignore[attr-defined]
+    server.bodies = bodies  # type: ignore[attr-defined]
+    yield server
+    await server.close()
+
+
+class TestAsyncContractReader:
+    @pytest.mark.asyncio
+    async def test_reuses_pooled_session(self, rpc_server):  # type: ignore[no-untyped-def]  # noqa: E501
+        async with AsyncContractReader(rpc_url=str(rpc_server.make_url("/"))) as reader:
+            for _ in range(5):
+                assert await reader.get_owner("0x1") == "0x" + "ab" * 20
+            session = reader._session
+            assert session is not None
+
+        # all calls went through a single kept-alive connection
+        assert len(rpc_server.peers) == 1
+        assert session.closed
+        assert reader._session is None
+
+    @pytest.mark.asyncio
+    async def test_gen_multi_call_sends_batches(self, rpc_server):  # type: ignore[no-untyped-def]  # noqa: E501
+        async with AsyncContractReader(
+            rpc_url=str(rpc_server.make_url("/")), max_batch_size=3
+        ) as reader:
+            results = await reader.gen_call_single_function_single_address_many_args(
+                "0x1", "tokenByIndex(uint256)", ["uint256"], [[i] for i in range(7)]
+            )
+
+        assert results == list(range(7))
+        assert sorted(len(body) for body in rpc_server.bodies) == [1, 3, 3]
+
+    @pytest.mark.asyncio
+    async def test_gen_call_single_address_many_fns_many_args(self, rpc_server):  # type: ignore[no-untyped-def]  # noqa: E501
+        async with AsyncContractReader(rpc_url=str(rpc_server.make_url("/"))) as reader:
+            results = await reader.gen_call_single_address_many_fns_many_args(
+                "0x1",
+                function_sigs=["getChest(uint256)", "getFoot(uint256)"],
+                return_types=[["uint256"], ["uint256"]],
+                args=[[1], [2]],
+            )
+
+        assert results == {"getChest(uint256)": 1, "getFoot(uint256)": 2}
+        assert len(rpc_server.bodies) == 1
+
+    @pytest.mark.asyncio
+    async def test_merges_concurrent_calls(self, rpc_server):  # type: ignore[no-untyped-def]  # noqa: E501
+        async with AsyncContractReader(rpc_url=str(rpc_server.make_url("/"))) as reader:
+            results = await asyncio.gather(
+                *[
+                    reader.gen_call_single_function_single_address_many_args(
+                        "0x1", "tokenByIndex(uint256)", ["uint256"], [[i]]
+                    )
+                    for i in [1, 2, 1, 3]
+                ]
+            )
+
+        assert results == [[1], [2], [1], [3]]
+        # one batch, with the duplicate call only sent once
+        assert len(rpc_server.bodies) == 1
+        assert len(rpc_server.bodies[0]) == 3
+
+    @pytest.mark.asyncio
+    async def test_dedupes_calls_without_call_loader(self, rpc_server):  # type: ignore[no-untyped-def]  # noqa: E501
+        async with AsyncContractReader(
+            rpc_url=str(rpc_server.make_url("/")), use_call_loader=False
+        ) as reader:
+            results = await reader.gen_call_single_function_single_address_many_args(
+                "0x1", "tokenByIndex(uint256)", ["uint256"], [[1], [2], [1], [2], [3]]
+            )
+
+        assert results == [1, 2, 1, 2, 3]
+        assert [len(body) for body in rpc_server.bodies] == [3]
+
+    def test_discards_session_of_previous_loop(self):  # type: ignore[no-untyped-def]
+        reader = AsyncContractReader(rpc_url="http://localhost:1")
+        first = asyncio.run(reader._get_session())
+        second = asyncio.run(reader._get_session())
+
+        assert second is not first
+        # the first session is not left open once its loop is gone
+        assert first.closed
+        asyncio.run(reader.aclose())
+        assert second.closed
+        assert reader._session is None
@@ -0,0 +1,58 @@
+from offchain.constants.addresses import CollectionAddress
+from offchain.web3.rpc_cache import RPCResultCache
+
+CHAIN = "ETHEREUM-MAINNET"
+ADDRESS = "0x335eeef8e93a7a757d9e7912044d9cd264e2b2d8"
+RESULT = "0x" + "00" * 31 + "01"
+
+
+def eth_call(to: str, data: str, block_tag="latest"):  # type: ignore[no-untyped-def]
+    return [{"to": to, "data": data}, block_tag]
+
+
+class TestRPCResultCache:
+    def test_only_caches_immutable_or_pinned_calls(self):  # type: ignore[no-untyped-def]  # noqa: E501
+        cache = RPCResultCache()
+        punks_call = eth_call(CollectionAddress.PUNKS_DATA, "0x12345678")
+        latest_call = eth_call(ADDRESS, "0x12345678")
+        pinned_call = eth_call(ADDRESS, "0x12345678", 17_000_000)
+
+        cache.set_many(CHAIN, [punks_call, latest_call, pinned_call], [RESULT] * 3)
+
+        # immutable calls are valid at any block
+        assert cache.get(CHAIN, eth_call(CollectionAddress.PUNKS_DATA.lower(), "0x12345678", 1)) == (True, RESULT)  # noqa: E501
+        assert cache.get(CHAIN, latest_call) == (False, None)
+        assert cache.get(CHAIN, pinned_call) == (True, RESULT)
+        assert cache.get(CHAIN, eth_call(ADDRESS, "0x12345678", hex(17_000_000))) == (True, RESULT)  # noqa: E501
+        assert cache.get(CHAIN, eth_call(ADDRESS, "0x12345678", 17_000_001)) == (False, None)  # noqa: E501
+        assert cache.get("POLYGON-MAINNET", pinned_call) == (False, None)
+
+    def test_skips_unset_immutable_values(self):  # type: ignore[no-untyped-def]
+        cache = RPCResultCache(immutable_calls=[(None, "seeds(uint256)")])
+        call = eth_call(ADDRESS, "0xf0503e80" + "00" * 32)
+        cache.set(CHAIN, call, "0x" + "00" * 32)
+        assert cache.get(CHAIN, call) == (False, None)
+
+    def test_sqlite_tier(self, tmp_path):  # type: ignore[no-untyped-def]
+        db_path = str(tmp_path / "rpc.db")
+        call = eth_call(ADDRESS, "0x12345678", 17_000_000)
+        cache = RPCResultCache(db_path=db_path)
+        cache.set(CHAIN, call, RESULT)
+        cache.close()
+
+        assert RPCResultCache(db_path=db_path).get(CHAIN, call) == (True, RESULT)
+
+    def test_contract_caller_serves_cached_calls(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        caller = mock_contract_caller(lambda call: {"result": RESULT}, cache=RPCResultCache())
+        rpc = caller.rpc
+        assert rpc.async_reader.cache is caller.cache
+
+        for _ in range(2):
+            assert caller.single_address_single_fn_many_args(
+                ADDRESS,
+                "tokenByIndex(uint256)",
+                ["uint256"],
+                [[0], [1]],
+                block_tag=17_000_000,  # type: ignore[arg-type]
+            ) == [1, 1]
+        assert rpc.call_batch_chunked.call_count == 1
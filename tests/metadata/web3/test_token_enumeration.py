@@ -0,0 +1,144 @@
+from unittest.mock import MagicMock
+
+import pytest
+from eth_abi import encode as encode_abi  # type: ignore[attr-defined]
+
+from offchain.metadata.pipelines.metadata_pipeline import MetadataPipeline
+from offchain.web3.chain_router import ChainRouter
+from offchain.web3.logs import (
+    TRANSFER_BATCH_EVENT_TOPIC,
+    TRANSFER_EVENT_TOPIC,
+    TRANSFER_SINGLE_EVENT_TOPIC,
+    ZERO_ADDRESS_TOPIC,
+)
+from offchain.web3.token_enumeration import (
+    iter_collection_token_ids,
+    iter_enumerable_token_ids,
+)
+from offchain.web3.token_standards import ERC721_ENUMERABLE_INTERFACE_ID
+
+ADDRESS = "0x5180db8f5c931aae63c74266b211f580155ecac8"
+SUPPORTS_INTERFACE_SELECTOR = "0x01ffc9a7"
+TOTAL_SUPPLY_SELECTOR = "0x18160ddd"
+TOKEN_BY_INDEX_SELECTOR = "0x4f6ccce7"
+
+
+def uint_result(value: int) -> dict:  # type: ignore[type-arg]
+    return {"result": "0x" + encode_abi(["uint256"], [value]).hex()}
+
+
+def make_answer(enumerable: bool, total_supply: int = 0, erc1155: bool = False):  # type: ignore[no-untyped-def]  # noqa: E501
+    def answer(call) -> dict:  # type: ignore[no-untyped-def,type-arg]
+        data = call[0]["data"]
+        if data.startswith(SUPPORTS_INTERFACE_SELECTOR):
+            supported = enumerable if data[10:18] == ERC721_ENUMERABLE_INTERFACE_ID.hex() else erc1155
+            return {"result": "0x" + encode_abi(["bool"], [supported]).hex()}
+        if data.startswith(TOTAL_SUPPLY_SELECTOR):
+            return uint_result(total_supply)
+        if data.startswith(TOKEN_BY_INDEX_SELECTOR):
+            # token ids start at 1
+            return uint_result(int(data[10:], 16) + 1)
+        return {"error": {"code": -32000, "message": "execution reverted"}}
+
+    return answer
+
+
+def call(method, params):  # type: ignore[no-untyped-def]
+    if method == "eth_blockNumber":
+        return {"result": hex(4500)}
+    assert method == "eth_getLogs"
+    start = int(params[0]["fromBlock"], 16)
+    assert params[0]["topics"] == [TRANSFER_EVENT_TOPIC, ZERO_ADDRESS_TOPIC]
+    # one mint every 1000 blocks
+    return {
+        "result": [
+            {"topics": [TRANSFER_EVENT_TOPIC, ZERO_ADDRESS_TOPIC, ZERO_ADDRESS_TOPIC, hex(block)]}
+            for block in range(start, int(params[0]["toBlock"], 16) + 1)
+            if block % 1000 == 0
+        ]
+    }
+
+
+class TestTokenEnumeration:
+    def test_enumerable_token_ids_are_batched(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        caller = mock_contract_caller(make_answer(enumerable=True, total_supply=25), call)
+        token_ids = iter_enumerable_token_ids(caller, ADDRESS, batch_size=10)
+        # nothing is fetched until the ids are consumed
+        caller.rpc.call_batch_chunked.assert_not_called()  # type: ignore[attr-defined]
+        assert list(token_ids) == list(range(1, 26))
+        # totalSupply, then 3 batches of tokenByIndex
+        assert caller.rpc.call_batch_chunked.call_count == 4  # type: ignore[attr-defined]
+
+    def test_collection_token_ids_from_mint_logs(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        caller = mock_contract_caller(make_answer(enumerable=False), call)
+        assert list(iter_collection_token_ids(caller, ADDRESS, from_block=500)) == [
+            1000,
+            2000,
+            3000,
+            4000,
+        ]
+        get_logs = [c for c in caller.rpc.call.call_args_list if c.args[0] == "eth_getLogs"]  # type: ignore[attr-defined]  # noqa: E501
+        assert [(c.args[1][0]["fromBlock"], c.args[1][0]["toBlock"]) for c in get_logs] == [
+            (hex(500), hex(2499)),
+            # sparse logs grow the block range
+            (hex(2500), hex(4500)),
+        ]
+
+    def test_run_collection_processes_windows(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        caller = mock_contract_caller(make_answer(enumerable=True, total_supply=25), call)
+        pipeline = MetadataPipeline(chain_router=ChainRouter({"ETHEREUM-MAINNET": caller}), parsers=[])
+        pipeline.run = MagicMock(  # type: ignore[assignment]
+            side_effect=lambda tokens, *args, **kwargs: [t.token_id for t in tokens]
+        )
+
+        assert list(pipeline.run_collection(ADDRESS, enumerate=True, window_size=10)) == list(range(1, 26))
+        assert [len(c.args[0]) for c in pipeline.run.call_args_list] == [10, 10, 5]
+
+        results = pipeline.run_collection(ADDRESS, id_range=range(10_000_000), window_size=10)
+        assert next(results) == 0
+        # only the first window was built
+        assert len(pipeline.run.call_args_list) == 4
+
+        with pytest.raises(ValueError):
+            pipeline.run_collection(ADDRESS)
+
+    def test_run_collection_enumerates_at_pinned_block(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        caller = mock_contract_caller(make_answer(enumerable=True, total_supply=5), call)
+        pipeline = MetadataPipeline(chain_router=ChainRouter({"ETHEREUM-MAINNET": caller}), parsers=[])
+        pipeline.run = MagicMock(side_effect=lambda tokens, *args, **kwargs: [])  # type: ignore[assignment]  # noqa: E501
+
+        list(pipeline.run_collection(ADDRESS, enumerate=True, block_number=4000))
+        block_tags = {p[1] for c in caller.rpc.call_batch_chunked.call_args_list for p in c.args[1]}  # type: ignore[attr-defined]  # noqa: E501
+        assert block_tags == {hex(4000)}
+
+        caller = mock_contract_caller(make_answer(enumerable=False), call)
+        token_ids = iter_collection_token_ids(caller, ADDRESS, from_block=500, to_block=3000)
+        assert list(token_ids) == [1000, 2000, 3000]
+        # no need for the current block
+        assert [c.args[0] for c in caller.rpc.call.call_args_list] == ["eth_getLogs"] * 2  # type: ignore[attr-defined]  # noqa: E501
+
+    def test_erc1155_token_ids_from_transfer_logs(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        def mint(topic, types, values):  # type: ignore[no-untyped-def]
+            return {
+                "topics": [topic, ZERO_ADDRESS_TOPIC, ZERO_ADDRESS_TOPIC, ZERO_ADDRESS_TOPIC],
+                "data": "0x" + encode_abi(types, values).hex(),
+            }
+
+        def erc1155_call(method, params):  # type: ignore[no-untyped-def]
+            assert method == "eth_getLogs"
+            assert params[0]["topics"] == [
+                [TRANSFER_SINGLE_EVENT_TOPIC, TRANSFER_BATCH_EVENT_TOPIC],
+                None,
+                ZERO_ADDRESS_TOPIC,
+            ]
+            return {
+                "result": [
+                    mint(TRANSFER_SINGLE_EVENT_TOPIC, ["uint256", "uint256"], [7, 100]),
+                    mint(TRANSFER_BATCH_EVENT_TOPIC, ["uint256[]", "uint256[]"], [[1, 7, 2], [1, 1, 1]]),
+                    mint(TRANSFER_SINGLE_EVENT_TOPIC, ["uint256", "uint256"], [2, 5]),
+                ]
+            }
+
+        caller = mock_contract_caller(make_answer(enumerable=False, erc1155=True), erc1155_call)
+        # ids minted several times are enumerated once
+        assert list(iter_collection_token_ids(caller, ADDRESS, to_block=100)) == [7, 1, 2]
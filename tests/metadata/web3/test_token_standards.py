@@ -0,0 +1,153 @@
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+from eth_abi import encode as encode_abi  # type: ignore[attr-defined]
+
+from offchain.metadata.models.metadata import Metadata
+from offchain.metadata.models.metadata_processing_error import MetadataProcessingError
+from offchain.metadata.models.token import Token
+from offchain.metadata.pipelines.metadata_pipeline import MetadataPipeline, TOKEN_STANDARD_RETRY_TTL
+from offchain.web3.chain_router import ChainRouter
+from offchain.web3.contract_caller import ContractCaller
+from offchain.web3.token_standards import TokenStandard, substitute_erc1155_id
+
+ERC721_ADDRESS = "0x5180db8f5c931aae63c74266b211f580155ecac8"
+ERC1155_ADDRESS = "0x76be3b62873462d2142405439777e971754e8e77"
+
+SUPPORTS_INTERFACE_SELECTOR = "0x01ffc9a7"
+URI_SELECTOR = "0x0e89341c"
+TOKEN_URI_SELECTOR = "0xc87b56dd"
+
+
+def encode_result(types, values) -> str:  # type: ignore[no-untyped-def]
+    return "0x" + encode_abi(types, values).hex()
+
+
+def answer(call) -> dict:  # type: ignore[no-untyped-def,type-arg]
+    to, data = call[0]["to"], call[0]["data"]
+    selector = data[:10]
+    if selector == SUPPORTS_INTERFACE_SELECTOR:
+        return {"result": encode_result(["bool"], [to == ERC1155_ADDRESS])}
+    if selector == URI_SELECTOR and to == ERC1155_ADDRESS:
+        return {"result": encode_result(["string"], ["ipfs://QmHash/{id}.json"])}
+    if selector == TOKEN_URI_SELECTOR and to == ERC721_ADDRESS:
+        token_id = int(data[10:], 16)
+        return {"result": encode_result(["string"], [f"ipfs://QmCoven/{token_id}"])}
+    return {"error": {"code": -32000, "message": "execution reverted"}}
+
+
+def make_pipeline(caller: ContractCaller):  # type: ignore[no-untyped-def]
+    return MetadataPipeline(chain_router=ChainRouter({"ETHEREUM-MAINNET": caller}), parsers=[])
+
+
+def selectors(pipeline) -> list[list[str]]:  # type: ignore[no-untyped-def]
+    rpc = pipeline.contract_caller.rpc
+    return [
+        [p[0]["data"][:10] for p in call.args[1]]
+        for call in rpc.call_batch_chunked.call_args_list
+    ]
+
+
+class TestTokenStandards:
+    def test_substitute_erc1155_id(self):  # type: ignore[no-untyped-def]
+        assert (
+            substitute_erc1155_id("https://token-cdn-domain/{id}.json", 314592)
+            == "https://token-cdn-domain/000000000000000000000000000000000000000000000000000000000004cce0.json"  # noqa: E501
+        )
+        assert substitute_erc1155_id("ipfs://QmHash/1", 1) == "ipfs://QmHash/1"
+        assert substitute_erc1155_id(None, 1) is None
+
+    def test_fetch_token_uri_detects_erc1155(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        pipeline = make_pipeline(mock_contract_caller(answer))
+        token = Token(chain_identifier="ETHEREUM-MAINNET", collection_address=ERC1155_ADDRESS, token_id=1)
+        assert pipeline.fetch_token_uri(token) == "ipfs://QmHash/" + "0" * 63 + "1.json"
+        token = token.copy(update={"token_id": 2})
+        assert pipeline.fetch_token_uri(token) == "ipfs://QmHash/" + "0" * 63 + "2.json"
+        # the interface is detected once per collection
+        assert selectors(pipeline) == [[SUPPORTS_INTERFACE_SELECTOR], [URI_SELECTOR], [URI_SELECTOR]]
+
+    def test_fetch_token_uris_batches_mixed_collections(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        pipeline = make_pipeline(mock_contract_caller(answer))
+        tokens = [
+            Token(chain_identifier="ETHEREUM-MAINNET", collection_address=address, token_id=token_id)
+            for token_id in range(1, 4)
+            for address in (ERC721_ADDRESS, ERC1155_ADDRESS)
+        ]
+        uris = pipeline.fetch_token_uris(tokens)
+
+        assert uris[:2] == ["ipfs://QmCoven/1", "ipfs://QmHash/" + "0" * 63 + "1.json"]
+        assert uris[4:] == ["ipfs://QmCoven/3", "ipfs://QmHash/" + "0" * 63 + "3.json"]
+        assert selectors(pipeline) == [
+            [SUPPORTS_INTERFACE_SELECTOR],
+            [TOKEN_URI_SELECTOR] * 3,
+            [SUPPORTS_INTERFACE_SELECTOR],
+            [URI_SELECTOR] * 3,
+        ]
+
+    def test_failed_detection_is_retried_after_ttl(self, mock_contract_caller, monkeypatch):  # type: ignore[no-untyped-def]  # noqa: E501
+        node = {"down": True}
+
+        def flaky_answer(call) -> dict:  # type: ignore[no-untyped-def,type-arg]
+            if node["down"]:
+                return {"error": {"code": -32000, "message": "header not found"}}
+            return answer(call)
+
+        pipeline = make_pipeline(mock_contract_caller(flaky_answer))
+        token = Token(chain_identifier="ETHEREUM-MAINNET", collection_address=ERC1155_ADDRESS, token_id=1)
+        assert pipeline._get_token_standard(token) == TokenStandard.ERC721
+
+        node["down"] = False
+        # the inconclusive answer is kept for a while, then probed again
+        assert pipeline._get_token_standard(token) == TokenStandard.ERC721
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + TOKEN_STANDARD_RETRY_TTL)
+        assert pipeline._get_token_standard(token) == TokenStandard.ERC1155
+        assert pipeline._get_token_standard(token) == TokenStandard.ERC1155
+        assert selectors(pipeline) == [
+            [SUPPORTS_INTERFACE_SELECTOR],
+            [URI_SELECTOR],
+            [SUPPORTS_INTERFACE_SELECTOR],
+        ]
+
+    def test_legacy_erc721_is_probed_once(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        # no ERC165 and no uri(uint256): both probes revert
+        legacy = "0x06012c8cf97bead5deae237070f9587f8e7a266d"
+
+        def legacy_answer(call) -> dict:  # type: ignore[no-untyped-def,type-arg]
+            if call[0]["to"] == legacy:
+                return {"error": {"code": 3, "message": "execution reverted"}}
+            return answer(call)
+
+        pipeline = make_pipeline(mock_contract_caller(legacy_answer))
+        for token_id in range(1, 4):
+            token = Token(chain_identifier="ETHEREUM-MAINNET", collection_address=legacy, token_id=token_id)
+            assert pipeline._get_token_standard(token) == TokenStandard.ERC721
+        assert selectors(pipeline) == [[SUPPORTS_INTERFACE_SELECTOR], [URI_SELECTOR]]
+
+    def test_run_does_not_refetch_unresolved_uris(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        pipeline = make_pipeline(mock_contract_caller(answer))
+        address = "0x0000000000000000000000000000000000000001"
+        tokens = [
+            Token(chain_identifier="ETHEREUM-MAINNET", collection_address=address, token_id=token_id)
+            for token_id in range(1, 4)
+        ]
+        assert all(not isinstance(m, Metadata) for m in pipeline.run(tokens))
+        # the batch outcome is reused, tokens left without a uri are not called one by one
+        assert selectors(pipeline) == [[SUPPORTS_INTERFACE_SELECTOR], [TOKEN_URI_SELECTOR] * 3]
+
+    @pytest.mark.asyncio
+    async def test_async_run_does_not_refetch_unresolved_uris(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        pipeline = make_pipeline(mock_contract_caller(answer))
+        pipeline._gen_fetch_collection_token_uris = AsyncMock(side_effect=Exception("node is down"))  # type: ignore[assignment]  # noqa: E501
+        pipeline.gen_fetch_token_uri = AsyncMock()  # type: ignore[assignment]
+        tokens = [
+            Token(chain_identifier="ETHEREUM-MAINNET", collection_address=ERC721_ADDRESS, token_id=token_id)
+            for token_id in range(1, 4)
+        ]
+        results = await pipeline.async_run(tokens)
+        assert all(isinstance(r, MetadataProcessingError) for r in results)
+        assert all("node is down" in r.error_message for r in results)  # type: ignore[union-attr]
+        # the error of the batch is reported, tokens are not called one by one
+        pipeline._gen_fetch_collection_token_uris.assert_awaited_once()
+        pipeline.gen_fetch_token_uri.assert_not_awaited()
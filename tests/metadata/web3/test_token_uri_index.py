@@ -0,0 +1,104 @@
+import time
+
+from eth_abi import encode as encode_abi  # type: ignore[attr-defined]
+
+from offchain.metadata.models.token import Token
+from offchain.metadata.pipelines.metadata_pipeline import MetadataPipeline
+from offchain.web3.chain_router import ChainRouter
+from offchain.web3.token_uri_index import TokenURIIndex
+
+CHAIN = "ETHEREUM-MAINNET"
+ADDRESS = "0x5180db8f5c931aae63c74266b211f580155ecac8"
+TOKEN_URI_SELECTOR = "0xc87b56dd"
+
+
+def answer(call) -> dict:  # type: ignore[no-untyped-def,type-arg]
+    data = call[0]["data"]
+    if data.startswith(TOKEN_URI_SELECTOR):
+        uri = f"ipfs://QmHash/{int(data[10:], 16)}"
+        return {"result": "0x" + encode_abi(["string"], [uri]).hex()}
+    return {"error": {"code": -32000, "message": "execution reverted"}}
+
+
+def keys(token_ids):  # type: ignore[no-untyped-def]
+    return [(CHAIN, ADDRESS, token_id) for token_id in token_ids]
+
+
+class TestTokenURIIndex:
+    def test_get_and_set_many(self, tmp_path):  # type: ignore[no-untyped-def]
+        path = str(tmp_path / "uris.db")
+        index = TokenURIIndex(path)
+        big_id = 2**256 - 1
+        index.set_many(keys([1, 2, big_id]), ["ipfs://1", None, "ipfs://big"], block_number=17_000_000)
+
+        # persisted between runs, addresses are case insensitive
+        index = TokenURIIndex(path)
+        assert index.get_many([(CHAIN, ADDRESS.upper(), 1), *keys([2, big_id, 1])]) == [
+            "ipfs://1",
+            None,
+            "ipfs://big",
+            "ipfs://1",
+        ]
+        assert index.get_many([("POLYGON-MAINNET", ADDRESS, 1)]) == [None]
+        entry = index.get_entries(keys([1]))[0]
+        assert entry is not None and entry.block_number == 17_000_000
+
+    def test_ttl(self, monkeypatch):  # type: ignore[no-untyped-def]
+        index = TokenURIIndex(ttl=60)
+        index.set_many(keys([1]), ["ipfs://1"])
+        assert index.get_many(keys([1])) == ["ipfs://1"]
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 61)
+        assert index.get_many(keys([1])) == [None]
+
+    def test_invalidate(self):  # type: ignore[no-untyped-def]
+        index = TokenURIIndex()
+        token_ids = [1, 5, 9, 10, 11, 100]
+        index.set_many(keys(token_ids), [f"ipfs://{i}" for i in token_ids])
+
+        index.invalidate(CHAIN, ADDRESS, [1])
+        index.invalidate(CHAIN, ADDRESS, range(9, 11))
+        assert index.get_many(keys(token_ids)) == [None, "ipfs://5", None, None, "ipfs://11", "ipfs://100"]
+        index.invalidate(CHAIN, ADDRESS)
+        assert index.get_many(keys(token_ids)) == [None] * len(token_ids)
+
+    def test_warm_runs_make_no_uri_calls(self, mock_contract_caller):  # type: ignore[no-untyped-def]
+        caller = mock_contract_caller(answer)
+        rpc = caller.rpc
+        index = TokenURIIndex()
+        pipeline = MetadataPipeline(chain_router=ChainRouter({CHAIN: caller}), parsers=[], uri_index=index)
+
+        def make_tokens():  # type: ignore[no-untyped-def]
+            return [Token(chain_identifier=CHAIN, collection_address=ADDRESS, token_id=i) for i in range(5)]
+
+        pipeline.contract_caller.pin_block(17_000_000)
+        pipeline.fetch_token_uris(make_tokens())
+        n_calls = rpc.call_batch_chunked.call_count
+        assert n_calls > 0
+        assert index.get_entries(keys([3]))[0].block_number == 17_000_000  # type: ignore[union-attr]
+
+        tokens = make_tokens()
+        assert pipeline.fetch_token_uris(tokens) == [f"ipfs://QmHash/{i}" for i in range(5)]
+        assert rpc.call_batch_chunked.call_count == n_calls
+
+    def test_synthesized_uris_have_no_block(self, mock_contract_caller):  # type: ignore[no-untyped-def]
+        caller = mock_contract_caller(answer)
+        index = TokenURIIndex()
+        pipeline = MetadataPipeline(
+            chain_router=ChainRouter({CHAIN: caller}), parsers=[], uri_index=index, infer_base_uri=True
+        )
+        caller.pin_block(17_000_000)
+        tokens = [Token(chain_identifier=CHAIN, collection_address=ADDRESS, token_id=i) for i in range(100)]
+        assert pipeline.fetch_token_uris(tokens) == [f"ipfs://QmHash/{i}" for i in range(100)]
+
+        fetched = {
+            int(params[0]["data"][10:], 16)
+            for call in caller.rpc.call_batch_chunked.call_args_list  # type: ignore[attr-defined]
+            for params in call.args[1]
+            if params[0]["data"].startswith(TOKEN_URI_SELECTOR)
+        }
+        entries = index.get_entries(keys(range(100)))
+        assert all(entry is not None for entry in entries)
+        # only uris returned by the contract are recorded at the pinned block
+        assert {i for i, entry in enumerate(entries) if entry.block_number == 17_000_000} == fetched  # type: ignore[union-attr]  # noqa: E501
+        assert sum(entry.block_number is None for entry in entries) == 100 - len(fetched)  # type: ignore[union-attr]  # noqa: E501
@@ -0,0 +1,86 @@
+import random
+
+from eth_abi import encode as encode_abi  # type: ignore[attr-defined]
+
+from offchain.metadata.models.token import Token
+from offchain.metadata.pipelines.metadata_pipeline import MetadataPipeline
+from offchain.web3.chain_router import ChainRouter
+from offchain.web3.uri_template import infer_uri_template, UriTemplate
+
+ADDRESS = "0x5180db8f5c931aae63c74266b211f580155ecac8"
+TOKEN_URI_SELECTOR = "0xc87b56dd"
+
+
+def make_pipeline(mock_contract_caller, token_uri):  # type: ignore[no-untyped-def]
+    def answer(call) -> dict:  # type: ignore[no-untyped-def,type-arg]
+        data = call[0]["data"]
+        if data.startswith(TOKEN_URI_SELECTOR):
+            uri = token_uri(int(data[10:], 16))
+            return {"result": "0x" + encode_abi(["string"], [uri]).hex()}
+        # supportsInterface reverts, uri(uint256) too: ERC721 without ERC165
+        return {"error": {"code": -32000, "message": "execution reverted"}}
+
+    return MetadataPipeline(
+        chain_router=ChainRouter({"ETHEREUM-MAINNET": mock_contract_caller(answer)}),
+        parsers=[],
+        infer_base_uri=True,
+    )
+
+
+def token_uri_calls(pipeline) -> int:  # type: ignore[no-untyped-def]
+    return sum(
+        1
+        for call in pipeline.contract_caller.rpc.call_batch_chunked.call_args_list
+        for params in call.args[1]
+        if params[0]["data"].startswith(TOKEN_URI_SELECTOR)
+    )
+
+
+def make_tokens(ids):  # type: ignore[no-untyped-def]
+    return [
+        Token(chain_identifier="ETHEREUM-MAINNET", collection_address=ADDRESS, token_id=token_id)
+        for token_id in ids
+    ]
+
+
+class TestUriTemplate:
+    def test_infer_uri_template(self):  # type: ignore[no-untyped-def]
+        assert infer_uri_template(
+            [(1, "ipfs://QmHash/1.json"), (11, "ipfs://QmHash/11.json")]
+        ) == UriTemplate(prefix="ipfs://QmHash/", suffix=".json")
+        # the id also appears in the base uri
+        assert infer_uri_template(
+            [(1, "https://api.example.com/1/1"), (2, "https://api.example.com/1/2")]
+        ) == UriTemplate(prefix="https://api.example.com/1/", suffix="")
+        # a single id can't tell the id apart from the base uri
+        assert infer_uri_template([(1, "ipfs://QmHash/1"), (1, "ipfs://QmHash/1")]) is None
+        assert infer_uri_template([(1, "ipfs://QmA"), (2, "ipfs://QmB")]) is None
+        assert infer_uri_template([(1, "ipfs://QmHash/1"), (2, None)]) is None
+
+    def test_pipeline_synthesizes_token_uris(self, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        pipeline = make_pipeline(mock_contract_caller, lambda token_id: f"ipfs://QmHash/{token_id}.json")
+        assert pipeline.fetch_token_uris(make_tokens(range(100))) == [
+            f"ipfs://QmHash/{i}.json" for i in range(100)
+        ]
+        # 4 samples and 3 verifications
+        assert token_uri_calls(pipeline) == 7
+
+        # the template is reused by later batches, which are only verified
+        uris = pipeline.fetch_token_uris(make_tokens(range(100, 200)))
+        assert uris == [f"ipfs://QmHash/{i}.json" for i in range(100, 200)]
+        assert token_uri_calls(pipeline) == 10
+
+    def test_pipeline_falls_back_on_mismatch(self, monkeypatch, mock_contract_caller):  # type: ignore[no-untyped-def]  # noqa: E501
+        monkeypatch.setattr(random, "sample", lambda population, k: list(population)[:k])
+        # odd tokens fit a template, even tokens have custom uris
+        pipeline = make_pipeline(
+            mock_contract_caller,
+            lambda token_id: f"ipfs://QmHash/{token_id}" if token_id % 2 else f"ar://{token_id}"
+        )
+        ids = [1, 3, 5, 7] + list(range(8, 108))
+        # the template inferred from odd tokens fails verification on token 8
+        assert pipeline.fetch_token_uris(make_tokens(ids)) == [
+            f"ipfs://QmHash/{i}" if i % 2 else f"ar://{i}" for i in ids
+        ]
+        assert token_uri_calls(pipeline) == len(ids)
+        assert pipeline._uri_templates == {}
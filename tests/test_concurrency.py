@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from offchain.concurrency import (
+    EventLoopLagMonitor,
+    parmap,
+    rpc_in_flight_slot,
+    rpc_parmap,
+    run_cpu_bound,
+    set_rpc_executor,
+)
+
+
+def current_thread_name() -> str:
+    return threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test_run_cpu_bound_offloads_large_inputs():  # type: ignore[no-untyped-def]
+    main_thread = current_thread_name()
+    assert await run_cpu_bound(current_thread_name, size=10) == main_thread
+    assert (
+        await run_cpu_bound(current_thread_name, size=10, threshold=10) != main_thread
+    )
+
+
+@pytest.mark.asyncio
+async def test_event_loop_lag_monitor():  # type: ignore[no-untyped-def]
+    monitor = EventLoopLagMonitor(interval=0.01, warn_threshold=None)
+    monitor.start()
+    await asyncio.sleep(0.02)
+    # block the loop
+    time.sleep(0.1)
+    await asyncio.sleep(0.02)
+    monitor.stop()
+
+    metrics = monitor.get_metrics()
+    assert metrics["samples"] > 0
+    assert metrics["max_lag"] >= 0.05
+
+
+def test_rpc_parmap_bounds_nested_fan_out():  # type: ignore[no-untyped-def]
+    set_rpc_executor(None, max_in_flight=4)
+    in_flight, max_in_flight, threads = 0, 0, set()
+    lock = threading.Lock()
+
+    def post(i):  # type: ignore[no-untyped-def]
+        nonlocal in_flight, max_in_flight
+        with rpc_in_flight_slot():
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+                threads.add(current_thread_name())
+            time.sleep(0.001)
+            with lock:
+                in_flight -= 1
+        return i
+
+    def chunk(offset):  # type: ignore[no-untyped-def]
+        # nested fan-out runs inline on the worker
+        return rpc_parmap(post, list(range(offset, offset + 10)))
+
+    try:
+        # many callers fanning out at once, like parallel pipeline runs
+        results = parmap(lambda _: rpc_parmap(chunk, [0, 10, 20]), list(range(8)))
+    finally:
+        set_rpc_executor(None, max_in_flight=32)
+
+    assert results == [[list(range(i, i + 10)) for i in (0, 10, 20)]] * 8
+    assert max_in_flight <= 4
+    assert all(name.startswith("offchain-rpc-fanout") for name in threads)
+    assert len(threads) <= 16